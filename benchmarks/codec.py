@@ -0,0 +1,165 @@
+"""Codec throughput on a corpus of wire-format responses.
+
+Measures messages per second, retained blocks and peak memory per message for decode,
+lazy decode, encode, to_dict and to_json over every response in benchmarks/corpus. Run
+from repository root:
+
+    python -m benchmarks.codec
+    python -m benchmarks.codec --save baseline.json
+    python -m benchmarks.codec --compare baseline.json
+
+Memory columns come from tracemalloc: `retained/msg` is the number of memory blocks still
+alive after the operation (objects the operation produced, not every allocation it made),
+`peak B/msg` is peak traced memory while running it once per message.
+"""
+import argparse
+import gc
+import json
+import pathlib
+import sys
+import time
+import tracemalloc
+
+from pathfinder.common.dns.message import DnsMessage
+
+CORPUS = pathlib.Path(__file__).parent / "corpus"
+
+
+def load_corpus(path=CORPUS, names=None):
+    """Returns {name: wire data} of corpus responses."""
+
+    corpus = {}
+    for file in sorted(pathlib.Path(path).glob("*.bin")):
+        if names and file.stem not in names:
+            continue
+        corpus[file.stem] = file.read_bytes()
+    return corpus
+
+
+def operations(corpus):
+    """Returns {operation: (function, inputs)}."""
+
+    messages = [DnsMessage.unpack(data) for data in corpus.values()]
+    wires = list(corpus.values())
+    return {
+        "decode": (DnsMessage.unpack, wires),
+        "decode_lazy": (lambda data: DnsMessage.unpack(data, lazy=True), wires),
+        "encode": (DnsMessage.pack, messages),
+        "to_dict": (DnsMessage.to_dict, messages),
+        "to_json": (DnsMessage.to_json, messages),
+        "to_json_compact": (lambda message: message.to_json(compact=True), messages),
+    }
+
+
+def throughput(function, inputs, seconds, repeat) -> float:
+    """Returns best messages per second of repeated runs."""
+
+    rounds = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for item in inputs:
+                function(item)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / repeat:
+            break
+        rounds *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for item in inputs:
+                function(item)
+        best = min(best, time.perf_counter() - start)
+    return rounds * len(inputs) / best
+
+
+def memory(function, inputs) -> dict:
+    """Returns retained blocks and peak traced bytes per message."""
+
+    def traced_blocks():
+        return sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start_blocks = traced_blocks()
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        results = [function(item) for item in inputs]
+        peak = tracemalloc.get_traced_memory()[1] - start_size
+        blocks = traced_blocks()
+    finally:
+        tracemalloc.stop()
+    del results
+    return {
+        "retained_blocks_per_message": (blocks - start_blocks) / len(inputs),
+        "peak_bytes_per_message": peak / len(inputs),
+    }
+
+
+def run(corpus, seconds=1.0, repeat=3, selected=None) -> dict:
+    results = {}
+    for name, (function, inputs) in operations(corpus).items():
+        if selected and name not in selected:
+            continue
+        result = {"messages_per_second": throughput(function, inputs, seconds, repeat)}
+        result.update(memory(function, inputs))
+        results[name] = result
+    return results
+
+
+def report(results, baseline=None, threshold=0.1) -> bool:
+    """Prints results table. Returns False if throughput regressed more than threshold."""
+
+    ok = True
+    header = f"{'operation':<17}{'msg/s':>12}{'retained/msg':>14}{'peak B/msg':>12}"
+    if baseline:
+        header += f"{'baseline':>12}{'change':>9}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:<17}{result['messages_per_second']:>12.0f}"
+                f"{result['retained_blocks_per_message']:>14.1f}"
+                f"{result['peak_bytes_per_message']:>12.0f}")
+        if baseline and name in baseline:
+            before = baseline[name]["messages_per_second"]
+            change = result["messages_per_second"] / before - 1
+            line += f"{before:>12.0f}{change:>+9.1%}"
+            if change < -threshold:
+                line += "  REGRESSION"
+                ok = False
+        print(line)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS, help="directory with *.bin responses")
+    parser.add_argument("--only", nargs="*", help="corpus file names without extension")
+    parser.add_argument("--operations", nargs="*", help="operations to run")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per operation")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, best one is used")
+    parser.add_argument("--save", help="write results to JSON file")
+    parser.add_argument("--compare", help="compare with results saved by --save")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="throughput drop reported as regression (default 10%%)")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus, args.only)
+    if not corpus:
+        parser.error(f"No responses in {args.corpus}")
+    print(f"{len(corpus)} responses: {', '.join(corpus)}")
+    results = run(corpus, args.seconds, args.repeat, args.operations)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    ok = report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=4)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Memory used by decoded records.
+
+Builds records the way the decoder produces them (answer with owner name and rdata,
+detached from message) and reports traced bytes per record. CacheMiddleware doesn't keep
+such objects, it stores RRsets pre-encoded (see `CachedRRset`). Run from repository root:
+
+    python -m benchmarks.memory
+"""
+import argparse
+import gc
+import ipaddress
+import sys
+import tracemalloc
+
+from pathfinder.common.dns.domains import DnsDomain
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.dns.parts.rdata import A, Aaaa, Ns, Rdata
+
+
+def make_a(n):
+    rdata = A()
+    rdata.address = ipaddress.IPv4Address(0x0a000000 + n)
+    return DnsMessageAnswer(None, DnsDomain(None, f"host{n}.example.com"), Rdata.TYPE_A, 1, 300,
+                            rdata)
+
+
+def make_aaaa(n):
+    rdata = Aaaa()
+    rdata.address = ipaddress.IPv6Address((0x20010db8 << 96) + n)
+    return DnsMessageAnswer(None, DnsDomain(None, f"host{n}.example.com"), Rdata.TYPE_AAAA, 1,
+                            300, rdata)
+
+
+def make_ns(n):
+    rdata = Ns()
+    rdata.nsdname = DnsDomain(None, f"ns{n}.example.net")
+    return DnsMessageAnswer(None, DnsDomain(None, f"zone{n}.example.com"), Rdata.TYPE_NS, 1,
+                            86400, rdata)
+
+
+RECORDS = {
+    "A": make_a,
+    "AAAA": make_aaaa,
+    "NS": make_ns,
+}
+
+
+def measure(factory, count) -> float:
+    """Returns traced bytes per record."""
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        records = [None] * count
+        start = tracemalloc.get_traced_memory()[0]
+        for n in range(count):
+            records[n] = factory(n)
+        used = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return used / count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=100000, help="records per type")
+    args = parser.parse_args(argv)
+
+    print(f"{'record':<8}{'bytes/record':>14}")
+    for name, factory in RECORDS.items():
+        print(f"{name:<8}{measure(factory, args.count):>14.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
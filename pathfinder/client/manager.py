@@ -2,16 +2,22 @@ import typing
 from ipaddress import IPv4Address, IPv6Address
 
 from pathfinder.common.config import middlewares
+from pathfinder.common.dns.delegation import DelegationCache
+from pathfinder.common.dns.domains import DnsName
 from pathfinder.common.dns.message import DnsMessage
 from pathfinder.common.dns.parts.rdata.rdata import Rdata
 from pathfinder.common.dns.root_servers import ROOT_SERVERS
+from pathfinder.common.dns.template import QueryTemplates
 from pathfinder.common.manager import FoundNameservers, Manager
 from pathfinder.common.protocol import Timeout
 
 
 class ClientManager(Manager):
     protocol: typing.Union["TCPClientProtocol", "UDPClientProtocol"]
+    query_templates = QueryTemplates()
+    delegations = DelegationCache()
 
+    @middlewares.on_resolve
     @Manager.ip_version_filters
     async def resolve(self, resource_name, resource_type, resource_class, ip_filter, timeout=1):
         """Resolves target using IPv4."""
@@ -57,10 +63,51 @@ class ClientManager(Manager):
                 nameservers.append(answer.rdata.address)
         return nameservers
 
+    @staticmethod
+    def _in_bailiwick(zone: str, server_zone: str, resource_name) -> bool:
+        """Checks that zone is strictly below zone of queried server and resource_name
+        belongs to it.
+
+        :param zone: zone key of NS records
+        :param server_zone: zone key of queried server, "" for root servers
+        """
+
+        if zone == server_zone or \
+                zone not in (key for _, key, _ in DnsName(resource_name).suffixes):
+            return False
+        return not server_zone or \
+            server_zone in (key for _, key, _ in DnsName(zone).suffixes)
+
+    def _save_delegation(self, message, resource_name, ns_records, nameservers,
+                         server_zone: str):
+        """Saves nameservers of zone from NS records if zone is in bailiwick of queried
+        server and resource_name belongs to it.
+
+        :param server_zone: zone key of queried server, "" for root servers
+        """
+
+        ns_records = [record for record in ns_records if record.type == Rdata.TYPE_NS]
+        if not ns_records or not nameservers:
+            return
+        zone = ns_records[0].name.lower()
+        if not self._in_bailiwick(zone, server_zone, resource_name):
+            return
+        ns_domains = {record.rdata.nsdname.lower() for record in ns_records}
+        ttls = [record.ttl for record in ns_records]
+        ttls.extend(additional.ttl for additional in message.additional
+                    if additional.type in (Rdata.TYPE_A, Rdata.TYPE_AAAA) and
+                    additional.name.lower() in ns_domains)
+        self.delegations.put(zone, nameservers, min(ttls))
+
     async def _nameserver_request(
             self, server: typing.Union[IPv4Address, IPv6Address], resource_name,
-            resource_class, ip_filter):
-        """Requests nameserver for resource_name."""
+            resource_class, ip_filter, server_zone: str = ""):
+        """Requests nameserver for resource_name.
+
+        :param server_zone: zone key of queried server, "" for root servers
+        :return: zone key and nameservers of referral, None if server gave no usable
+            referral
+        """
 
         response = await self.query(str(server), resource_name, Rdata.TYPE_NS, resource_class)
         if response.answer.contains_type(Rdata.TYPE_NS):
@@ -71,6 +118,8 @@ class ClientManager(Manager):
             if not nameservers:
                 nameservers = await self._nameserver_resolve_many(ns_domains, resource_class,
                                                                   ip_filter=ip_filter)
+            self._save_delegation(response, resource_name, response.answer, nameservers,
+                                  server_zone)
             raise FoundNameservers(nameservers)
         elif response.authority.contains_type(Rdata.TYPE_SOA):
             nameserver_domain = response.authority.filter_resources(type=Rdata.TYPE_SOA)[
@@ -86,8 +135,14 @@ class ClientManager(Manager):
             if not nameservers:
                 nameservers = await self._nameserver_resolve_many(ns_domains, resource_class,
                                                                   ip_filter=ip_filter)
+            self._save_delegation(response, resource_name, response.authority, nameservers,
+                                  server_zone)
             raise FoundNameservers(nameservers)
         elif response.authority.contains_type(Rdata.TYPE_NS):
+            zone = response.authority.filter_resources(type=Rdata.TYPE_NS)[0].name.lower()
+            if not self._in_bailiwick(zone, server_zone, resource_name):
+                # Upward or sideways referral, server is lame
+                return None
             ns_domains = [authority.rdata.nsdname.lower() for authority in
                           response.authority]
             nameservers = self._find_in_additional(response, ns_domains,
@@ -95,25 +150,51 @@ class ClientManager(Manager):
             if not nameservers:
                 nameservers = await self._nameserver_resolve_many(ns_domains, resource_class,
                                                                   ip_filter=ip_filter)
-            return nameservers
+            self._save_delegation(response, resource_name, response.authority, nameservers,
+                                  server_zone)
+            return zone, nameservers
 
     async def find_nameservers(self, resource_name, resource_class, ip_filter):
-        """Finds nameservers for resolve target."""
-
-        nameservers = []
-        for nameserver_address_list in ROOT_SERVERS.values():
-            nameservers.extend(filter(ip_filter, nameserver_address_list))
+        """Finds nameservers for resolve target.
+
+        Search starts at the closest zone with cached delegation, root servers otherwise.
+        """
+
+        delegation = self.delegations.closest(resource_name, ip_filter)
+        if delegation is None:
+            zone = ""
+            nameservers = []
+            for nameserver_address_list in ROOT_SERVERS.values():
+                nameservers.extend(filter(ip_filter, nameserver_address_list))
+        elif delegation.zone == DnsName(resource_name).key:
+            return list(filter(ip_filter, delegation.nameservers))
+        else:
+            zone = delegation.zone
+            nameservers = list(delegation.nameservers)
         while filtered_nameservers := list(filter(ip_filter, nameservers)):
             for server in filtered_nameservers:
                 try:
-                    nameservers = await self._nameserver_request(server, resource_name,
-                                                                 resource_class,
-                                                                 ip_filter=ip_filter)
-                    break
+                    referral = await self._nameserver_request(server, resource_name,
+                                                              resource_class,
+                                                              ip_filter=ip_filter,
+                                                              server_zone=zone)
                 except Timeout:
                     continue
                 except FoundNameservers as found:
                     return found.nameservers
+                if referral is not None:
+                    zone, nameservers = referral
+                    break
+            else:
+                # Every server timed out or was lame
+                return []
+
+    @middlewares.on_encode
+    async def encode_message(self, message: DnsMessage):
+        """Packs message after encode middleware changed it, so its template is keyed by
+        what is actually sent. Middleware working on packed data still runs each time."""
+
+        return self.query_templates.pack(message)
 
     @middlewares.on_query
     async def query(self, host, resource_name, resource_type, resource_class, timeout=1):
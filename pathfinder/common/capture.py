@@ -0,0 +1,374 @@
+import ipaddress
+import mmap
+import struct
+import typing
+from collections import OrderedDict
+
+from pathfinder.common.dns.exceptions import MalformedPacket
+from pathfinder.common.dns.message import DnsMessage
+
+# Link layer types (http://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+PROTOCOL_TCP = 6
+PROTOCOL_UDP = 17
+
+PCAP_MAGIC = {
+    # magic: (byte order, timestamp fraction units per second)
+    b"\xd4\xc3\xb2\xa1": ("<", 10 ** 6),
+    b"\xa1\xb2\xc3\xd4": (">", 10 ** 6),
+    b"\x4d\x3c\xb2\xa1": ("<", 10 ** 9),
+    b"\xa1\xb2\x3c\x4d": (">", 10 ** 9),
+}
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+
+
+class CaptureException(Exception):
+    pass
+
+
+class DnsPayload(typing.NamedTuple):
+    """DNS message found in capture."""
+
+    timestamp: float
+    src: typing.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+    sport: int
+    dst: typing.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+    dport: int
+    protocol: int
+    data: bytes
+
+
+class TcpFlow:
+    """Reassembles length-prefixed DNS messages (RFC 1035 4.2.2) of one TCP direction."""
+
+    __slots__ = ("next_seq", "buffer", "pending")
+
+    # Out of order segments kept per flow
+    MAX_PENDING = 16
+
+    def __init__(self, next_seq=None):
+        self.next_seq = next_seq
+        self.buffer = bytearray()
+        self.pending: typing.Dict[int, bytes] = {}
+
+    def feed(self, seq: int, payload: memoryview) -> typing.List[bytes]:
+        """Adds segment to stream and returns complete messages."""
+
+        if self.next_seq is None:
+            # Capture started in the middle of connection
+            self.next_seq = seq
+        diff = (seq - self.next_seq) & 0xFFFFFFFF
+        if diff >= 0x80000000:
+            # Retransmission or overlap with already received data
+            overlap = 0x100000000 - diff
+            if overlap >= len(payload):
+                return []
+            payload = payload[overlap:]
+        elif diff:
+            if len(self.pending) < self.MAX_PENDING:
+                self.pending[seq] = bytes(payload)
+            else:
+                # Too many holes, resynchronize on this segment
+                self.pending.clear()
+                self.buffer.clear()
+                self.next_seq = seq
+                return self.feed(seq, payload)
+            return []
+        self.buffer += payload
+        self.next_seq = (self.next_seq + len(payload)) & 0xFFFFFFFF
+        while self.next_seq in self.pending:
+            segment = self.pending.pop(self.next_seq)
+            self.buffer += segment
+            self.next_seq = (self.next_seq + len(segment)) & 0xFFFFFFFF
+        return self._messages()
+
+    def _messages(self) -> typing.List[bytes]:
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= 2:
+            length = (self.buffer[offset] << 8) + self.buffer[offset + 1]
+            if len(self.buffer) - offset - 2 < length:
+                break
+            messages.append(bytes(self.buffer[offset + 2: offset + 2 + length]))
+            offset += 2 + length
+        if offset:
+            del self.buffer[:offset]
+        return messages
+
+
+class CaptureReader:
+    """Streaming reader of DNS messages from pcap and pcapng files.
+
+    File is memory-mapped and read sequentially, only TCP reassembly state is kept in
+    memory and it is bounded by max_flows. UDP and TCP packets with port on either side
+    are used, fragmented IP packets are skipped.
+    """
+
+    def __init__(self, path, port=53, max_flows=4096):
+        self.path = path
+        self.port = port
+        self.max_flows = max_flows
+        self.flows: typing.Dict[tuple, TcpFlow] = OrderedDict()
+        self.malformed = 0
+        self._file = None
+        self._mmap = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file can't be mapped
+            self._mmap = None
+        if self._mmap is not None and hasattr(self._mmap, "madvise"):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+    def close(self):
+        self.flows.clear()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Frames are still referenced, mapping is closed when they are collected
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def frames(self) -> typing.Iterator[typing.Tuple[float, int, memoryview]]:
+        """Yields (timestamp, link type, frame) for every captured packet.
+
+        Frames are views of mapped file and are only valid until reader is closed.
+        """
+
+        if self._file is None:
+            self.open()
+        if self._mmap is None:
+            return
+        view = memoryview(self._mmap)
+        magic = bytes(view[:4])
+        if magic in PCAP_MAGIC:
+            yield from self._pcap_frames(view, *PCAP_MAGIC[magic])
+        elif len(view) >= 4 and struct.unpack_from("<L", view)[0] == PCAPNG_SECTION_HEADER:
+            yield from self._pcapng_frames(view)
+        else:
+            raise CaptureException(f"Unknown capture format of {self.path}")
+
+    @staticmethod
+    def _pcap_frames(view, order, units):
+        if len(view) < 24:
+            raise CaptureException("Truncated pcap header")
+        linktype = struct.unpack_from(f"{order}L", view, 20)[0] & 0x0FFFFFFF
+        record = struct.Struct(f"{order}LLLL")
+        pos = 24
+        while pos + record.size <= len(view):
+            seconds, fraction, captured, _ = record.unpack_from(view, pos)
+            pos += record.size
+            if pos + captured > len(view):
+                break
+            yield seconds + fraction / units, linktype, view[pos: pos + captured]
+            pos += captured
+
+    @staticmethod
+    def _pcapng_frames(view):
+        order = "<"
+        interfaces = []
+        pos = 0
+        while pos + 12 <= len(view):
+            block_type = struct.unpack_from(f"{order}L", view, pos)[0]
+            if block_type == PCAPNG_SECTION_HEADER:
+                # Byte order is defined per section
+                magic = struct.unpack_from("<L", view, pos + 8)[0]
+                order = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+            block_length = struct.unpack_from(f"{order}L", view, pos + 4)[0]
+            if block_length < 12 or pos + block_length > len(view):
+                break
+            body = view[pos + 8: pos + block_length - 4]
+            if block_type == 1:
+                # Interface description block
+                linktype = struct.unpack_from(f"{order}H", body)[0]
+                interfaces.append((linktype, CaptureReader._pcapng_resolution(body, order)))
+            elif block_type in (2, 6):
+                # Obsolete packet block and enhanced packet block
+                if block_type == 6:
+                    interface, high, low, captured = struct.unpack_from(f"{order}LLLL", body)
+                else:
+                    interface, _, high, low, captured = struct.unpack_from(
+                        f"{order}HHLLL", body)
+                if interface < len(interfaces):
+                    linktype, units = interfaces[interface]
+                    yield ((high << 32) + low) / units, linktype, body[20: 20 + captured]
+            elif block_type == 3 and interfaces:
+                # Simple packet block, no timestamp
+                original = struct.unpack_from(f"{order}L", body)[0]
+                linktype = interfaces[0][0]
+                yield 0.0, linktype, body[4: 4 + min(original, len(body) - 4)]
+            pos += block_length
+
+    @staticmethod
+    def _pcapng_resolution(body, order) -> int:
+        """Returns timestamp units per second from if_tsresol option."""
+
+        pos = 8
+        while pos + 4 <= len(body):
+            code, length = struct.unpack_from(f"{order}HH", body, pos)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = body[pos + 4]
+                return 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+            pos += 4 + length + (-length % 4)
+        return 10 ** 6
+
+    @staticmethod
+    def _network_layer(linktype, frame) -> typing.Union[memoryview, None]:
+        """Strips link layer header. Returns IP packet or None for other protocols."""
+
+        if linktype == LINKTYPE_ETHERNET:
+            if len(frame) < 14:
+                return None
+            ethertype = struct.unpack_from("!H", frame, 12)[0]
+            pos = 14
+            while ethertype in ETHERTYPE_VLAN and len(frame) >= pos + 4:
+                ethertype = struct.unpack_from("!H", frame, pos + 2)[0]
+                pos += 4
+            return frame[pos:] if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if len(frame) < 16:
+                return None
+            ethertype = struct.unpack_from("!H", frame, 14)[0]
+            return frame[16:] if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            if len(frame) < 20:
+                return None
+            ethertype = struct.unpack_from("!H", frame)[0]
+            return frame[20:] if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+        elif linktype == LINKTYPE_NULL:
+            # Address family is in byte order of capturing host
+            return frame[4:] if len(frame) > 4 else None
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            return frame
+        return None
+
+    @staticmethod
+    def _transport_layer(packet) -> typing.Union[tuple, None]:
+        """Returns (src, dst, protocol, segment) of not fragmented IP packet."""
+
+        if not packet:
+            return None
+        version = packet[0] >> 4
+        if version == 4:
+            if len(packet) < 20:
+                return None
+            header_length = (packet[0] & 0x0F) * 4
+            total_length, fragment, protocol = struct.unpack_from("!2xH2xHxB", packet)
+            if fragment & 0x3FFF:
+                # More fragments flag or non zero offset
+                return None
+            src = ipaddress.IPv4Address(bytes(packet[12:16]))
+            dst = ipaddress.IPv4Address(bytes(packet[16:20]))
+            return src, dst, protocol, packet[header_length: total_length]
+        elif version == 6:
+            if len(packet) < 40:
+                return None
+            payload_length, protocol = struct.unpack_from("!HB", packet, 4)
+            src = ipaddress.IPv6Address(bytes(packet[8:24]))
+            dst = ipaddress.IPv6Address(bytes(packet[24:40]))
+            segment = packet[40: 40 + payload_length]
+            # Hop-by-hop, routing and destination options extension headers
+            while protocol in (0, 43, 60) and len(segment) >= 8:
+                protocol, length = segment[0], (segment[1] + 1) * 8
+                segment = segment[length:]
+            if protocol == 44:
+                # Fragment header
+                return None
+            return src, dst, protocol, segment
+        return None
+
+    def payloads(self) -> typing.Iterator[DnsPayload]:
+        """Yields DNS payloads of UDP datagrams and reassembled TCP streams."""
+
+        for timestamp, linktype, frame in self.frames():
+            ip_packet = self._network_layer(linktype, frame)
+            transport = self._transport_layer(ip_packet) if ip_packet is not None else None
+            if transport is None:
+                continue
+            src, dst, protocol, segment = transport
+            if protocol == PROTOCOL_UDP and len(segment) >= 8:
+                sport, dport, length = struct.unpack_from("!HHH", segment)
+                if self.port in (sport, dport):
+                    yield DnsPayload(timestamp, src, sport, dst, dport, protocol,
+                                     bytes(segment[8: max(length, 8)]))
+            elif protocol == PROTOCOL_TCP and len(segment) >= 20:
+                sport, dport, seq, offset, flags = struct.unpack_from("!HHLxxxxBB", segment)
+                if self.port not in (sport, dport):
+                    continue
+                for data in self._tcp_segment((src, sport, dst, dport), seq, flags,
+                                              segment[(offset >> 4) * 4:]):
+                    yield DnsPayload(timestamp, src, sport, dst, dport, protocol, data)
+
+    def _tcp_segment(self, key, seq, flags, payload) -> typing.List[bytes]:
+        """Feeds TCP segment to its flow and returns complete messages."""
+
+        if flags & TCP_SYN:
+            self._add_flow(key, TcpFlow((seq + 1) & 0xFFFFFFFF))
+            return []
+        flow = self.flows.get(key)
+        messages = []
+        if payload:
+            if flow is None:
+                flow = self._add_flow(key, TcpFlow())
+            else:
+                self.flows.move_to_end(key)
+            messages = flow.feed(seq, payload)
+        if flags & (TCP_FIN | TCP_RST):
+            self.flows.pop(key, None)
+        return messages
+
+    def _add_flow(self, key, flow: TcpFlow) -> TcpFlow:
+        self.flows[key] = flow
+        self.flows.move_to_end(key)
+        while len(self.flows) > self.max_flows:
+            self.flows.popitem(last=False)
+        return flow
+
+    def messages(self, lazy=False) -> typing.Iterator[DnsMessage]:
+        """Yields decoded DNS messages. Malformed messages are counted and skipped."""
+
+        for payload in self.payloads():
+            try:
+                yield DnsMessage.unpack(payload.data, lazy=lazy)
+            except (MalformedPacket, MemoryError):
+                self.malformed += 1
+
+
+def read_messages(path, lazy=False, port=53) -> typing.Iterator[DnsMessage]:
+    """Yields DNS messages from pcap or pcapng file."""
+
+    with CaptureReader(path, port=port) as reader:
+        yield from reader.messages(lazy=lazy)
@@ -1,4 +1,4 @@
-from pathfinder.common.middleware.cache import CacheMiddleware
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
 from pathfinder.common.middleware.edns.middleware import EDNSMiddleware
 from pathfinder.common.middleware.middleware import MiddlewareList
 
@@ -0,0 +1,120 @@
+import typing
+
+from pathfinder.common.dns.bytestream import ByteStream
+from pathfinder.common.dns.domains import DnsDomain
+from pathfinder.common.dns.exceptions import MalformedPacket
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.parts import DnsMessageHeader, DnsMessageQuestion
+
+Buffer = typing.Union[bytes, bytearray, memoryview]
+
+
+class PacketSummary(typing.NamedTuple):
+    """Fixed header fields and first question of a packet."""
+
+    id: int
+    options: int
+    qdcount: int
+    ancount: int
+    nscount: int
+    arcount: int
+    qname: typing.Union[str, None]
+    qtype: typing.Union[int, None]
+    qclass: typing.Union[int, None]
+    data: Buffer
+
+    @property
+    def qr(self) -> bool:
+        return DnsMessageHeader.qr.value(self.options)
+
+    @property
+    def opcode(self) -> int:
+        return DnsMessageHeader.opcode.value(self.options)
+
+    @property
+    def rcode(self) -> int:
+        return DnsMessageHeader.rcode.value(self.options)
+
+    def message(self, lazy=False) -> DnsMessage:
+        """Decodes full message."""
+
+        return DnsMessage.unpack(self.data, lazy=lazy)
+
+
+class BatchDecoder:
+    """Decoder for streams of packets.
+
+    Keeps one bytestream and one name compression table and reuses them for every
+    packet. Only header and first question are decoded, full messages are available from
+    PacketSummary.message.
+    """
+
+    # Header fields for numpy structured arrays, in wire order
+    HEADER_DTYPE = [("id", ">u2"), ("options", ">u2"), ("qdcount", ">u2"),
+                    ("ancount", ">u2"), ("nscount", ">u2"), ("arcount", ">u2")]
+
+    def __init__(self, skip_malformed=True):
+        self.skip_malformed = skip_malformed
+        self.malformed = 0
+        self._stream = ByteStream()
+        self._message = DnsMessage()
+        self._stream.domains = self._message.domains
+
+    def decode(self, data: Buffer) -> PacketSummary:
+        """Decodes header and first question of packet."""
+
+        stream = self._stream
+        stream.load(data)
+        self._message.domains.clear()
+        id, options, qdcount, ancount, nscount, arcount = stream.unpack_from(
+            DnsMessageHeader.structure)
+        qname = qtype = qclass = None
+        if qdcount:
+            qname = DnsDomain.unpack(self._message, stream).label
+            qtype, qclass = stream.unpack_from(DnsMessageQuestion.structure)
+        return PacketSummary(id, options, qdcount, ancount, nscount, arcount, qname, qtype,
+                             qclass, data)
+
+    def decode_many(self, buffers: typing.Iterable[Buffer]) -> typing.Iterator[PacketSummary]:
+        """Decodes packets one by one.
+
+        Malformed packets are counted in `malformed` and skipped, unless decoder was
+        created with skip_malformed=False.
+        """
+
+        for data in buffers:
+            try:
+                yield self.decode(data)
+            except (MalformedPacket, MemoryError):
+                if not self.skip_malformed:
+                    raise
+                self.malformed += 1
+
+    def messages(self, buffers: typing.Iterable[Buffer],
+                 lazy=True) -> typing.Iterator[DnsMessage]:
+        """Decodes full messages one by one. Malformed packets are handled like in decode_many."""
+
+        for data in buffers:
+            try:
+                yield DnsMessage.unpack(data, lazy=lazy)
+            except (MalformedPacket, MemoryError):
+                if not self.skip_malformed:
+                    raise
+                self.malformed += 1
+
+    @classmethod
+    def header_array(cls, buffers: typing.Iterable[Buffer]):
+        """Returns numpy structured array with fixed header fields of packets.
+
+        Packets shorter than header are skipped. Flags can be extracted with shifts on
+        `options` field, e.g. `(array["options"] >> 15) & 1` for qr.
+        """
+
+        import numpy
+
+        byte_length = DnsMessageHeader.byte_length
+        headers = bytearray()
+        for data in buffers:
+            if len(data) >= byte_length:
+                headers += data[:byte_length]
+        return numpy.frombuffer(bytes(headers), dtype=numpy.dtype(cls.HEADER_DTYPE))
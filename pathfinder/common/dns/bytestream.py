@@ -1,37 +1,147 @@
+import struct
+import typing
+
+from pathfinder.common.dns.exceptions import MalformedPacket
+
+_structures: typing.Dict[str, struct.Struct] = {}
+
+
+def _structure(fmt: typing.Union[str, struct.Struct]) -> struct.Struct:
+    """Returns compiled Struct for format string."""
+
+    if isinstance(fmt, struct.Struct):
+        return fmt
+    try:
+        return _structures[fmt]
+    except KeyError:
+        return _structures.setdefault(fmt, struct.Struct(fmt))
+
+
 class ByteStream:
-    def __init__(self, data: bytes = b""):
-        if not isinstance(data, bytes):
+    """Cursor over wire data.
+
+    Reads are served from a memoryview of the original buffer, so read/peek/unpack_from
+    never copy the underlying bytes. Writes append to a growable bytearray.
+
+    `domains` is name compression table of data being read. Its offsets are relative to
+    this buffer, so it stays with the stream rather than with message built from it.
+    """
+
+    def __init__(self, data: typing.Union[bytes, bytearray, memoryview] = b""):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
             raise ValueError("Data can only be bytes")
-        self.data = data
+        self.buffer = data
+        self._view = None
         self.pos = 0
+        self.domains: typing.Optional["DomainStorage"] = None
+
+    def __len__(self):
+        return len(self.view)
+
+    @property
+    def view(self) -> memoryview:
+        """Zero-copy view of stream contents."""
+
+        if self._view is None:
+            self._view = memoryview(self.buffer)
+        return self._view
+
+    @property
+    def data(self) -> bytes:
+        """Returns stream contents as bytes."""
+
+        return bytes(self.buffer)
+
+    @property
+    def remaining(self) -> int:
+        """Number of octets after cursor."""
 
-    def read(self, length=None):
+        return len(self.view) - self.pos
+
+    def read(self, length=None) -> memoryview:
         """Reads and moves cursor to new position"""
 
-        if not length:
-            if self.pos == len(self.data):
+        if length is None:
+            if self.pos == len(self.view):
                 raise MemoryError("All data have been read, nothing here anymore.")
-            data = self.data[self.pos:]
-            self.pos = len(self.data)
+            data = self.view[self.pos:]
+            self.pos = len(self.view)
             return data
-        if self.pos + length > len(self.data):
+        if length < 0:
+            raise MalformedPacket(f"Negative read length {length}")
+        if self.pos + length > len(self.view):
             raise MemoryError("Cursor cant move above data length.")
-        result = self.data[self.pos: self.pos + length]
+        result = self.view[self.pos: self.pos + length]
         self.pos += length
         return result
 
-    def peek(self, length=None):
+    def peek(self, length=None) -> memoryview:
         """Reads without moving cursor to new position"""
 
-        if not length:
-            return self.data[self.pos:]
-        return self.data[self.pos: self.pos + length]
+        if length is None:
+            return self.view[self.pos:]
+        if length < 0:
+            raise MalformedPacket(f"Negative read length {length}")
+        return self.view[self.pos: self.pos + length]
+
+    def unpack_from(self, fmt: typing.Union[str, struct.Struct], offset: int = None) -> tuple:
+        """Unpacks struct from buffer.
+
+        :param fmt: struct format or compiled Struct
+        :param offset: absolute octet to unpack from. If omitted, unpacks at cursor
+            and moves cursor past unpacked data.
+        """
+
+        structure = _structure(fmt)
+        if offset is None:
+            offset = self.pos
+            if offset + structure.size > len(self.view):
+                raise MemoryError("Cursor cant move above data length.")
+            self.pos += structure.size
+        elif offset + structure.size > len(self.view):
+            raise MemoryError("Cursor cant move above data length.")
+        return structure.unpack_from(self.view, offset)
+
+    def pack_into(self, fmt: typing.Union[str, struct.Struct], offset: int, *values) -> None:
+        """Overwrites already written octets starting at offset."""
+
+        structure = _structure(fmt)
+        if offset + structure.size > len(self.buffer):
+            raise MemoryError("Cursor cant move above data length.")
+        self._writable()
+        structure.pack_into(self.buffer, offset, *values)
 
-    def write(self, data: bytes) -> None:
+    def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
         """Adds new bytes to data."""
 
-        self.data += data
-        self.pos = len(self.data)
+        self._writable()
+        self.buffer += data
+        self.pos = len(self.buffer)
+
+    def pack(self, fmt: typing.Union[str, struct.Struct], *values) -> None:
+        """Packs values and adds them to data."""
+
+        self._writable()
+        self.buffer += _structure(fmt).pack(*values)
+        self.pos = len(self.buffer)
+
+    def _writable(self):
+        """Switches stream to bytearray storage, so it can grow in place."""
+
+        # Exported views prevent bytearray from resizing, so view is dropped on write
+        # and recreated on next read.
+        self._view = None
+        if not isinstance(self.buffer, bytearray):
+            self.buffer = bytearray(self.buffer)
+
+    def load(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        """Replaces stream data and moves cursor to starting position."""
+
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise ValueError("Data can only be bytes")
+        self.buffer = data
+        self._view = None
+        self.pos = 0
 
     def reset(self):
         """Resets cursor to default position"""
@@ -41,5 +151,6 @@ class ByteStream:
     def clear(self):
         """Clears all data and moves cursor to starting position."""
 
-        self.data = b""
+        self._view = None
+        self.buffer = bytearray()
         self.pos = 0
@@ -0,0 +1,86 @@
+import time
+import typing
+from collections import OrderedDict
+from ipaddress import IPv4Address, IPv6Address
+
+from pathfinder.common.dns.domains import DnsName
+
+Address = typing.Union[IPv4Address, IPv6Address]
+
+
+class Delegation(typing.NamedTuple):
+    """Nameserver addresses of zone learned from referral."""
+
+    # Zone name key, lowercase without trailing dot
+    zone: str
+    nameservers: typing.Tuple[Address, ...]
+    expires_at: float
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at <= now
+
+
+class DelegationCache:
+    """LRU cache of zone cuts.
+
+    Keeps nameserver addresses of zones by zone name for the TTL of NS and glue records
+    they came from, so iterative resolution starts at the closest known zone instead of
+    root servers. TTL is capped by `max_ttl`, so a bogus delegation doesn't outlive it.
+    """
+
+    def __init__(self, maxsize=4096, max_ttl=86400):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.delegations: typing.Dict[str, Delegation] = OrderedDict()
+
+    def __len__(self):
+        return len(self.delegations)
+
+    def put(self, zone: typing.Union[str, DnsName], nameservers: typing.Iterable[Address],
+            ttl: int, now: float = None) -> None:
+        """Saves nameservers of zone. Delegation without addresses or TTL is not saved."""
+
+        nameservers = tuple(dict.fromkeys(nameservers))
+        zone = DnsName(zone).key
+        if not nameservers or ttl <= 0 or not zone:
+            return
+        now = time.time() if now is None else now
+        self.delegations[zone] = Delegation(zone, nameservers, now + min(ttl, self.max_ttl))
+        self.delegations.move_to_end(zone)
+        while len(self.delegations) > self.maxsize:
+            self.delegations.popitem(last=False)
+
+    def get(self, zone: typing.Union[str, DnsName],
+            now: float = None) -> typing.Union[Delegation, None]:
+        """Returns delegation of zone or None if it is unknown or expired."""
+
+        zone = DnsName(zone).key
+        delegation = self.delegations.get(zone)
+        if delegation is None:
+            return None
+        if delegation.expired(time.time() if now is None else now):
+            del self.delegations[zone]
+            return None
+        self.delegations.move_to_end(zone)
+        return delegation
+
+    def closest(self, name: typing.Union[str, DnsName],
+                ip_filter: typing.Callable[[Address], bool] = None,
+                now: float = None) -> typing.Union[Delegation, None]:
+        """Returns delegation of the deepest known zone name belongs to, including name
+        itself. None means resolution starts at root.
+
+        :param ip_filter: skip delegations without addresses passing filter
+        """
+
+        now = time.time() if now is None else now
+        for _, zone, _ in DnsName(name).suffixes:
+            delegation = self.get(zone, now)
+            if delegation is None:
+                continue
+            if ip_filter is None or any(map(ip_filter, delegation.nameservers)):
+                return delegation
+        return None
+
+    def clear(self):
+        self.delegations.clear()
@@ -1,111 +1,345 @@
-import struct
 import typing
 
+from pathfinder.common.dns.exceptions import MalformedPacket
 
-class DomainStorage(list):
-    def find_by_pos(self, pos: int) -> typing.Union["DnsDomain", None]:
+
+def _name_key(text: str) -> str:
+    """Returns canonical key of domain name text: lowercase without trailing dot."""
+
+    key = text.lower()
+    if key.endswith("."):
+        key = key[:-1]
+    # Already canonical text is used as key, not copied
+    return text if key == text else key
+
+
+class DnsName:
+    """Immutable domain name.
+
+    Comparison and hash are case insensitive and use canonical key (lowercase name
+    without trailing dot). Names are not interned: instances are small and short-lived
+    copies cost less than a shared table, equal names compare by key string. Wire form
+    and suffixes are computed on first use, labels on every use.
+    """
+
+    __slots__ = ("text", "key", "_wire", "_suffixes")
+
+    text: str
+    key: str
+
+    def __new__(cls, text: typing.Union[str, "DnsName", None] = ""):
+        if isinstance(text, DnsName):
+            return text
+        if text is None:
+            text = ""
+        name = object.__new__(cls)
+        set_field = object.__setattr__
+        set_field(name, "text", text)
+        set_field(name, "key", _name_key(text))
+        set_field(name, "_wire", None)
+        set_field(name, "_suffixes", None)
+        return name
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    __delattr__ = __setattr__
+
+    @property
+    def labels(self) -> typing.Tuple[str, ...]:
+        """Domain labels, empty for root."""
+
+        return tuple(label for label in self.text.split(".") if label)
+
+    @property
+    def wire(self) -> bytes:
+        """Uncompressed wire encoding."""
+
+        if self._wire is None:
+            wire = bytearray()
+            for label in self.labels:
+                encoded = label.encode("ascii")
+                wire.append(len(encoded))
+                wire += encoded
+            wire.append(0)
+            object.__setattr__(self, "_wire", bytes(wire))
+        return self._wire
+
+    @property
+    def suffixes(self) -> typing.Tuple[typing.Tuple[str, str, bytes], ...]:
+        """(suffix text, suffix key, encoded first label) for every label, longest first.
+
+        Used for name compression.
+        """
+
+        if self._suffixes is None:
+            labels = self.labels
+            suffixes = []
+            for n, label in enumerate(labels):
+                text = ".".join(labels[n:])
+                encoded = label.encode("ascii")
+                suffixes.append((text, text.lower(), bytes((len(encoded),)) + encoded))
+            object.__setattr__(self, "_suffixes", tuple(suffixes))
+        return self._suffixes
+
+    @property
+    def canonical(self) -> "DnsName":
+        """Lowercase name."""
+
+        return self if self.key is self.text else DnsName(self.key)
+
+    def __hash__(self):
+        # Key string caches its own hash
+        return hash(self.key)
+
+    def __eq__(self, other):
+        if isinstance(other, DnsName):
+            return self.key == other.key
+        if isinstance(other, str):
+            return other == self.text or _name_key(other) == self.key
+        return NotImplemented
+
+    def __len__(self):
+        return len(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.text!r})"
+
+    def __reduce__(self):
+        return self.__class__, (self.text,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class DomainStorage:
+    """Message name compression table (RFC 1035 4.1.4).
+
+    Keeps two indexes: octet offset -> domain suffix for pointer resolution and
+    lowercased suffix -> offset for pointer emission, so both are dict lookups.
+    """
+
+    # Compression pointer keeps offset in 14 bits
+    MAX_POINTER = 0x3FFF
+
+    def __init__(self, compress=True, canonical=False):
+        """
+        :param compress: emit compression pointers
+        :param canonical: write names lowercased (RFC 4034 6.2), implies no compression
+        """
+
+        self.compress = compress and not canonical
+        self.canonical = canonical
+        self.by_pos: typing.Dict[int, str] = {}
+        self.by_label: typing.Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.by_pos)
+
+    def __iter__(self):
+        return iter(self.by_pos.values())
+
+    def add(self, label: str, pos: int, key: str = None) -> None:
+        """Remembers domain suffix starting at pos. First occurrence wins.
+
+        :param label: domain name
+        :param pos: starting octet of domain
+        :param key: lowercased label, if already known
+        """
+
+        if pos > self.MAX_POINTER or not self.compress:
+            return
+        self.by_pos.setdefault(pos, label)
+        self.by_label.setdefault(label.lower() if key is None else key, pos)
+
+    def find_by_pos(self, pos: int) -> typing.Union[str, None]:
         """Finds domain in storage by its position.
 
         :param pos: starting octet of domain
-        :return: DnsDomain or None
+        :return: domain name or None
         """
 
-        for domain in self:
-            if domain.pos == pos:
-                return domain
+        return self.by_pos.get(pos)
 
-    def find_by_label(self, label: str) -> typing.Union["DnsDomain", None]:
-        """Finds domain in storage by its label.
+    def find_by_label(self, label: str) -> typing.Union[int, None]:
+        """Finds domain position in storage by its label. Case insensitive.
 
         :param label: domain name
-        :return: DnsDomain or None
+        :return: starting octet of domain or None
         """
 
-        for domain in self:
-            if domain.label == label:
-                return domain
+        return self.by_label.get(label.lower())
+
+    def find_by_key(self, key: str) -> typing.Union[int, None]:
+        """Finds domain position in storage by lowercased label."""
+
+        return self.by_label.get(key)
+
+    def clear(self) -> None:
+        self.by_pos.clear()
+        self.by_label.clear()
 
 
 class DnsDomain:
+    """Domain name placed in message."""
+
+    __slots__ = ("message", "name", "pos", "shortable")
+
+    # Maximum domain length in wire format
+    MAX_LENGTH = 255
+
     def __init__(self, message, label="", position=None, can_be_shortened=True):
         self.message = message
-        self.label = label
+        self.name = DnsName(label)
         self.pos = position
         self.shortable = can_be_shortened
 
+    @property
+    def label(self) -> str:
+        return self.name.text
+
+    @label.setter
+    def label(self, value):
+        self.name = DnsName(value)
+
     @property
     def byte_length(self) -> int:
-        return len(self.pack())
+        """Length of uncompressed domain in wire format."""
+
+        return len(self.name.wire)
 
     @classmethod
     def unpack(cls, message: "DnsMessage", data: "ByteStream") -> "DnsDomain":
-        """Unpacks bytes to domain name."""
+        """Unpacks bytes to domain name.
 
-        domain = cls(message)
-        pos = data.pos
-        domain_length = struct.unpack("!B", data.peek(1))[0]
-        while domain_length != 0:
-            if domain_length >= 192:
-                domain.label = f"{domain.label}." if domain.label else domain.label
-                domain.label += domain.from_pos(struct.unpack("!H", data.read(2))[0] - 49152)
-                break
-            else:
-                data.read(1)  # domain_length byte
-                domain.label += data.read(domain_length).decode("ascii")
-            domain_length = struct.unpack("!B", data.peek(1))[0]
-            if 0 < domain_length < 192:
-                domain.label += "."
-        else:
-            data.read(1)
-        for n, subdomain in enumerate(domain.label.split(".")):
-            dmn = ".".join(domain.label.split(".")[n:])
-            message.domains.append(DnsDomain(message, dmn, pos))
-            pos += len(subdomain) + 1
+        Compression pointers are resolved with compression table of the stream, which is
+        created on first use. Pointers are only allowed to refer to octets prior to the
+        current label sequence, which also makes pointer loops impossible.
+        """
+
+        domains = data.domains
+        if domains is None:
+            domains = data.domains = DomainStorage()
+        view = data.view
+        pos = limit = data.pos
+        end = None
+        suffix = None
+        length = 1
+        labels = []
+        offsets = []
+        try:
+            domain_length = view[pos]
+            while domain_length != 0:
+                if domain_length >= 192:
+                    pointer = ((domain_length - 192) << 8) + view[pos + 1]
+                    if pointer >= limit:
+                        raise MalformedPacket(f"Bad compression pointer {pointer} at {pos}")
+                    if end is None:
+                        end = pos + 2
+                    suffix = domains.find_by_pos(pointer)
+                    if suffix is not None:
+                        length += len(suffix) + 1
+                        break
+                    pos = limit = pointer
+                elif domain_length >= 64:
+                    raise MalformedPacket(f"Unknown label type at {pos}")
+                else:
+                    length += domain_length + 1
+                    if pos + 1 + domain_length > len(view):
+                        raise MalformedPacket("Domain label is out of message bounds")
+                    offsets.append(pos)
+                    labels.append(str(view[pos + 1: pos + 1 + domain_length], "ascii"))
+                    pos += domain_length + 1
+                if length > cls.MAX_LENGTH:
+                    raise MalformedPacket("Domain name is too long")
+                domain_length = view[pos]
+        except IndexError:
+            raise MalformedPacket("Domain is out of message bounds")
+        except UnicodeDecodeError:
+            raise MalformedPacket(f"Domain label is not ASCII at {pos}")
+        data.pos = pos + 1 if end is None else end
+
+        label = suffix
+        for subdomain, offset in zip(reversed(labels), reversed(offsets)):
+            label = f"{subdomain}.{label}" if label else subdomain
+            domains.add(label, offset)
+        domain = cls.__new__(cls)
+        domain.message = message
+        domain.name = DnsName(label)
+        domain.pos = None
+        domain.shortable = True
         return domain
 
+    @staticmethod
+    def skip(data: "ByteStream") -> None:
+        """Moves cursor past domain without decoding it."""
+
+        view = data.view
+        pos = data.pos
+        try:
+            domain_length = view[pos]
+            while domain_length != 0:
+                if domain_length >= 192:
+                    pos += 1
+                    break
+                elif domain_length >= 64:
+                    raise MalformedPacket(f"Unknown label type at {pos}")
+                pos += domain_length + 1
+                domain_length = view[pos]
+        except IndexError:
+            raise MalformedPacket("Domain is out of message bounds")
+        if pos >= len(view):
+            raise MalformedPacket("Domain is out of message bounds")
+        data.pos = pos + 1
+
     def from_pos(self, pos) -> str:
         """Finds domain by its start position octet."""
 
-        return self.message.domains.find_by_pos(pos).label
-
-    def pack(self) -> bytes:
-        """Encodes domain to bytes."""
+        return self.message.domains.find_by_pos(pos)
 
-        packed = b""
-        bs = self.message.bytestream
-        md = self.message.domains
+    def pack(self, message: "DnsMessage" = None) -> None:
+        """Encodes domain into message bytestream."""
 
-        for n, subdomain in enumerate(self.label.split(".")):
-            if subdomain == "":
-                break
-            find_domain = ".".join(self.label.split(".")[n:])
+        message = message or self.message
+        bs = message.bytestream
+        md = message.domains
 
-            if self.message.domains.find_by_label(find_domain) and self.shortable:
-                data = struct.pack("!H", md.find_by_label(find_domain).pos + 49152)
-                md.append(DnsDomain(self.message, find_domain, self.message.bytestream.pos))
-                bs.write(data)
-                return packed + data
+        if not md.compress:
+            bs.write(self.name.canonical.wire if md.canonical else self.name.wire)
+            return
+        for text, key, label in self.name.suffixes:
+            if self.shortable:
+                pointer = md.find_by_key(key)
+                if pointer is not None:
+                    bs.pack("!H", pointer + 49152)
+                    return
 
-            md.append(DnsDomain(self.message, find_domain, self.message.bytestream.pos))
-            data = struct.pack("!B", len(subdomain))
-            data += subdomain.encode("ascii")
-            packed += data
-            bs.write(data)
+            md.add(text, bs.pos, key)
+            bs.write(label)
 
-        packed += struct.pack("!B", 0)
-        bs.write(struct.pack("!B", 0))
-        return packed
+        bs.pack("!B", 0)
 
     def __repr__(self):
         return self.label
 
     def __eq__(self, other):
+        """Case insensitive comparison with domain, name or string."""
+
         if isinstance(other, DnsDomain):
-            return other.label == self.label
-        return other == self.label
+            return other.name == self.name
+        return self.name == other
+
+    def __hash__(self):
+        return hash(self.name)
 
     def lower(self):
-        return self.label.lower()
+        return self.name.key
 
     def upper(self):
         return self.label.upper()
@@ -1,12 +1,15 @@
 import json
 import random
+import typing
 from collections import OrderedDict
 
 import pathfinder.common.dns.parts as message_parts
 from pathfinder.common.dns.bytestream import ByteStream
-from pathfinder.common.dns.domains import DomainStorage, DnsDomain
+from pathfinder.common.dns.domains import DomainStorage
 from pathfinder.common.dns.exceptions import MalformedPacket
-from pathfinder.common.dns.parts import DnsMessageHeader, DnsMessageQuestion, rdata
+from pathfinder.common.dns.parts import DnsMessageHeader, DnsMessageQuestion
+
+COMPACT_ENCODER = json.JSONEncoder(separators=(",", ":"))
 
 
 class DnsMessage:
@@ -22,43 +25,55 @@ class DnsMessage:
 
     @property
     def unique_domains(self):
-        return set([domain.label for domain in self.domains])
+        return set(self.domains)
 
     @property
     def used_domains(self):
+        """Names referenced by rdata of records which need additional section processing."""
+
         domains = set()
-        parts = ("answer", "authority", "additional")
-        for part_name in parts:
-            part = getattr(self, part_name)
-            for resource in part:
-                for value in resource.__dict__.values():
-                    if isinstance(value, DnsDomain):
-                        domains.add(value.label)
-                    elif isinstance(value, rdata.Rdata):
-                        for rdata_value in value.__dict__.values():
-                            if isinstance(rdata_value, DnsDomain):
-                                domains.add(rdata_value.label)
+        for part in (self.answer, self.authority, self.additional):
+            domains.update(name.text for name in part.referenced_names.values())
         return domains
 
     @classmethod
-    def unpack(cls, data: bytes):
-        """Unpacks dns message from bytes."""
+    def unpack(cls, data: typing.Union[bytes, bytearray, memoryview], lazy=False):
+        """Unpacks dns message from bytes.
+
+        :param data: wire data
+        :param lazy: decode only header and question. Answer, authority and additional
+            sections are decoded on first access from their recorded offsets. Data must not
+            be modified while message is in use.
+        """
 
         data = ByteStream(data)
         message = cls()
-
-        message.header = message_parts.DnsMessageHeader.unpack(message, data.read(12))
-
-        unpack_order = [
-            (message_parts.DnsMessageQuestion, message.question, message.header._qdcount),
-            (message_parts.DnsMessageAnswer, message.answer, message.header._ancount),
-            (message_parts.DnsMessageAnswer, message.authority, message.header._nscount),
-            (message_parts.DnsMessageAnswer, message.additional, message.header._arcount)
+        # Sections decoded later must not see the table which message.pack() rebuilds
+        data.domains = DomainStorage() if lazy else message.domains
+
+        message.header = message_parts.DnsMessageHeader.unpack(message, data)
+        data = message.parse_resource_record(
+            message, message_parts.DnsMessageQuestion, message.question,
+            message.header._qdcount, data)
+
+        sections = [
+            ("answer", message.header._ancount),
+            ("authority", message.header._nscount),
+            ("additional", message.header._arcount)
         ]
-        for part in unpack_order:
-            data = message.parse_resource_record(message, *part, data)
-
-        if len(data.peek()) != 0:
+        for section, count in sections:
+            if lazy:
+                offset = data.pos
+                for rr in range(count):
+                    message_parts.DnsMessageAnswer.skip(data)
+                setattr(message, section, message_parts.LazyDnsPartStorage(
+                    message, message_parts.DnsMessageAnswer, count, data, offset))
+            else:
+                data = message.parse_resource_record(
+                    message, message_parts.DnsMessageAnswer, getattr(message, section), count,
+                    data)
+
+        if data.remaining != 0:
             raise MalformedPacket()
         return message
 
@@ -75,12 +90,11 @@ class DnsMessage:
 
         self.bytestream.clear()
         self.domains.clear()
-        result = b""
-        self.header.pack()
-        result += self.question.pack()
-        result += self.answer.pack()
-        result += self.authority.pack()
-        result += self.additional.pack()
+        self.header.pack(self)
+        self.question.pack(self)
+        self.answer.pack(self)
+        self.authority.pack(self)
+        self.additional.pack(self)
         return self.bytestream.data
 
     def to_dict(self):
@@ -128,7 +142,12 @@ class DnsMessage:
 
         return message
 
-    def to_json(self) -> str:
-        """Return pretty JSON representation of dns message."""
+    def to_json(self, compact=False) -> str:
+        """Return JSON representation of dns message.
+
+        :param compact: single line without whitespace, for logs
+        """
 
+        if compact:
+            return COMPACT_ENCODER.encode(self.to_dict())
         return json.dumps(self.to_dict(), indent=4)
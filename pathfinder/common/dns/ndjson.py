@@ -0,0 +1,42 @@
+import typing
+
+from pathfinder.common.dns.message import COMPACT_ENCODER, DnsMessage
+
+
+class NdjsonWriter:
+    """Writes messages to text file object as newline delimited JSON.
+
+    Messages are serialized one at a time, so batch of any size is never held as dicts
+    in memory. Wire data is decoded before writing.
+    """
+
+    def __init__(self, file: typing.TextIO, flush=False):
+        self.file = file
+        self.flush = flush
+        self.written = 0
+
+    def write(self, message: typing.Union[DnsMessage, bytes, bytearray, memoryview]):
+        """Writes single message line."""
+
+        if not isinstance(message, DnsMessage):
+            message = DnsMessage.unpack(message)
+        self.file.write(COMPACT_ENCODER.encode(message.to_dict()))
+        self.file.write("\n")
+        self.written += 1
+        if self.flush:
+            self.file.flush()
+
+    def write_many(self, messages: typing.Iterable) -> int:
+        """Writes messages from iterable. Returns number of written lines."""
+
+        count = 0
+        for message in messages:
+            self.write(message)
+            count += 1
+        return count
+
+
+def dump(messages: typing.Iterable, file: typing.TextIO) -> int:
+    """Writes messages to file as NDJSON. Returns number of written lines."""
+
+    return NdjsonWriter(file).write_many(messages)
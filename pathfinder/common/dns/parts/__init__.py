@@ -4,4 +4,4 @@ from .answer import DnsMessageAnswer
 from .header import DnsMessageHeader
 from .part import DnsMessagePart
 from .question import DnsMessageQuestion
-from .storage import DnsPartStorage
+from .storage import DnsPartStorage, LazyDnsPartStorage
@@ -1,53 +1,78 @@
 import struct
-import time
 import typing
 
 from pathfinder.common.dns.domains import DnsDomain
+from pathfinder.common.dns.exceptions import MalformedPacket
 from pathfinder.common.dns.parts import DnsMessagePart, rdata
 
 
 class DnsMessageAnswer(DnsMessagePart):
+    __slots__ = ("name", "type", "klass", "ttl", "rdata", "_rdlength")
+
+    name: DnsDomain
+    type: int
+    klass: int
+    ttl: int
+    rdata: rdata.Rdata
+
+    structure = struct.Struct("!HHLH")
+
     def __init__(self, message, name: typing.Union[DnsDomain, str] = None,
                  type: int = None, klass: int = None, ttl: int = None,
                  rdata: rdata.Rdata = None):
-        self._message = message
         self.name = DnsDomain(message, label=name) if isinstance(name, str) else name
         self.type = type
         self.klass = klass
         self.ttl = ttl
         self.rdata = rdata
-        self.__timestamp__ = time.time()
-
-    @property
-    def expired(self):
-        return True if (self.__timestamp__ + self.ttl) < time.time() else False
-
-    @property
-    def ttl_left(self):
-        return int((self.__timestamp__ + self.ttl) - time.time())
 
     @property
     def rdlength(self) -> int:
-        return len(self.rdata.pack())
+        return len(self.rdata.to_wire())
 
     @classmethod
     def unpack(cls, message: "DnsMessage", data: "ByteStream"):
         """Unpacks answer from bytes."""
 
-        answer = cls(message)
+        answer = cls.__new__(cls)
         answer.name = DnsDomain.unpack(message, data)
-        answer.type, answer.klass, answer.ttl, answer._rdlength = struct.unpack(
-            "!HHLH", data.read(10)
-        )
-        answer.rdata = rdata.Rdata.by_type(answer.type).unpack(answer, data)
+        answer.type, answer.klass, answer.ttl, answer._rdlength = data.unpack_from(
+            cls.structure)
+        answer.rdata = cls.unpack_rdata(answer, data)
         return answer
 
-    def pack(self):
-        """Packs answer to bytes."""
+    @staticmethod
+    def unpack_rdata(answer: "DnsMessageAnswer", data: "ByteStream") -> "rdata.Rdata":
+        """Unpacks rdata of answer, which must take exactly rdlength octets."""
+
+        if answer._rdlength > data.remaining:
+            raise MalformedPacket("Rdata is out of message bounds")
+        start = data.pos
+        result = rdata.Rdata.by_type(answer.type).unpack(answer, data)
+        if data.pos - start != answer._rdlength:
+            raise MalformedPacket(
+                f"Rdata takes {data.pos - start} octets, rdlength is {answer._rdlength}")
+        return result
+
+    @classmethod
+    def skip(cls, data: "ByteStream") -> None:
+        """Moves cursor past answer without decoding it."""
+
+        DnsDomain.skip(data)
+        rdlength = data.unpack_from(cls.structure)[3]
+        if rdlength > data.remaining:
+            raise MalformedPacket("Rdata is out of message bounds")
+        data.pos += rdlength
+
+    def pack(self, message: "DnsMessage"):
+        """Packs answer into message bytestream.
 
-        name = self.name.pack()
-        fields = struct.pack("!HHLH", self.type, self.klass, self.ttl, self.rdlength)
-        _rdata = self.rdata.pack()
-        self._message.bytestream.write(fields + _rdata)
+        Rdata is written once, rdlength is patched in after it.
+        """
 
-        return name + fields + _rdata
+        stream = message.bytestream
+        self.name.pack(message)
+        stream.pack(self.structure, self.type, self.klass, self.ttl, 0)
+        rdata_start = stream.pos
+        self.rdata.pack(message)
+        stream.pack_into("!H", rdata_start - 2, stream.pos - rdata_start)
@@ -4,9 +4,37 @@ from pathfinder.common.dns.exceptions import DnsException
 from pathfinder.common.dns.parts import DnsMessagePart
 
 
+class HeaderFlag:
+    """Header field stored in bits of 16 bit options word."""
+
+    __slots__ = ("shift", "mask", "is_bool")
+
+    def __init__(self, shift, length):
+        self.shift = shift
+        self.mask = (1 << length) - 1
+        self.is_bool = length == 1
+
+    def __get__(self, header, owner=None):
+        if header is None:
+            return self
+        return self.value(header._options)
+
+    def value(self, options: int):
+        """Extracts field value from options word."""
+
+        value = (options >> self.shift) & self.mask
+        return bool(value) if self.is_bool else value
+
+    def __set__(self, header, value):
+        header._options = (header._options & ~(self.mask << self.shift)) | \
+                          ((int(value or 0) & self.mask) << self.shift)
+
+
 class DnsMessageHeader(DnsMessagePart):
     """Dns message header."""
 
+    __slots__ = ("_message", "id", "_options", "_qdcount", "_ancount", "_nscount", "_arcount")
+
     lengths = {
         # Length in binary format
         "id": 16,
@@ -35,11 +63,26 @@ class DnsMessageHeader(DnsMessagePart):
         "arcount": "H"
     }.values())))
 
+    flags = ("qr", "opcode", "aa", "tc", "rd", "ra", "z", "rcode")
+
+    qr = HeaderFlag(15, lengths["qr"])
+    opcode = HeaderFlag(11, lengths["opcode"])
+    aa = HeaderFlag(10, lengths["aa"])
+    tc = HeaderFlag(9, lengths["tc"])
+    rd = HeaderFlag(8, lengths["rd"])
+    ra = HeaderFlag(7, lengths["ra"])
+    z = HeaderFlag(4, lengths["z"])
+    rcode = HeaderFlag(0, lengths["rcode"])
+
+    flag_fields = (("qr", qr), ("opcode", opcode), ("aa", aa), ("tc", tc), ("rd", rd),
+                   ("ra", ra), ("z", z), ("rcode", rcode))
+
     def __init__(self, message, id=None, qr=None, opcode=None, aa=None, tc=None, rd=None,
                  ra=None, z=None, rcode=None, qdcount=None, ancount=None, nscount=None,
                  arcount=None):
         self._message = message
         self.id = id
+        self._options = 0
         self.qr = qr
         self.opcode = opcode
         self.aa = aa
@@ -73,37 +116,38 @@ class DnsMessageHeader(DnsMessagePart):
     def options(self):
         """Proxy for 3rd and 4th octets with less than 1 byte fields."""
 
-        result = ""
-        order = ("qr", "opcode", "aa", "tc", "rd", "ra", "z", "rcode")
-        for field in order:
-            result += bin(getattr(self, field))[2:].zfill(self.lengths[field])
-        return int(result, 2)
+        return self._options
+
+    @options.setter
+    def options(self, value):
+        self._options = value
 
     @classmethod
-    def unpack(cls, message, data: bytes):
+    def unpack(cls, message, data: "ByteStream"):
         """Unpacks header from bytes."""
 
-        header = cls(message)
-        header.id, options, header._qdcount, header._ancount, header._nscount, header._arcount = \
-            header.structure.unpack(data[:12])
-        bin_options = bin(options)[2:].zfill(16)
-        header.qr = bool(bin_options[0])
-        header.opcode = int(bin_options[1:5], 2)
-        header.aa = bool(int(bin_options[5]))
-        header.tc = bool(int(bin_options[6]))
-        header.rd = bool(int(bin_options[7]))
-        header.ra = bool(int(bin_options[8]))
-        header.z = int(bin_options[9:12], 2)
-        header.rcode = int(bin_options[12:16], 2)
+        header = cls.__new__(cls)
+        header._message = message
+        header.id, header._options, header._qdcount, header._ancount, header._nscount, \
+            header._arcount = data.unpack_from(cls.structure)
         return header
 
-    def pack(self):
-        """Packs header to bytes."""
+    def to_dict(self):
+        """Returns dict representation of header."""
+
+        options = self._options
+        header_dict = {"id": self.id}
+        for flag, field in self.flag_fields:
+            header_dict[flag] = field.value(options)
+        return header_dict
+
+    def pack(self, message: "DnsMessage" = None):
+        """Packs header into message bytestream."""
 
-        packed = self.structure.pack(
-            self.id, self.options, self.qdcount, self.ancount, self.nscount, self.arcount
+        message = message or self._message
+        if message.bytestream.pos != 0:
+            raise DnsException("Header must be packed first")
+        message.bytestream.pack(
+            self.structure, self.id, self.options, len(message.question), len(message.answer),
+            len(message.authority), len(message.additional)
         )
-        if len(packed) != self.byte_length:
-            raise DnsException(f"Bad header length {len(packed)}")
-        self._message.bytestream.write(packed)
-        return packed
@@ -1,14 +1,114 @@
+import functools
+import ipaddress
+import operator
+import typing
 from abc import abstractmethod
 
 from pathfinder.common.dns.domains import DnsDomain
 
 
+@functools.lru_cache(maxsize=None)
+def public_slots(cls) -> typing.Tuple[str, ...]:
+    """Returns public attribute names from __slots__ of class and its parents."""
+
+    fields = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get("__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if not name.startswith("_") and name not in fields:
+                fields.append(name)
+    return tuple(fields)
+
+
+def public_attributes(obj) -> typing.List[typing.Tuple[str, typing.Any]]:
+    """Returns public (name, value) pairs of slotted object. Unset slots are skipped."""
+
+    attributes = []
+    for name in public_slots(type(obj)):
+        try:
+            attributes.append((name, getattr(obj, name)))
+        except AttributeError:
+            continue
+    for name, value in getattr(obj, "__dict__", {}).items():
+        if not name.startswith("_"):
+            attributes.append((name, value))
+    return attributes
+
+
+MISSING = object()
+
+# Field annotation -> export converter. None means value is exported as is.
+EXPORTERS = {
+    DnsDomain: operator.attrgetter("label"),
+    ipaddress.IPv4Address: str,
+    ipaddress.IPv6Address: str,
+    bool: None,
+    int: None,
+    str: None,
+}
+
+
+def export_value(value):
+    """Converts field value of unknown type for dict representation."""
+
+    if isinstance(value, DnsDomain):
+        return value.label
+    if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return str(value)
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def field_exporters(cls) -> typing.Tuple[typing.Tuple[str, typing.Any], ...]:
+    """Returns (name, converter) pairs for public slots of class.
+
+    Converter is chosen once from field annotation. Fields without annotation are
+    converted with `export_value`.
+    """
+
+    annotations = {}
+    for klass in reversed(cls.__mro__):
+        annotations.update(klass.__dict__.get("__annotations__", {}))
+    exporters = []
+    for name in public_slots(cls):
+        annotation = annotations.get(name)
+        if annotation in EXPORTERS:
+            converter = EXPORTERS[annotation]
+        elif isinstance(annotation, type) and hasattr(annotation, "to_dict"):
+            converter = operator.methodcaller("to_dict")
+        else:
+            converter = export_value
+        exporters.append((name, converter))
+    return tuple(exporters)
+
+
+def export_fields(obj) -> dict:
+    """Returns dict of public fields of object converted by precompiled exporters."""
+
+    fields = {}
+    for name, converter in field_exporters(type(obj)):
+        value = getattr(obj, name, MISSING)
+        if value is MISSING:
+            continue
+        fields[name] = value if converter is None or value is None else converter(value)
+    # Classes without __slots__ (like OPT) keep their fields in __dict__
+    if type(obj).__dictoffset__:
+        for name, value in obj.__dict__.items():
+            if not name.startswith("_"):
+                fields[name] = export_value(value)
+    return fields
+
+
 class DnsMessagePart:
     """Base part class."""
 
+    __slots__ = ()
+
     @abstractmethod
-    def pack(self):
-        """Packs message part to bytes."""
+    def pack(self, message=None):
+        """Packs message part into message bytestream."""
 
     @classmethod
     @abstractmethod
@@ -18,13 +118,4 @@ class DnsMessagePart:
     def to_dict(self):
         """Returns dict representation of dns message part."""
 
-        part_dict = {}
-        for k, v in {attr: val for attr, val in self.__dict__.items()
-                     if not attr.startswith("_")}.items():
-            if isinstance(v, DnsDomain):
-                part_dict[k] = v.label
-            elif hasattr(v, "to_dict"):
-                part_dict[k] = v.to_dict()
-            else:
-                part_dict[k] = v
-        return part_dict
+        return export_fields(self)
@@ -7,32 +7,33 @@ from pathfinder.common.dns.parts import DnsMessagePart
 class DnsMessageQuestion(DnsMessagePart):
     """Dns question."""
 
+    __slots__ = ("_message", "qname", "qtype", "qclass")
+
     qname: DnsDomain
     qtype: int
     qclass: int
 
+    structure = struct.Struct("!HH")
+
     def __init__(self, message, qname=None, qtype=None, qclass=None):
         self._message = message
         self.qname = DnsDomain(message, qname)
         self.qtype = qtype
         self.qclass = qclass
 
-    def pack(self):
-        """Packs question to bytes."""
+    def pack(self, message: "DnsMessage" = None):
+        """Packs question into message bytestream."""
 
-        result = self.qname.pack()
-        result += struct.pack("!H", self.qtype)
-        result += struct.pack("!H", self.qclass)
-        self._message.bytestream.write(struct.pack("!H", self.qtype) +
-                                       struct.pack("!H", self.qclass))
-        return result
+        message = message or self._message
+        self.qname.pack(message)
+        message.bytestream.pack(self.structure, self.qtype, self.qclass)
 
     @classmethod
     def unpack(cls, message, data):
         """Unpacks question from bytes."""
 
-        question = cls(message)
+        question = cls.__new__(cls)
+        question._message = message
         question.qname = DnsDomain.unpack(message, data)
-        question.qtype = struct.unpack("!H", data.read(2))[0]
-        question.qclass = struct.unpack("!H", data.read(2))[0]
+        question.qtype, question.qclass = data.unpack_from(cls.structure)
         return question
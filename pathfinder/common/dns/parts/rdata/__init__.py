@@ -9,3 +9,4 @@ from .ptr import Ptr
 from .caa import Caa
 from .soa import Soa
 from .txt import Txt
+from .unknown import Unknown
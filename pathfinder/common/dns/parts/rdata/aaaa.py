@@ -4,6 +4,8 @@ from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Aaaa(Rdata):
+    __slots__ = ("address",)
+
     address: ipaddress.IPv6Address
     type = 28
 
@@ -12,10 +14,11 @@ class Aaaa(Rdata):
         """Unpacks AAAA RR from byte format."""
 
         aaaa = cls()
-        aaaa.address = ipaddress.IPv6Address(data.read(answer._rdlength))
+        high, low = data.unpack_from("!QQ")
+        aaaa.address = ipaddress.IPv6Address((high << 64) + low)
         return aaaa
 
-    def pack(self):
+    def pack(self, message):
         """Packs AAAA RR to bytes."""
 
-        return int(self.address).to_bytes(16, "big")
+        message.bytestream.write(self.address.packed)
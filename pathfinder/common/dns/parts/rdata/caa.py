@@ -1,10 +1,10 @@
-import struct
-
-from pathfinder.common.dns.exceptions import DnsException
+from pathfinder.common.dns.exceptions import DnsException, MalformedPacket
 from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Caa(Rdata):
+    __slots__ = ("critical", "tag", "value")
+
     type = 257
 
     critical: bool
@@ -16,22 +16,21 @@ class Caa(Rdata):
         """Unpacks CAA RR from bytes."""
 
         caa = cls()
-        caa.critical = struct.unpack("!?", data.read(1))[0]
-        tag_length = struct.unpack("!B", data.read(1))[0]
-        caa.tag = data.read(tag_length).decode("ascii")
-        caa.value = data.read(answer._rdlength - 2 - tag_length).decode('ascii')
+        caa.critical, tag_length = data.unpack_from("!?B")
+        try:
+            caa.tag = str(data.read(tag_length), "ascii")
+            caa.value = str(data.read(answer._rdlength - 2 - tag_length), "ascii")
+        except UnicodeDecodeError:
+            raise MalformedPacket("CAA tag or value is not ASCII")
 
         return caa
 
-    def pack(self):
+    def pack(self, message):
         """Packs CAA RR to bytes."""
 
-        packed = b""
         if self.tag not in ("issue", "issuewild", "iodef"):
             raise DnsException("Wrong CAA tag value")
-        packed += struct.pack("!?", self.critical)
-        tag_length = len(self.tag.encode("ascii"))
-        packed += struct.pack("!B", tag_length) + self.tag.encode("ascii")
-        packed += self.value.encode("ascii")
-
-        return packed
+        tag = self.tag.encode("ascii")
+        message.bytestream.pack("!?B", self.critical, len(tag))
+        message.bytestream.write(tag)
+        message.bytestream.write(self.value.encode("ascii"))
@@ -3,14 +3,17 @@ from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Cname(Rdata):
+    __slots__ = ("cname",)
+
     type = 5
+    ADDITIONAL_NAMES = ("cname",)
     cname: DnsDomain
 
     @classmethod
     def unpack(cls, answer, data):
         cname = cls()
-        cname.cname = DnsDomain.unpack(answer._message, data)
+        cname.cname = DnsDomain.unpack(None, data)
         return cname
 
-    def pack(self):
-        return self.cname.pack()
+    def pack(self, message):
+        self.cname.pack(message)
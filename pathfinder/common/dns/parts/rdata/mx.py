@@ -1,24 +1,24 @@
 #  Copyright (c) Yurzs 2019.
 
-import struct
-
 from pathfinder.common.dns.domains import DnsDomain
 from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Mx(Rdata):
+    __slots__ = ("preference", "exchange")
+
     preference: int
     exchange: DnsDomain
     type = 15
+    ADDITIONAL_NAMES = ("exchange",)
 
     @classmethod
     def unpack(cls, answer, data):
         mx = cls()
-        mx.preference = struct.unpack("!H", data.read(2))[0]
-        mx.exchange = DnsDomain.unpack(answer._message, data)
+        mx.preference = data.unpack_from("!H")[0]
+        mx.exchange = DnsDomain.unpack(None, data)
         return mx
 
-    def pack(self):
-        packed = struct.pack("!H", self.preference)
-        packed += self.exchange.pack()
-        return packed
+    def pack(self, message):
+        message.bytestream.pack("!H", self.preference)
+        self.exchange.pack(message)
@@ -3,14 +3,17 @@ from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Ns(Rdata):
+    __slots__ = ("nsdname",)
+
     nsdname: DnsDomain
     type = 2
+    ADDITIONAL_NAMES = ("nsdname",)
 
     @classmethod
     def unpack(cls, answer, data):
         ns = cls()
-        ns.nsdname = DnsDomain.unpack(answer._message, data)
+        ns.nsdname = DnsDomain.unpack(None, data)
         return ns
 
-    def pack(self):
-        return self.nsdname.pack()
+    def pack(self, message):
+        self.nsdname.pack(message)
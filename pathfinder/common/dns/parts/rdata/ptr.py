@@ -3,14 +3,16 @@ from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Ptr(Rdata):
+    __slots__ = ("ptrdname",)
+
     ptrdname: DnsDomain
     type = 12
 
     @classmethod
     def unpack(cls, answer, data):
         ptr = cls()
-        ptr.ptrdname = DnsDomain.unpack(answer._message, data)
+        ptr.ptrdname = DnsDomain.unpack(None, data)
         return ptr
 
-    def pack(self):
-        return self.ptrdname.pack()
+    def pack(self, message):
+        self.ptrdname.pack(message)
@@ -1,6 +1,22 @@
-import ipaddress
+import typing
 
-from pathfinder.common.dns.domains import DnsDomain
+from pathfinder.common.dns.bytestream import ByteStream
+from pathfinder.common.dns.domains import DnsDomain, DomainStorage
+from pathfinder.common.dns.parts.part import export_fields, public_attributes
+
+
+class RdataWriter:
+    """Message stand-in for packing rdata alone."""
+
+    __slots__ = ("bytestream", "domains")
+
+    # Compression tables without compression keep no state and are shared
+    PLAIN = DomainStorage(compress=False)
+    CANONICAL = DomainStorage(canonical=True)
+
+    def __init__(self, canonical=False):
+        self.bytestream = ByteStream()
+        self.domains = self.CANONICAL if canonical else self.PLAIN
 
 
 class Rdata:
@@ -10,26 +26,67 @@ class Rdata:
     TYPE_CNAME = 5
     TYPE_MX = 15
     TYPE_NS = 2
+    TYPE_OPT = 41
     TYPE_PTR = 12
     TYPE_SOA = 6
     TYPE_TXT = 16
 
     type: int
 
+    __slots__ = ()
+
+    # RR type -> rdata class, filled when subclasses are defined
+    REGISTRY: typing.Dict[int, typing.Type["Rdata"]] = {}
+    # Class for RR types missing in registry
+    FALLBACK: typing.Type["Rdata"] = None
+    # Domain fields which need additional section processing (RFC 1035 3.3)
+    ADDITIONAL_NAMES: typing.Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, fallback=False, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if fallback:
+            Rdata.FALLBACK = cls
+        elif isinstance(cls.__dict__.get("type"), int):
+            Rdata.REGISTRY[cls.type] = cls
+
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             if key in self.__class__.__annotations__:
                 value_type = self.__class__.__annotations__[key]
-                setattr(self, key, value_type(value))
+                if value_type is DnsDomain:
+                    # Rdata domains are packed into whichever message holds the record
+                    if not isinstance(value, DnsDomain):
+                        value = DnsDomain(None, value)
+                else:
+                    value = value_type(value)
+                setattr(self, key, value)
 
     @classmethod
     def by_type(cls, type):
-        for rrtype in cls.__subclasses__():
-            if rrtype.type == type:
-                return rrtype
+        """Finds rdata class for RR type. Unknown types are kept as opaque data."""
 
-    def pack(self):
-        pass
+        return cls.REGISTRY.get(type, cls.FALLBACK)
+
+    def additional_names(self) -> typing.Iterator["DnsName"]:
+        """Yields names from rdata which need additional section processing."""
+
+        for field in self.ADDITIONAL_NAMES:
+            domain = getattr(self, field, None)
+            if domain is not None:
+                yield domain.name
+
+    def pack(self, message):
+        """Packs rdata into message bytestream."""
+
+    def to_wire(self, canonical=False) -> bytes:
+        """Packs rdata alone, without name compression.
+
+        :param canonical: lowercase names, so equal rdata has equal encoding
+        """
+
+        writer = RdataWriter(canonical)
+        self.pack(writer)
+        return writer.bytestream.data
 
     @classmethod
     def unpack(cls, answer, data):
@@ -46,8 +103,7 @@ class Rdata:
         #
         string = ""
         # string = f"{fillers[0]}{self.__class__.__name__.upper()}{fillers[1]}\n"
-        for k, v in {attr: val for attr, val in self.__dict__.items()
-                     if not attr.startswith("_")}.items():
+        for k, v in public_attributes(self):
             string += f"{k.upper()}: {v}\n"
         # string += f"{'*' * 24}"
         return string
@@ -67,8 +123,7 @@ class Rdata:
 
         chunks.append(f"{fillers[0]}{self.__class__.__name__.upper()}{fillers[1]}")
 
-        for k, v in {attr: val for attr, val in self.__dict__.items()
-                     if not attr.startswith("_")}.items():
+        for k, v in public_attributes(self):
             if len(f"{k.upper()}: {v}") > 28:
                 start_pos = 28 - len(k.upper()) - 2
                 chunks.append(f"{k.upper()}: {str(v)[:start_pos]}")
@@ -90,20 +145,15 @@ class Rdata:
     def to_dict(self):
         """Returns dict representation of rdata object."""
 
-        rdata_dict = {}
-        for k, v in {attr: val for attr, val in self.__dict__.items()
-                     if not attr.startswith("_")}.items():
-            if isinstance(v, DnsDomain):
-                rdata_dict[k] = v.label
-            elif isinstance(v, ipaddress.IPv4Address) or isinstance(v, ipaddress.IPv6Address):
-                rdata_dict[k] = str(v)
-            else:
-                rdata_dict[k] = v
-        return rdata_dict
+        return export_fields(self)
 
     def __eq__(self, other):
-        """Checks that RRs are the same."""
+        """Checks that RRs are the same by type and canonical wire encoding."""
 
         if not isinstance(other, Rdata):
             return False
-        return other.to_dict() == self.to_dict()
+        return self.type == other.type and \
+            self.to_wire(canonical=True) == other.to_wire(canonical=True)
+
+    def __hash__(self):
+        return hash((self.type, self.to_wire(canonical=True)))
@@ -1,11 +1,12 @@
-import struct
-
 from pathfinder.common.dns.domains import DnsDomain
 from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Soa(Rdata):
+    __slots__ = ("mname", "rname", "serial", "refresh", "retry", "expire", "minimum")
+
     type = 6
+    ADDITIONAL_NAMES = ("mname",)
 
     mname: DnsDomain
     rname: DnsDomain
@@ -18,15 +19,14 @@ class Soa(Rdata):
     @classmethod
     def unpack(cls, answer, data):
         soa = cls()
-        soa.mname = DnsDomain.unpack(answer._message, data)
-        soa.rname = DnsDomain.unpack(answer._message, data)
-        soa.serial, soa.refresh, soa.retry, soa.expire, soa.minimum = struct.unpack(
-            "!LLLLL", data.read(20))
+        soa.mname = DnsDomain.unpack(None, data)
+        soa.rname = DnsDomain.unpack(None, data)
+        soa.serial, soa.refresh, soa.retry, soa.expire, soa.minimum = data.unpack_from(
+            "!LLLLL")
         return soa
 
-    def pack(self):
-        packed = self.mname.pack()
-        packed += self.rname.pack()
-        packed += struct.pack("!LLLLL", self.serial, self.refresh, self.retry,
-                              self.expire, self.minimum)
-        return packed
+    def pack(self, message):
+        self.mname.pack(message)
+        self.rname.pack(message)
+        message.bytestream.pack("!LLLLL", self.serial, self.refresh, self.retry,
+                                self.expire, self.minimum)
@@ -1,18 +1,24 @@
+from pathfinder.common.dns.exceptions import MalformedPacket
 from pathfinder.common.dns.parts.rdata import Rdata
 
 
 class Txt(Rdata):
+    __slots__ = ("txt_data", "_txt_length")
+
     txt_data: str
     type = 16
 
     @classmethod
     def unpack(cls, answer, data):
         txt = cls()
-        txt._txt_length = data.read(1)
-        txt.txt_data = data.read(answer._rdlength - 1).decode("ascii")
+        txt._txt_length = data.unpack_from("!B")[0]
+        try:
+            txt.txt_data = str(data.read(answer._rdlength - 1), "ascii")
+        except UnicodeDecodeError:
+            raise MalformedPacket("TXT data is not ASCII")
         return txt
 
-    def pack(self):
-        packed = len(self.txt_data.encode("ascii")).to_bytes(1, "big")
-        packed += self.txt_data.encode("ascii")
-        return packed
+    def pack(self, message):
+        txt_data = self.txt_data.encode("ascii")
+        message.bytestream.pack("!B", len(txt_data))
+        message.bytestream.write(txt_data)
@@ -0,0 +1,29 @@
+from pathfinder.common.dns.parts.rdata import Rdata
+
+
+class Unknown(Rdata, fallback=True):
+    """Opaque rdata of RR type without own class (RFC 3597).
+
+    Wire data is kept as is and packed back unchanged.
+    """
+
+    __slots__ = ("type", "data")
+
+    type: int
+    data: bytes
+
+    @classmethod
+    def unpack(cls, answer, data):
+        unknown = cls()
+        unknown.type = answer.type
+        unknown.data = bytes(data.read(answer._rdlength))
+        return unknown
+
+    def pack(self, message):
+        message.bytestream.write(self.data)
+
+    def to_dict(self):
+        """Returns dict representation with data in RFC 3597 generic format."""
+
+        generic = f"\\# {len(self.data)} {self.data.hex()}" if self.data else "\\# 0"
+        return {"type": self.type, "data": generic}
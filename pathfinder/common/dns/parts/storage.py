@@ -1,21 +1,86 @@
+import typing
 from collections import UserList
 
+from pathfinder.common.dns.bytestream import ByteStream
 from pathfinder.common.dns.exceptions import DnsException
 from pathfinder.common.dns.parts import DnsMessagePart
 
 
 class DnsPartStorage(UserList):
+    """Message section.
+
+    Keeps index of names referenced by rdata of its records (see `Rdata.ADDITIONAL_NAMES`).
+    Index is filled on append; other changes of items drop it and it is rebuilt on next use.
+    Rdata must not be changed after record is added.
+    """
+
+    def __init__(self, initlist=None):
+        super().__init__(initlist)
+        self._referenced = None if self.data else {}
 
     def append(self, object) -> None:
         if not isinstance(object, DnsMessagePart):
             raise DnsException("Cant append anything other than dns message part.")
         super().append(object)
+        if self._referenced is not None:
+            self._reference(object)
+
+    def _reference(self, item) -> None:
+        rdata = getattr(item, "rdata", None)
+        if rdata is not None:
+            for name in rdata.additional_names():
+                self._referenced.setdefault(name.key, name)
+
+    @property
+    def referenced_names(self) -> typing.Dict[str, "DnsName"]:
+        """Names referenced by rdata of records which need additional section processing.
+
+        :return: {name key: name}
+        """
+
+        if self._referenced is None:
+            self._referenced = {}
+            for item in self.data:
+                self._reference(item)
+        return self._referenced
+
+    def __setitem__(self, i, item):
+        super().__setitem__(i, item)
+        self._referenced = None
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._referenced = None
+
+    def __iadd__(self, other):
+        self._referenced = None
+        return super().__iadd__(other)
+
+    def insert(self, i, item):
+        super().insert(i, item)
+        self._referenced = None
+
+    def pop(self, i=-1):
+        self._referenced = None
+        return super().pop(i)
+
+    def remove(self, item):
+        super().remove(item)
+        self._referenced = None
+
+    def clear(self):
+        super().clear()
+        self._referenced = {}
+
+    def extend(self, other):
+        super().extend(other)
+        self._referenced = None
+
+    def pack(self, message):
+        """Packs items into message bytestream."""
 
-    def pack(self):
-        result = b""
         for item in self:
-            result += item.pack()
-        return result
+            item.pack(message)
 
     def __repr__(self):
         string = ""
@@ -26,7 +91,7 @@ class DnsPartStorage(UserList):
     def to_dict(self):
         """Return dict representation of items in storage."""
 
-        return [i.to_dict() for i in self]
+        return [i.to_dict() for i in self.data]
 
     def contains_type(self, klass):
         """Checks that storage contains specific rdata type."""
@@ -37,15 +102,13 @@ class DnsPartStorage(UserList):
             return bool(list(filter(lambda item: isinstance(item.rdata, klass), self)))
 
     def contains_name_type(self, name, klass):
-        """Checks that storage contains specific rdata type."""
+        """Checks that storage contains specific rdata type for name. Name is case insensitive."""
 
+        key = name.lower()
         if isinstance(klass, int):
-            return bool(list(filter(
-                lambda item: item.type == klass and item.name.lower() == name.lower(), self)))
-        else:
-            return bool(list(filter(
-                lambda item: isinstance(item.rdata, klass) and item.name.lower() == name.lower(),
-                self)))
+            return any(item.type == klass and item.name.lower() == key for item in self.data)
+        return any(isinstance(item.rdata, klass) and item.name.lower() == key
+                   for item in self.data)
 
     def filter_resources(self, **kwargs):
         """Filters storage resources."""
@@ -54,3 +117,63 @@ class DnsPartStorage(UserList):
         for field, value in kwargs.items():
             resources = list(filter(lambda item: getattr(item, field, None) == value, resources))
         return resources
+
+
+class LazyDnsPartStorage(DnsPartStorage):
+    """Part storage which is decoded from wire data on first access.
+
+    Length is known from message header, so it doesn't trigger decoding.
+    """
+
+    def __init__(self, message, rrtype, count, data: ByteStream, offset: int):
+        self._message = message
+        self._rrtype = rrtype
+        self._count = count
+        self._view = data.view
+        self._domains = data.domains
+        self._offset = offset
+        self._data = None
+        self._referenced = None
+
+    @property
+    def decoded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            data = ByteStream(self._view)
+            data.pos = self._offset
+            data.domains = self._domains
+            self._data = [self._rrtype.unpack(self._message, data) for _ in range(self._count)]
+            self._view = self._domains = None
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def __len__(self):
+        if self._data is None:
+            return self._count
+        return len(self._data)
+
+    # UserList builds new lists with self.__class__, which can't be created from a list
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return DnsPartStorage(self.data[i])
+        return self.data[i]
+
+    def __add__(self, other):
+        return DnsPartStorage(self.data) + other
+
+    def __radd__(self, other):
+        return other + DnsPartStorage(self.data)
+
+    def __mul__(self, n):
+        return DnsPartStorage(self.data * n)
+
+    __rmul__ = __mul__
+
+    def copy(self):
+        return DnsPartStorage(self.data)
@@ -0,0 +1,68 @@
+import random
+import struct
+import typing
+from collections import OrderedDict
+
+
+class QueryTemplates:
+    """LRU cache of packed question messages.
+
+    Questions with the same name, type, class and header flags differ only in message id,
+    so packed message is kept and id of next such message is patched into its copy.
+    Templates are made only for plain questions, with one question and no records.
+    Message with records, e.g. EDNS one added by middleware, is packed every time.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.templates: typing.Dict[tuple, bytes] = OrderedDict()
+
+    @staticmethod
+    def key(message: "DnsMessage") -> typing.Union[tuple, None]:
+        """Returns template key of message or None if it is not a plain question."""
+
+        if len(message.question) != 1 or message.answer or message.authority or \
+                message.additional:
+            return None
+        question = message.question[0]
+        return question.qname.label, question.qtype, question.qclass, message.header.options
+
+    def get(self, key: tuple, id: int = None) -> typing.Union[bytes, None]:
+        """Returns packed question with new id or None if there is no template for key."""
+
+        template = self.templates.get(key)
+        if template is None:
+            return None
+        self.templates.move_to_end(key)
+        return self.with_id(template, id)
+
+    def put(self, key: tuple, data: bytes) -> None:
+        """Saves packed question as template."""
+
+        self.templates[key] = bytes(data)
+        self.templates.move_to_end(key)
+        while len(self.templates) > self.maxsize:
+            self.templates.popitem(last=False)
+
+    def pack(self, message: "DnsMessage") -> bytes:
+        """Packs message, reusing template of the same question."""
+
+        key = self.key(message)
+        if key is None:
+            return message.pack()
+        data = self.get(key, message.header.id)
+        if data is None:
+            data = message.pack()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        self.templates.clear()
+
+    @staticmethod
+    def with_id(data: bytes, id: int = None) -> bytes:
+        """Returns copy of packed message with replaced id. Random id is used if omitted."""
+
+        if id is None:
+            id = random.randrange(1, 65535)
+        return struct.pack("!H", id) + data[2:]
@@ -0,0 +1,248 @@
+import struct
+import sys
+import typing
+
+from pathfinder.common.dns.bytestream import ByteStream
+from pathfinder.common.dns.domains import DnsDomain, DnsName
+from pathfinder.common.dns.parts import DnsMessageAnswer, DnsMessageHeader
+from pathfinder.common.dns.parts.rdata.rdata import Rdata
+
+TTL = struct.Struct("!L")
+# Type, class, ttl and rdlength of resource record
+RECORD = DnsMessageAnswer.structure
+
+# Estimated size of entry tuple and its fields apart from wire data
+ENTRY_OVERHEAD = 200
+# Last items of entry keys, separate them from RRset key of the same name and type
+RESPONSE = "response"
+NODATA = "nodata"
+NXDOMAIN = "nxdomain"
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+
+def record_ttls(data: typing.Union[bytes, bytearray]) -> typing.List[typing.Tuple[int, int]]:
+    """Returns (TTL field offset, TTL) of every resource record in message.
+
+    OPT pseudo-records are skipped, their TTL field holds extended flags.
+    """
+
+    stream = ByteStream(data)
+    header = DnsMessageHeader.unpack(None, stream)
+    for _ in range(header._qdcount):
+        DnsDomain.skip(stream)
+        stream.pos += 4
+    offsets = []
+    for _ in range(header._ancount + header._nscount + header._arcount):
+        DnsDomain.skip(stream)
+        rrtype, _, ttl, rdlength = stream.unpack_from(RECORD)
+        if rrtype != Rdata.TYPE_OPT:
+            offsets.append((stream.pos - 6, ttl))
+        stream.pos += rdlength
+    return offsets
+
+
+class CachedRRset(typing.NamedTuple):
+    """Immutable cached RRset.
+
+    Records are kept pre-encoded: `wire` holds all records with uncompressed owner name
+    and TTL fields which are patched with remaining TTL when entry is served. Names in
+    rdata are lowercased, DNS names compare case-insensitively.
+    """
+
+    name: DnsName
+    type: int
+    klass: int
+    stored_at: float
+    expires_at: float
+    # Rdata of records in canonical wire format (RFC 4034 6.2)
+    rdata: typing.Tuple[bytes, ...]
+    # Names in rdata which need additional section processing
+    referenced: typing.Tuple[DnsName, ...]
+    wire: bytes
+    ttl_offsets: typing.Tuple[int, ...]
+    size: int
+
+    @property
+    def key(self) -> tuple:
+        return self.name.key, self.type, self.klass
+
+    @classmethod
+    def from_resources(cls, resources: typing.Sequence[DnsMessageAnswer], now: float,
+                       ttl: int = None) -> "CachedRRset":
+        """Creates entry from records of one RRset.
+
+        :param ttl: lifetime of entry, shortest TTL of records by default
+        """
+
+        first = resources[0]
+        name = first.name.name
+        if ttl is None:
+            ttl = min(resource.ttl for resource in resources)
+        # Canonical encoding keys rdata, duplicates differing only in name case are dropped
+        rdata = {}
+        referenced = {}
+        wire = bytearray()
+        offsets = []
+        for resource in resources:
+            encoded = resource.rdata.to_wire(canonical=True)
+            if encoded in rdata:
+                continue
+            rdata[encoded] = None
+            for referenced_name in resource.rdata.additional_names():
+                referenced.setdefault(referenced_name.key, referenced_name)
+            wire += name.wire
+            offsets.append(len(wire) + 4)
+            wire += RECORD.pack(first.type, first.klass, ttl, len(encoded))
+            wire += encoded
+        wire = bytes(wire)
+        size = ENTRY_OVERHEAD + sys.getsizeof(wire) + sum(map(sys.getsizeof, rdata))
+        return cls(name, first.type, first.klass, now, now + ttl, tuple(rdata),
+                   tuple(referenced.values()), wire, tuple(offsets), size)
+
+    @classmethod
+    def from_records(cls, name: DnsName, type: int, klass: int, stored_at: float,
+                     expires_at: float, wire: bytes,
+                     referenced: typing.Sequence[DnsName] = ()) -> "CachedRRset":
+        """Creates entry from records in `wire` format of another entry."""
+
+        rdata = []
+        offsets = []
+        owner = len(name.wire)
+        pos = 0
+        while pos < len(wire):
+            pos += owner
+            offsets.append(pos + 4)
+            rdlength = RECORD.unpack_from(wire, pos)[3]
+            pos += RECORD.size
+            rdata.append(bytes(wire[pos:pos + rdlength]))
+            pos += rdlength
+        wire = bytes(wire)
+        size = ENTRY_OVERHEAD + sys.getsizeof(wire) + sum(map(sys.getsizeof, rdata))
+        return cls(name, type, klass, stored_at, expires_at, tuple(rdata), tuple(referenced),
+                   wire, tuple(offsets), size)
+
+    def ttl_left(self, now: float) -> int:
+        return max(int(self.expires_at - now), 0)
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at <= now
+
+    @property
+    def count(self) -> int:
+        """Number of records."""
+
+        return len(self.rdata)
+
+    def render(self, now: float, ttl: int = None) -> bytearray:
+        """Returns records in wire format with remaining TTL or given one."""
+
+        data = bytearray(self.wire)
+        ttl = self.ttl_left(now) if ttl is None else ttl
+        for offset in self.ttl_offsets:
+            TTL.pack_into(data, offset, ttl)
+        return data
+
+
+class CachedNegative(typing.NamedTuple):
+    """Cached NXDOMAIN or NODATA answer (RFC 2308).
+
+    NXDOMAIN is kept by name and answers queries of any type, NODATA is kept by name, type
+    and class. Entry lives for the smaller of SOA TTL and SOA MINIMUM, SOA record is served
+    in authority section with remaining lifetime as TTL.
+    """
+
+    name: DnsName
+    # Type and class of NODATA question, None for NXDOMAIN
+    type: typing.Union[int, None]
+    klass: typing.Union[int, None]
+    rcode: int
+    stored_at: float
+    expires_at: float
+    soa: CachedRRset
+    size: int
+
+    @property
+    def key(self) -> tuple:
+        if self.rcode == RCODE_NXDOMAIN:
+            return self.name.key, NXDOMAIN
+        return self.name.key, self.type, self.klass, NODATA
+
+    @classmethod
+    def from_message(cls, message: "DnsMessage",
+                     now: float) -> typing.Union["CachedNegative", None]:
+        """Creates entry from negative response. None if response is not negative or has
+        no SOA record to take lifetime from."""
+
+        rcode = message.header.rcode
+        if message.answer or len(message.question) != 1 or \
+                rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+            return None
+        soa = None
+        for resource in message.authority:
+            if resource.type == Rdata.TYPE_NS and rcode == RCODE_NOERROR:
+                # Referral
+                return None
+            if resource.type == Rdata.TYPE_SOA and soa is None:
+                soa = resource
+        if soa is None:
+            return None
+        ttl = min(soa.ttl, soa.rdata.minimum)
+        soa = CachedRRset.from_resources([soa], now, ttl)
+        question = message.question[0]
+        if rcode == RCODE_NXDOMAIN:
+            rrtype = klass = None
+        else:
+            rrtype, klass = question.qtype, question.qclass
+        return cls(question.qname.name, rrtype, klass, rcode, now, now + ttl, soa,
+                   ENTRY_OVERHEAD + soa.size)
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at <= now
+
+
+class CachedResponse(typing.NamedTuple):
+    """Immutable wire image of whole response.
+
+    Served by copying and patching message id and TTL of every record.
+    """
+
+    name: DnsName
+    type: int
+    klass: int
+    stored_at: float
+    expires_at: float
+    wire: bytes
+    # (offset, TTL when stored) of record TTL fields
+    ttls: typing.Tuple[typing.Tuple[int, int], ...]
+    size: int
+
+    @property
+    def key(self) -> tuple:
+        return self.name.key, self.type, self.klass, RESPONSE
+
+    @classmethod
+    def from_wire(cls, name: DnsName, type: int, klass: int, wire: bytes,
+                  now: float) -> typing.Union["CachedResponse", None]:
+        """Creates entry from packed response. Response without records is not cached."""
+
+        ttls = record_ttls(wire)
+        if not ttls:
+            return None
+        ttl = min(ttl for _, ttl in ttls)
+        size = ENTRY_OVERHEAD + sys.getsizeof(wire) + 16 * len(ttls)
+        return cls(name, type, klass, now, now + ttl, bytes(wire), tuple(ttls), size)
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at <= now
+
+    def render(self, id: int, now: float, ttl: int = None) -> bytearray:
+        """Returns copy of response with new id and remaining TTLs or given one."""
+
+        data = bytearray(self.wire)
+        struct.pack_into("!H", data, 0, id)
+        elapsed = int(now - self.stored_at)
+        for offset, stored_ttl in self.ttls:
+            TTL.pack_into(data, offset, max(stored_ttl - elapsed, 0) if ttl is None else ttl)
+        return data
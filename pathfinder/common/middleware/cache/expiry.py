@@ -0,0 +1,58 @@
+import heapq
+import itertools
+import time
+import typing
+
+
+class ExpiryQueue:
+    """Min-heap of cache items ordered by absolute expiry time.
+
+    Expired items are popped from the top in bounded batches, so reaping costs
+    O(k log n) for k expired items regardless of cache size.
+    """
+
+    def __init__(self, batch=64):
+        self.batch = batch
+        self.heap: typing.List[typing.Tuple[float, int, typing.Any]] = []
+        # Tie breaker, items themselves are not comparable
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, expires_at: float, item) -> None:
+        """Schedules item expiry.
+
+        :param expires_at: absolute time in time.time() scale
+        """
+
+        heapq.heappush(self.heap, (expires_at, next(self._counter), item))
+
+    def next_expiry(self) -> typing.Union[float, None]:
+        """Returns expiry time of the first item or None if queue is empty."""
+
+        return self.heap[0][0] if self.heap else None
+
+    def pop_expired(self, now: float = None, limit: int = None) -> typing.List[typing.Any]:
+        """Pops items expired by now.
+
+        :param now: current time, time.time() by default
+        :param limit: maximum number of items, queue batch size by default. 0 means no limit
+        """
+
+        now = time.time() if now is None else now
+        limit = self.batch if limit is None else limit
+        heap = self.heap
+        expired = []
+        while heap and heap[0][0] <= now and (not limit or len(expired) < limit):
+            expired.append(heapq.heappop(heap)[2])
+        return expired
+
+    def compact(self, is_live: typing.Callable[[typing.Any], bool]) -> None:
+        """Drops items which left cache before expiry (evicted or replaced)."""
+
+        self.heap = [entry for entry in self.heap if is_live(entry[2])]
+        heapq.heapify(self.heap)
+
+    def clear(self) -> None:
+        self.heap.clear()
@@ -0,0 +1,581 @@
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import struct
+import time
+import typing
+from collections import Counter
+
+from pathfinder.common.dns.delegation import Delegation, DelegationCache
+from pathfinder.common.dns.domains import DnsName
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.parts.rdata.rdata import Rdata
+from pathfinder.common.middleware.cache import snapshot
+from pathfinder.common.middleware.cache.entry import NODATA, NXDOMAIN, RESPONSE, \
+    CachedNegative, CachedResponse, CachedRRset
+from pathfinder.common.middleware.cache.expiry import ExpiryQueue
+from pathfinder.common.middleware.cache.policy import POLICIES, EvictionPolicy, LruPolicy
+from pathfinder.common.middleware.cache.stats import CacheStats, Snapshot
+from pathfinder.common.middleware.cache.storage import DictBackend, StorageBackend
+from pathfinder.common.middleware.middleware import Middleware
+
+Entry = typing.Union[CachedRRset, CachedResponse, CachedNegative]
+
+HEADER = struct.Struct("!6H")
+QUESTION = struct.Struct("!HH")
+# Header options of response built from cache: QR, RD and RA set
+RESPONSE_FLAGS = 0x8180
+
+# Question key which is being refreshed in current task, its lookups skip cache
+REFRESHING: contextvars.ContextVar[typing.Union[tuple, None]] = contextvars.ContextVar(
+    "REFRESHING", default=None)
+
+
+class CacheMiddleware(Middleware):
+    """Cache of RRsets and whole responses.
+
+    Entries are immutable: RRsets keep pre-encoded records and responses keep their wire
+    image. Remaining TTL (and message id) is patched into a copy when entry is served, and
+    hits are returned as lazily decoded messages, so nothing cached is shared between
+    requests as mutable objects.
+
+    Cache is bounded by number of entries and their estimated bytes. When a limit is
+    exceeded, eviction policy chooses entries to drop. Limits and policy are set with
+    `configure`.
+
+    With prefetch enabled, an entry which got enough hits and entered the last part of its
+    lifetime is refreshed in background with `manager.resolve`, while it keeps being
+    served until the new answer replaces it.
+
+    With serve-stale enabled (RFC 8767), expired entries are kept for stale window. If
+    resolution fails or doesn't finish by deadline, they are served with short TTL, while
+    resolution continues in background and saves its answer.
+
+    `STATS` counts hits, misses, insertions, expirations and evictions and keeps lookup
+    latency histograms, `stats` and `report_stats` add entry count and bytes to them.
+
+    Entries survive restarts in snapshot files, see `save_snapshot`, `load_snapshot` and
+    `snapshot_periodically`.
+
+    Entries live in storage backend: process memory dict by default, or a table shared by
+    worker processes (`SharedMemoryBackend`), which is bounded by its own size. Expiry
+    queue, eviction policy, hit counts and stats stay per process.
+    """
+
+    # (name, type, class) -> RRset, (name, type, class, RESPONSE) -> response,
+    # (name, type, class, NODATA) and (name, NXDOMAIN) -> negative answer
+    STORAGE: StorageBackend = DictBackend()
+    # (key, entry) by entry expiry time
+    EXPIRY = ExpiryQueue()
+    AUTHORITY_RESOURCE = [Rdata.TYPE_NS, Rdata.TYPE_SOA]
+
+    # Maximum number of stored entries, None for no limit
+    MAX_ENTRIES = 100000
+    # Maximum estimated size of stored entries, None for no limit
+    MAX_BYTES = None
+    POLICY: EvictionPolicy = LruPolicy()
+
+    PREFETCH = False
+    # Part of entry lifetime, at the end of which it is refreshed
+    PREFETCH_WINDOW = 0.1
+    # Hits entry needs to be refreshed
+    PREFETCH_HITS = 3
+
+    # Seconds expired entries are kept for serve-stale, 0 disables it
+    STALE_WINDOW = 0
+    # TTL of records in stale answers
+    STALE_TTL = 30
+    # Seconds to wait for resolution before stale answer is served, None waits until it
+    # fails
+    STALE_DEADLINE = 1.8
+
+    # Entry key -> hits since entry was stored
+    HITS = Counter()
+    # Question key -> running refresh task
+    REFRESHES: typing.Dict[tuple, asyncio.Future] = {}
+    STATS = CacheStats()
+
+    @classmethod
+    def configure(cls, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES,
+                  policy: typing.Union[str, EvictionPolicy] = LruPolicy.name,
+                  prefetch=PREFETCH, prefetch_window=PREFETCH_WINDOW,
+                  prefetch_hits=PREFETCH_HITS, stale_window=STALE_WINDOW,
+                  stale_ttl=STALE_TTL, stale_deadline=STALE_DEADLINE,
+                  storage: StorageBackend = None):
+        """Sets cache limits, eviction policy, prefetch, serve-stale and storage backend.
+
+        Previous backend is left as is: default one comes empty, given one is used with
+        entries it has.
+
+        :param max_entries: maximum number of entries
+        :param max_bytes: maximum estimated size of entries
+        :param policy: policy name ("lru", "arc") or policy instance
+        :param prefetch: refresh hot entries before they expire
+        :param prefetch_window: part of entry lifetime, at the end of which it is refreshed
+        :param prefetch_hits: hits entry needs to be refreshed
+        :param stale_window: seconds expired entries are kept for serve-stale, 0 disables it
+        :param stale_ttl: TTL of records in stale answers
+        :param stale_deadline: seconds to wait for resolution before stale answer is served
+        :param storage: storage backend, new `DictBackend` by default
+        """
+
+        if isinstance(policy, str):
+            policy = POLICIES[policy](max_entries)
+        cls.MAX_ENTRIES = max_entries
+        cls.MAX_BYTES = max_bytes
+        cls.POLICY = policy
+        cls.PREFETCH = prefetch
+        cls.PREFETCH_WINDOW = prefetch_window
+        cls.PREFETCH_HITS = prefetch_hits
+        cls.STALE_WINDOW = stale_window
+        cls.STALE_TTL = stale_ttl
+        cls.STALE_DEADLINE = stale_deadline
+        cls.STORAGE = DictBackend() if storage is None else storage
+        cls._reset()
+
+    @classmethod
+    def clear(cls):
+        """Drops cached entries and resets stats. Shared backend is cleared for all
+        processes."""
+
+        cls.STORAGE.clear()
+        cls._reset()
+
+    @classmethod
+    def _reset(cls):
+        """Resets process local state."""
+
+        cls.EXPIRY.clear()
+        cls.POLICY.clear()
+        cls.HITS.clear()
+        cls.STATS.reset()
+
+    @classmethod
+    def stats(cls, reset=False) -> Snapshot:
+        """Returns snapshot of cache stats with current entry count and bytes.
+
+        :param reset: zero counters and histograms after taking snapshot
+        """
+
+        return cls.STATS.snapshot(reset, entries=len(cls.STORAGE), bytes=cls.STORAGE.bytes)
+
+    @classmethod
+    def report_stats(cls, reset=False) -> Snapshot:
+        """Takes stats snapshot and passes it to `STATS` callbacks."""
+
+        return cls.STATS.report(reset, entries=len(cls.STORAGE), bytes=cls.STORAGE.bytes)
+
+    @classmethod
+    def _put(cls, key, entry: Entry):
+        """Stores entry, replacing previous one for the key. Entry refused by storage
+        only removes previous one."""
+
+        result = cls.STORAGE.put(key, entry)
+        if result.replaced:
+            cls.HITS.pop(key, None)
+        for evicted, size in result.evicted:
+            cls.HITS.pop(evicted, None)
+            cls.POLICY.remove(evicted)
+            cls.STATS.add("evictions")
+            cls.STATS.add("evicted_bytes", size)
+        if not result.stored:
+            if result.replaced:
+                cls.POLICY.remove(key)
+            return
+        cls.STATS.add("replacements" if result.replaced else "insertions")
+        cls.POLICY.insert(key)
+        cls.EXPIRY.push(entry.expires_at + cls.STALE_WINDOW, (key, entry))
+
+    @classmethod
+    def _get(cls, key, now: float, stale=False) -> typing.Union[Entry, None]:
+        """Returns entry which is not expired yet and marks hit.
+
+        :param stale: also return entry expired within stale window
+        """
+
+        entry = cls.STORAGE.get(key)
+        if entry is None or entry.expired(now - cls.STALE_WINDOW if stale else now):
+            return None
+        cls.POLICY.access(key)
+        cls.HITS[key] += 1
+        return entry
+
+    @classmethod
+    def _drop(cls, key, entry: Entry = None) -> typing.Union[int, None]:
+        """Removes entry from storage. Returns its size or None if it wasn't stored.
+
+        :param entry: remove only if this entry is still stored for key
+        """
+
+        size = cls.STORAGE.discard(key, entry)
+        if size is not None:
+            cls.HITS.pop(key, None)
+        return size
+
+    @classmethod
+    def _discard(cls, key):
+        """Removes entry if it is stored."""
+
+        if cls._drop(key) is not None:
+            cls.POLICY.remove(key)
+
+    @classmethod
+    def _is_over_limit(cls) -> bool:
+        if cls.STORAGE.bounded:
+            return False
+        return (cls.MAX_ENTRIES is not None and len(cls.STORAGE) > cls.MAX_ENTRIES) or \
+               (cls.MAX_BYTES is not None and cls.STORAGE.bytes > cls.MAX_BYTES)
+
+    @classmethod
+    def _evict(cls):
+        """Evicts entries chosen by policy until cache fits its limits."""
+
+        while cls._is_over_limit():
+            key = cls.POLICY.evict()
+            if key is None:
+                break
+            size = cls._drop(key)
+            if size is not None:
+                cls.STATS.add("evictions")
+                cls.STATS.add("evicted_bytes", size)
+        # Evicted and replaced entries stay in expiry queue until their expiry
+        if len(cls.EXPIRY) > 2 * len(cls.STORAGE) + cls.EXPIRY.batch:
+            cls.EXPIRY.compact(lambda item: cls.STORAGE.is_current(*item))
+
+    @classmethod
+    def _parse_and_save_message(cls, message, now: float = None):
+        """Saves RRsets of message to storage."""
+
+        now = time.time() if now is None else now
+        rrsets = {}
+        for part in (message.answer, message.authority, message.additional):
+            for resource in part:
+                if resource.type == Rdata.TYPE_OPT:
+                    # Pseudo RR, belongs to single message only
+                    continue
+                rrsets.setdefault((resource.name.lower(), resource.type, resource.klass),
+                                  []).append(resource)
+        for key, resources in rrsets.items():
+            cls._put(key, CachedRRset.from_resources(resources, now))
+            # Name exists and has data for type now
+            cls._discard((key[0], NXDOMAIN))
+            cls._discard(key + (NODATA,))
+        negative = CachedNegative.from_message(message, now)
+        if negative is not None:
+            cls._put(negative.key, negative)
+        cls._evict()
+
+    @classmethod
+    def _save_response(cls, message, now: float = None):
+        """Saves wire image of answer response. Referrals and errors are not saved."""
+
+        header = message.header
+        if header.rcode != 0 or header.tc or len(message.question) != 1 or \
+                not message.answer:
+            return
+        now = time.time() if now is None else now
+        question = message.question[0]
+        response = CachedResponse.from_wire(
+            question.qname.name, question.qtype, question.qclass, message.pack(), now)
+        if response is not None:
+            cls._put(response.key, response)
+            cls._evict()
+
+    @classmethod
+    def reap_expired(cls, limit=None, now: float = None):
+        """Removes expired entries from cache in expiry order.
+
+        :param limit: maximum number of removed entries, expiry queue batch size by
+            default. 0 removes all expired entries.
+        :param now: current time, time.time() by default
+        """
+
+        for key, entry in cls.EXPIRY.pop_expired(now, limit):
+            if cls._drop(key, entry) is not None:
+                cls.POLICY.remove(key)
+                cls.STATS.add("expirations")
+            elif key not in cls.STORAGE:
+                # Removed by another process sharing storage
+                cls.POLICY.remove(key)
+                cls.HITS.pop(key, None)
+
+    @classmethod
+    def purge_expired(cls, now: float = None):
+        """Removes all expired entries from cache."""
+
+        cls.reap_expired(limit=0, now=now)
+
+    @classmethod
+    def _snapshot_items(cls, delegations: DelegationCache = None,
+                        now: float = None) -> typing.List[snapshot.Item]:
+        """Returns entries still usable at now and delegations to save."""
+
+        now = time.time() if now is None else now
+        items = [entry for entry in cls.STORAGE.values()
+                 if not entry.expired(now - cls.STALE_WINDOW)]
+        if delegations is not None:
+            items.extend(delegation for delegation in delegations.delegations.values()
+                         if not delegation.expired(now))
+        return items
+
+    @classmethod
+    def save_snapshot(cls, path: typing.Union[str, os.PathLike],
+                      delegations: DelegationCache = None, now: float = None) -> int:
+        """Writes cache entries and delegations to snapshot file. Returns number of items.
+
+        :param delegations: delegation cache to save along, like `ClientManager.delegations`
+        """
+
+        now = time.time() if now is None else now
+        items = cls._snapshot_items(delegations, now)
+        snapshot.write(path, snapshot.dumps(items, now))
+        return len(items)
+
+    @classmethod
+    def load_snapshot(cls, path: typing.Union[str, os.PathLike],
+                      delegations: DelegationCache = None, now: float = None) -> int:
+        """Restores entries and delegations from snapshot file. Returns number of items.
+
+        Entries which expired while the process was down (apart from those still in stale
+        window) are skipped without decoding. Missing file restores nothing, damaged file
+        restores items before the damage.
+
+        :param delegations: delegation cache to restore into
+        """
+
+        now = time.time() if now is None else now
+        restored = 0
+        try:
+            for item in snapshot.read(path, after=now - cls.STALE_WINDOW):
+                if isinstance(item, Delegation):
+                    if delegations is None or item.expired(now):
+                        continue
+                    delegations.put(item.zone, item.nameservers, item.expires_at - now, now)
+                else:
+                    cls._put(item.key, item)
+                restored += 1
+        except FileNotFoundError:
+            return 0
+        except snapshot.SnapshotError:
+            pass
+        cls._evict()
+        return restored
+
+    @classmethod
+    async def snapshot_periodically(cls, path: typing.Union[str, os.PathLike],
+                                    interval: float = 300,
+                                    delegations: DelegationCache = None):
+        """Saves snapshot every interval seconds, and once more when cancelled on shutdown.
+
+        Snapshot is taken in event loop, file is written in executor.
+        """
+
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                data = snapshot.dumps(cls._snapshot_items(delegations))
+                await loop.run_in_executor(None, snapshot.write, path, data)
+        except asyncio.CancelledError:
+            cls.save_snapshot(path, delegations)
+            raise
+
+    @classmethod
+    def _prefetch(cls, manager, key, entry: Entry, question: tuple, now: float):
+        """Starts background refresh of question if entry is hot and about to expire.
+
+        :param key: entry key
+        :param question: (name, type, class) of query
+        """
+
+        question_key = (DnsName(question[0]).key,) + question[1:]
+        if cls.HITS[key] < cls.PREFETCH_HITS or question_key in cls.REFRESHES:
+            return
+        lifetime = entry.expires_at - entry.stored_at
+        if entry.expires_at - now > lifetime * cls.PREFETCH_WINDOW:
+            return
+        task = asyncio.ensure_future(cls._refresh(manager, question_key, *question))
+        cls.REFRESHES[question_key] = task
+        task.add_done_callback(functools.partial(cls._refresh_done, question_key))
+
+    @classmethod
+    async def _refresh(cls, manager, question_key, resource_name, resource_type,
+                       resource_class):
+        # Task runs in its own context copy, so only its queries skip cache
+        REFRESHING.set(question_key)
+        await manager.resolve(resource_name, resource_type, resource_class)
+
+    @classmethod
+    def _refresh_done(cls, question_key, task: asyncio.Future):
+        cls.REFRESHES.pop(question_key, None)
+        if task.cancelled():
+            return
+        cls.STATS.add("prefetches" if task.exception() is None else "prefetch_errors")
+
+    @classmethod
+    def _find_resources(cls, resource_name, resource_type, resource_class,
+                        now: float = None, manager=None,
+                        stale=False) -> typing.Union[DnsMessage, None]:
+        """Returns response from cache or None.
+
+        Saved response is preferred, then negative answer for the name or question, then
+        response built from RRset for the name, with cached A and AAAA records of names it
+        refers to in additional section. Expired entries are reaped in bounded batch, so
+        lookup cost doesn't depend on cache size.
+
+        :param manager: manager for background refresh of served entry, if prefetch is on
+        :param stale: use entries expired within stale window, their records get stale TTL.
+            Stale lookups are not counted as hits or misses.
+        """
+
+        start = time.perf_counter()
+        message, counter = cls._lookup(
+            resource_name, resource_type, resource_class, now, manager, stale)
+        if not stale:
+            cls.STATS.add(counter)
+            cls.STATS.observe("miss" if message is None else "hit",
+                              time.perf_counter() - start)
+        return message
+
+    @classmethod
+    def _lookup(cls, resource_name, resource_type, resource_class, now: float,
+                manager, stale) -> typing.Tuple[typing.Union[DnsMessage, None], str]:
+        """Returns response from cache or None with name of stats counter of lookup."""
+
+        now = time.time() if now is None else now
+        cls.reap_expired(now=now)
+        name = DnsName(resource_name)
+        key = (name.key, resource_type, resource_class)
+        question = (resource_name, resource_type, resource_class)
+        prefetch = manager is not None and cls.PREFETCH and not stale
+        response = cls._get(key + (RESPONSE,), now, stale)
+        if response is not None:
+            if prefetch:
+                cls._prefetch(manager, response.key, response, question, now)
+            return DnsMessage.unpack(response.render(
+                random.randrange(1, 65535), now, cls._stale_ttl(response, now)),
+                lazy=True), "hits"
+        negative = cls._get((name.key, NXDOMAIN), now, stale) or \
+            cls._get(key + (NODATA,), now, stale)
+        if negative is not None:
+            if prefetch:
+                cls._prefetch(manager, negative.key, negative, question, now)
+            data = cls._response_head(name, resource_type, resource_class)
+            data += negative.soa.render(now, cls._stale_ttl(negative, now))
+            HEADER.pack_into(data, 0, random.randrange(1, 65535),
+                             RESPONSE_FLAGS | negative.rcode, 1, 0, 1, 0)
+            return DnsMessage.unpack(data, lazy=True), "negative_hits"
+        rrset = cls._get(key, now, stale)
+        if rrset is None:
+            return None, "misses"
+        if prefetch:
+            cls._prefetch(manager, key, rrset, question, now)
+
+        data = cls._response_head(name, resource_type, resource_class)
+        data += rrset.render(now, cls._stale_ttl(rrset, now))
+        additional = 0
+        for referenced in rrset.referenced:
+            # TODO: keep class from original domain holder answer
+            for rrtype in (Rdata.TYPE_A, Rdata.TYPE_AAAA):
+                glue_key = (referenced.key, rrtype, 1)
+                glue = cls._get(glue_key, now, stale) if glue_key != key else None
+                if glue is not None:
+                    data += glue.render(now, cls._stale_ttl(glue, now))
+                    additional += glue.count
+        if resource_type in cls.AUTHORITY_RESOURCE:
+            counts = (0, rrset.count, additional)
+        else:
+            counts = (rrset.count, 0, additional)
+        HEADER.pack_into(data, 0, random.randrange(1, 65535), RESPONSE_FLAGS, 1, *counts)
+        return DnsMessage.unpack(data, lazy=True), "hits"
+
+    @classmethod
+    def _stale_ttl(cls, entry: Entry, now: float) -> typing.Union[int, None]:
+        """Returns TTL for records of expired entry, None for fresh entry."""
+
+        return cls.STALE_TTL if entry.expired(now) else None
+
+    @staticmethod
+    def _response_head(name: DnsName, resource_type, resource_class) -> bytearray:
+        """Returns room for header followed by question."""
+
+        data = bytearray(HEADER.size)
+        data += name.wire
+        data += QUESTION.pack(resource_type, resource_class)
+        return data
+
+    @classmethod
+    async def regular_query_and_save(cls, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = await func(*args, **kwargs)
+        cls.STATS.observe("upstream", time.perf_counter() - start)
+        if isinstance(result, DnsMessage):
+            now = time.time()
+            cls._parse_and_save_message(result, now)
+            cls._save_response(result, now)
+        return result
+
+    @classmethod
+    def on_query(cls, func):
+        @functools.wraps(func)
+        async def wrap(manager, host, resource_name, resource_type, resource_class, *args,
+                       **kwargs):
+            refreshing = REFRESHING.get()
+            if refreshing is None or \
+                    refreshing != (DnsName(resource_name).key, resource_type, resource_class):
+                cached_message = cls._find_resources(
+                    resource_name, resource_type, resource_class, manager=manager)
+                if cached_message is not None:
+                    return cached_message
+            return await cls.regular_query_and_save(
+                func, manager, host, resource_name, resource_type, resource_class, *args,
+                **kwargs
+            )
+
+        return wrap
+
+    @classmethod
+    def on_resolve(cls, func):
+        """Serves stale answer when resolution fails or misses deadline."""
+
+        @functools.wraps(func)
+        async def wrap(manager, resource_name, resource_type, resource_class, *args,
+                       **kwargs):
+            if not cls.STALE_WINDOW or REFRESHING.get() is not None:
+                return await func(
+                    manager, resource_name, resource_type, resource_class, *args, **kwargs)
+            task = asyncio.ensure_future(
+                func(manager, resource_name, resource_type, resource_class, *args, **kwargs))
+            try:
+                # Shielded, so resolution goes on and saves its answer after deadline
+                result = await asyncio.wait_for(asyncio.shield(task), cls.STALE_DEADLINE)
+            except asyncio.TimeoutError:
+                stale = cls._find_resources(
+                    resource_name, resource_type, resource_class, stale=True)
+                if stale is None:
+                    return await task
+                task.add_done_callback(cls._background_done)
+            except Exception:
+                stale = cls._find_resources(
+                    resource_name, resource_type, resource_class, stale=True)
+                if stale is None:
+                    raise
+            else:
+                if result is not None:
+                    return result
+                stale = cls._find_resources(
+                    resource_name, resource_type, resource_class, stale=True)
+                if stale is None:
+                    return result
+            cls.STATS.add("stale_answers")
+            return stale
+
+        return wrap
+
+    @staticmethod
+    def _background_done(task: asyncio.Future):
+        # Retrieves exception of resolution which outlived its client
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,153 @@
+import typing
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+Key = typing.Hashable
+
+
+class EvictionPolicy(metaclass=ABCMeta):
+    """Tracks cached keys and chooses which one to evict when cache is full.
+
+    Cache calls `insert` for new keys, `access` on hits, `remove` when key leaves cache by
+    itself (expiry) and `evict` when it needs room.
+    """
+
+    name: str
+
+    def __init__(self, capacity: int = None):
+        self.capacity = capacity
+
+    @abstractmethod
+    def __len__(self):
+        """Number of tracked keys."""
+
+    @abstractmethod
+    def insert(self, key: Key) -> None:
+        """Starts tracking new key."""
+
+    @abstractmethod
+    def access(self, key: Key) -> None:
+        """Marks cache hit for key."""
+
+    @abstractmethod
+    def remove(self, key: Key) -> None:
+        """Stops tracking key. Missing key is ignored."""
+
+    @abstractmethod
+    def evict(self) -> typing.Union[Key, None]:
+        """Stops tracking victim key and returns it. None if nothing is tracked."""
+
+    def clear(self) -> None:
+        self.__init__(self.capacity)
+
+
+class LruPolicy(EvictionPolicy):
+    """Evicts least recently used key."""
+
+    name = "lru"
+
+    def __init__(self, capacity: int = None):
+        super().__init__(capacity)
+        self.keys: typing.Dict[Key, None] = OrderedDict()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def insert(self, key: Key) -> None:
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+
+    def access(self, key: Key) -> None:
+        if key in self.keys:
+            self.keys.move_to_end(key)
+
+    def remove(self, key: Key) -> None:
+        self.keys.pop(key, None)
+
+    def evict(self) -> typing.Union[Key, None]:
+        if not self.keys:
+            return None
+        return self.keys.popitem(last=False)[0]
+
+
+class ArcPolicy(EvictionPolicy):
+    """Adaptive replacement cache (Megiddo, Modha).
+
+    Keys seen once live in `recent`, keys hit again move to `frequent`. Evicted keys are
+    remembered in ghost lists, and a miss on a ghost key moves target size of `recent`
+    towards the list which would have kept it. One-off keys of a scan only pass through
+    `recent` and don't push out frequently used ones.
+
+    :param capacity: number of keys the cache is expected to hold, bounds ghost lists
+    """
+
+    name = "arc"
+
+    DEFAULT_CAPACITY = 65536
+
+    def __init__(self, capacity: int = None):
+        super().__init__(capacity or self.DEFAULT_CAPACITY)
+        self.recent: typing.Dict[Key, None] = OrderedDict()
+        self.frequent: typing.Dict[Key, None] = OrderedDict()
+        self.recent_ghost: typing.Dict[Key, None] = OrderedDict()
+        self.frequent_ghost: typing.Dict[Key, None] = OrderedDict()
+        # Target size of recent list
+        self.target = 0.0
+
+    def __len__(self):
+        return len(self.recent) + len(self.frequent)
+
+    def insert(self, key: Key) -> None:
+        if key in self.recent or key in self.frequent:
+            self.access(key)
+            return
+        if key in self.recent_ghost:
+            delta = max(len(self.frequent_ghost) / len(self.recent_ghost), 1)
+            self.target = min(self.target + delta, self.capacity)
+            del self.recent_ghost[key]
+            self.frequent[key] = None
+        elif key in self.frequent_ghost:
+            delta = max(len(self.recent_ghost) / len(self.frequent_ghost), 1)
+            self.target = max(self.target - delta, 0)
+            del self.frequent_ghost[key]
+            self.frequent[key] = None
+        else:
+            self.recent[key] = None
+        self._trim_ghosts()
+
+    def access(self, key: Key) -> None:
+        if key in self.recent:
+            del self.recent[key]
+            self.frequent[key] = None
+        elif key in self.frequent:
+            self.frequent.move_to_end(key)
+
+    def remove(self, key: Key) -> None:
+        self.recent.pop(key, None)
+        self.frequent.pop(key, None)
+
+    def evict(self) -> typing.Union[Key, None]:
+        if self.recent and (len(self.recent) > self.target or not self.frequent):
+            key = self.recent.popitem(last=False)[0]
+            self.recent_ghost[key] = None
+        elif self.frequent:
+            key = self.frequent.popitem(last=False)[0]
+            self.frequent_ghost[key] = None
+        else:
+            return None
+        self._trim_ghosts()
+        return key
+
+    def _trim_ghosts(self) -> None:
+        while self.recent_ghost and len(self.recent) + len(self.recent_ghost) > self.capacity:
+            self.recent_ghost.popitem(last=False)
+        while self.frequent_ghost and \
+                len(self) + len(self.recent_ghost) + len(self.frequent_ghost) > \
+                2 * self.capacity:
+            self.frequent_ghost.popitem(last=False)
+
+
+POLICIES: typing.Dict[str, typing.Type[EvictionPolicy]] = {
+    LruPolicy.name: LruPolicy,
+    ArcPolicy.name: ArcPolicy,
+}
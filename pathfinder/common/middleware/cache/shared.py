@@ -0,0 +1,322 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import typing
+from contextlib import contextmanager
+
+from pathfinder.common.middleware.cache import snapshot
+from pathfinder.common.middleware.cache.storage import Entry, Key, PutResult, \
+    StorageBackend
+
+MAGIC = b"PFSHMEM\x00"
+VERSION = 1
+
+# Magic, version, stripes, slots per stripe, slot size
+TABLE_HEADER = struct.Struct("!8sHIII")
+# Entry count and bytes of stripe
+STRIPE_HEADER = struct.Struct("!IQ")
+# Sequence, state, record kind, key hash, stored time, expiry, entry size, key length,
+# payload length
+SLOT_HEADER = struct.Struct("!IBBQddIHI")
+SEQUENCE = struct.Struct("!I")
+
+EMPTY = 0
+USED = 1
+# Removed entry, probing goes on past it
+DELETED = 2
+
+
+class SharedMemoryBackend(StorageBackend):
+    """Hash table of entries in memory-mapped file, shared by processes which open it.
+
+    Table is split into stripes of fixed-size slots. Key hash chooses stripe and first
+    slot, collisions are probed linearly inside the stripe, through at most
+    `PROBE_WINDOW` slots, so lookups cost the same in a full table. Entries are kept in
+    snapshot record format, so table holds no pointers and any process can read them.
+
+    Writers lock their stripe with fcntl byte-range lock. Readers take no locks: every
+    slot has sequence number which writer makes odd while slot is changed, and reader
+    retries if sequence was odd or changed during its read (seqlock).
+
+    Backend is bounded: when probing window of key is full, new entry replaces the one in
+    the window which expires first. Entry larger than slot is not stored. Removed entries
+    leave tombstones which inserts reuse, tombstones in front of an empty slot are
+    cleared.
+
+    :param path: table file, preferably on tmpfs like /dev/shm. Created if missing, opened
+        with the same geometry by every worker.
+    :param stripes: number of stripes, writers of different stripes don't wait for each
+        other
+    :param slots: slots per stripe
+    :param slot_size: bytes per slot including its header
+    """
+
+    name = "shared"
+    bounded = True
+
+    # Attempts of lock-free read before slot is considered busy and skipped
+    READ_ATTEMPTS = 100
+    # Slots probed for a key, starting at its first slot
+    PROBE_WINDOW = 16
+
+    def __init__(self, path: typing.Union[str, os.PathLike], stripes=64, slots=1024,
+                 slot_size=2048):
+        self.path = path
+        self.stripes = stripes
+        self.slots = slots
+        self.slot_size = slot_size
+        self.window = min(self.PROBE_WINDOW, slots)
+        self.data_offset = TABLE_HEADER.size + stripes * STRIPE_HEADER.size
+        size = self.data_offset + stripes * slots * slot_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._locked(0):
+                if os.fstat(self.fd).st_size < size:
+                    os.ftruncate(self.fd, size)
+                self.map = mmap.mmap(self.fd, size)
+                magic, version, *geometry = TABLE_HEADER.unpack_from(self.map, 0)
+                if magic != MAGIC:
+                    TABLE_HEADER.pack_into(self.map, 0, MAGIC, VERSION, stripes, slots,
+                                           slot_size)
+                elif version != VERSION or geometry != [stripes, slots, slot_size]:
+                    self.map.close()
+                    raise ValueError(f"{path} holds table of other version or geometry")
+        except BaseException:
+            os.close(self.fd)
+            raise
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+    @contextmanager
+    def _locked(self, lock: int, count: int = 1):
+        """Holds exclusive lock of lock range. Range 0 guards table setup, stripe i is
+        guarded by range i + 1."""
+
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, count, lock)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, count, lock)
+
+    @staticmethod
+    def _encode_key(key: Key) -> bytes:
+        return "\x1f".join(f"{'i' if isinstance(part, int) else 's'}{part}"
+                           for part in key).encode()
+
+    def _locate(self, key: Key) -> typing.Tuple[bytes, int, int, int]:
+        """Returns encoded key, its hash, stripe and first slot."""
+
+        encoded = self._encode_key(key)
+        key_hash = int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "big")
+        return encoded, key_hash, key_hash % self.stripes, \
+            (key_hash // self.stripes) % self.slots
+
+    def _slot_offset(self, stripe: int, slot: int) -> int:
+        return self.data_offset + (stripe * self.slots + slot) * self.slot_size
+
+    def _probe(self, stripe: int, first: int) -> typing.Iterator[typing.Tuple[int, int]]:
+        """Yields (slot, offset) of probing window in probing order."""
+
+        for n in range(self.window):
+            slot = (first + n) % self.slots
+            yield slot, self._slot_offset(stripe, slot)
+
+    def _read_slot(self, offset: int, encoded_key: bytes = None,
+                   payload=False) -> typing.Union[tuple, None]:
+        """Reads slot without lock.
+
+        :param encoded_key: compare slot key with this one
+        :param payload: copy payload if key matches
+        :return: (header, key matches, payload or None), None if slot stays busy
+        """
+
+        view = self.map
+        end = offset + self.slot_size
+        for _ in range(self.READ_ATTEMPTS):
+            header = SLOT_HEADER.unpack_from(view, offset)
+            sequence = header[0]
+            if sequence & 1:
+                continue
+            matches = False
+            data = None
+            if header[1] == USED and encoded_key is not None:
+                start = offset + SLOT_HEADER.size
+                key_end = min(start + header[7], end)
+                matches = view[start:key_end] == encoded_key
+                if matches and payload:
+                    data = view[key_end:min(key_end + header[8], end)]
+            # Header and copied data are consistent if nobody wrote slot meanwhile
+            if SEQUENCE.unpack_from(view, offset)[0] == sequence:
+                return header, matches, data
+        return None
+
+    def _find(self, key: Key, payload=False) -> typing.Union[tuple, None]:
+        """Returns (slot, slot offset, header, payload) of key or None."""
+
+        encoded, _, stripe, first = self._locate(key)
+        for slot, offset in self._probe(stripe, first):
+            read = self._read_slot(offset, encoded, payload)
+            if read is None:
+                continue
+            header, matches, data = read
+            if header[1] == EMPTY:
+                return None
+            if matches:
+                return slot, offset, header, data
+        return None
+
+    def _write_slot(self, offset: int, state: int, kind=0, key_hash=0, stored_at=0.0,
+                    expires_at=0.0, size=0, encoded_key=b"", payload=b"") -> None:
+        """Rewrites slot while its sequence is odd. Caller holds stripe lock."""
+
+        sequence, = SEQUENCE.unpack_from(self.map, offset)
+        SEQUENCE.pack_into(self.map, offset, (sequence + 1) & 0xFFFFFFFF)
+        start = offset + SLOT_HEADER.size
+        self.map[start:start + len(encoded_key)] = encoded_key
+        start += len(encoded_key)
+        self.map[start:start + len(payload)] = payload
+        SLOT_HEADER.pack_into(self.map, offset, (sequence + 1) & 0xFFFFFFFF, state, kind,
+                              key_hash, stored_at, expires_at, size, len(encoded_key),
+                              len(payload))
+        SEQUENCE.pack_into(self.map, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def _remove_slot(self, stripe: int, slot: int) -> None:
+        """Removes entry of slot. Caller holds stripe lock.
+
+        Slot becomes tombstone, so probing goes on past it. If the next slot is empty, no
+        probing passes this one either: it is emptied, and so are tombstones before it.
+        """
+
+        following = self._slot_offset(stripe, (slot + 1) % self.slots)
+        if SLOT_HEADER.unpack_from(self.map, following)[1] != EMPTY:
+            self._write_slot(self._slot_offset(stripe, slot), DELETED)
+            return
+        for _ in range(self.slots):
+            self._write_slot(self._slot_offset(stripe, slot), EMPTY)
+            slot = (slot - 1) % self.slots
+            if SLOT_HEADER.unpack_from(self.map, self._slot_offset(stripe, slot))[1] != \
+                    DELETED:
+                break
+
+    def _account(self, stripe: int, count: int, size: int) -> None:
+        offset = TABLE_HEADER.size + stripe * STRIPE_HEADER.size
+        entries, total = STRIPE_HEADER.unpack_from(self.map, offset)
+        STRIPE_HEADER.pack_into(self.map, offset, entries + count, total + size)
+
+    def _stripe_totals(self) -> typing.Iterator[typing.Tuple[int, int]]:
+        for stripe in range(self.stripes):
+            yield STRIPE_HEADER.unpack_from(
+                self.map, TABLE_HEADER.size + stripe * STRIPE_HEADER.size)
+
+    def __len__(self):
+        return sum(entries for entries, _ in self._stripe_totals())
+
+    def __contains__(self, key: Key):
+        return self._find(key) is not None
+
+    @property
+    def bytes(self) -> int:
+        return sum(total for _, total in self._stripe_totals())
+
+    def get(self, key: Key) -> typing.Union[Entry, None]:
+        found = self._find(key, payload=True)
+        if found is None:
+            return None
+        header, payload = found[2:]
+        return snapshot.decode(header[2], payload, header[5])
+
+    def put(self, key: Key, entry: Entry) -> PutResult:
+        kind, payload = snapshot.encode(entry)
+        encoded, key_hash, stripe, first = self._locate(key)
+        fits = SLOT_HEADER.size + len(encoded) + len(payload) <= self.slot_size
+        with self._locked(stripe + 1):
+            existing = free = victim = None
+            victim_expiry = None
+            for slot, offset in self._probe(stripe, first):
+                header = SLOT_HEADER.unpack_from(self.map, offset)
+                state = header[1]
+                if state != USED:
+                    if free is None:
+                        free = offset
+                    if state == EMPTY:
+                        break
+                    continue
+                start = offset + SLOT_HEADER.size
+                if header[3] == key_hash and \
+                        self.map[start:start + header[7]] == encoded:
+                    existing = slot, offset
+                    break
+                if victim_expiry is None or header[5] < victim_expiry:
+                    victim, victim_expiry = offset, header[5]
+            evicted = ()
+            if existing is not None:
+                slot, target = existing
+                self._account(stripe, -1, -SLOT_HEADER.unpack_from(self.map, target)[6])
+                if not fits:
+                    self._remove_slot(stripe, slot)
+                    return PutResult(False, True)
+            elif not fits:
+                return PutResult(False, False)
+            elif free is not None:
+                target = free
+            else:
+                header = SLOT_HEADER.unpack_from(self.map, victim)
+                start = victim + SLOT_HEADER.size + header[7]
+                replaced = snapshot.decode(header[2], self.map[start:start + header[8]],
+                                           header[5])
+                self._account(stripe, -1, -header[6])
+                evicted = ((replaced.key, header[6]),)
+                target = victim
+            self._write_slot(target, USED, kind, key_hash, entry.stored_at, entry.expires_at,
+                             entry.size, encoded, payload)
+            self._account(stripe, 1, entry.size)
+        return PutResult(True, existing is not None, evicted)
+
+    def discard(self, key: Key, entry: Entry = None) -> typing.Union[int, None]:
+        stripe = self._locate(key)[2]
+        with self._locked(stripe + 1):
+            found = self._find(key)
+            if found is None:
+                return None
+            slot, _, header, _ = found
+            if entry is not None and \
+                    (header[4], header[5]) != (entry.stored_at, entry.expires_at):
+                return None
+            self._remove_slot(stripe, slot)
+            self._account(stripe, -1, -header[6])
+            return header[6]
+
+    def is_current(self, key: Key, entry: Entry) -> bool:
+        found = self._find(key)
+        return found is not None and \
+            (found[2][4], found[2][5]) == (entry.stored_at, entry.expires_at)
+
+    def values(self) -> typing.Iterator[Entry]:
+        for stripe in range(self.stripes):
+            for slot in range(self.slots):
+                offset = self._slot_offset(stripe, slot)
+                read = self._read_slot(offset)
+                if read is None or read[0][1] != USED:
+                    continue
+                header = read[0]
+                start = offset + SLOT_HEADER.size + header[7]
+                payload = self.map[start:min(start + header[8], offset + self.slot_size)]
+                # Slot may have been rewritten while payload was copied
+                if SEQUENCE.unpack_from(self.map, offset)[0] == header[0]:
+                    yield snapshot.decode(header[2], payload, header[5])
+
+    def clear(self) -> None:
+        """Removes entries of all processes sharing the table."""
+
+        with self._locked(1, self.stripes):
+            for stripe in range(self.stripes):
+                for slot in range(self.slots):
+                    offset = self._slot_offset(stripe, slot)
+                    if SLOT_HEADER.unpack_from(self.map, offset)[1] != EMPTY:
+                        self._write_slot(offset, EMPTY)
+                STRIPE_HEADER.pack_into(
+                    self.map, TABLE_HEADER.size + stripe * STRIPE_HEADER.size, 0, 0)
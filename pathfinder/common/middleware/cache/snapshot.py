@@ -0,0 +1,238 @@
+"""Binary snapshots of cache entries and delegations.
+
+File starts with header (magic, version, creation time) followed by records. Every record
+has kind, absolute expiry and payload length in front of its payload, so a reader skips
+expired records without decoding them:
+
+    header:  8s magic | H version | d created_at
+    record:  B kind | d expires_at | I payload length | payload
+
+Names are stored as text and wire data as length-prefixed blobs. RRset records keep
+their pre-encoded records, responses their wire image, everything else of an entry is
+rebuilt from them.
+"""
+import ipaddress
+import mmap
+import os
+import struct
+import tempfile
+import time
+import typing
+
+from pathfinder.common.dns.bytestream import ByteStream
+from pathfinder.common.dns.delegation import Delegation
+from pathfinder.common.dns.domains import DnsName
+from pathfinder.common.dns.exceptions import MalformedPacket
+from pathfinder.common.middleware.cache.entry import ENTRY_OVERHEAD, RCODE_NXDOMAIN, \
+    CachedNegative, CachedResponse, CachedRRset
+
+Entry = typing.Union[CachedRRset, CachedResponse, CachedNegative]
+Item = typing.Union[Entry, Delegation]
+
+MAGIC = b"PFCACHE\x00"
+VERSION = 1
+
+FILE_HEADER = struct.Struct("!8sHd")
+RECORD_HEADER = struct.Struct("!BdI")
+# Stored time, type and class
+ENTRY_HEAD = struct.Struct("!dHH")
+# Stored time, rcode, type and class (0 for NXDOMAIN)
+NEGATIVE_HEAD = struct.Struct("!dBHH")
+
+KIND_RRSET = 1
+KIND_NEGATIVE = 2
+KIND_RESPONSE = 3
+KIND_DELEGATION = 4
+
+
+class SnapshotError(ValueError):
+    """File is not a cache snapshot or it is damaged."""
+
+
+def _write_text(stream: ByteStream, text: str) -> None:
+    encoded = text.encode("ascii")
+    stream.pack("!H", len(encoded))
+    stream.write(encoded)
+
+
+def _read_text(stream: ByteStream) -> str:
+    length, = stream.unpack_from("!H")
+    return str(stream.read(length), "ascii")
+
+
+def _write_blob(stream: ByteStream, data: bytes) -> None:
+    stream.pack("!I", len(data))
+    stream.write(data)
+
+
+def _read_blob(stream: ByteStream) -> bytes:
+    length, = stream.unpack_from("!I")
+    return bytes(stream.read(length))
+
+
+def _write_rrset(stream: ByteStream, rrset: CachedRRset) -> None:
+    stream.pack(ENTRY_HEAD, rrset.stored_at, rrset.type, rrset.klass)
+    _write_text(stream, rrset.name.text)
+    _write_blob(stream, rrset.wire)
+    stream.pack("!H", len(rrset.referenced))
+    for name in rrset.referenced:
+        _write_text(stream, name.text)
+
+
+def _read_rrset(stream: ByteStream, expires_at: float) -> CachedRRset:
+    stored_at, rrtype, klass = stream.unpack_from(ENTRY_HEAD)
+    name = DnsName(_read_text(stream))
+    wire = _read_blob(stream)
+    count, = stream.unpack_from("!H")
+    referenced = [DnsName(_read_text(stream)) for _ in range(count)]
+    return CachedRRset.from_records(name, rrtype, klass, stored_at, expires_at, wire,
+                                    referenced)
+
+
+def _write_payload(stream: ByteStream, item: Item) -> int:
+    """Writes item payload and returns its record kind."""
+
+    if isinstance(item, CachedRRset):
+        _write_rrset(stream, item)
+        return KIND_RRSET
+    if isinstance(item, CachedNegative):
+        stream.pack(NEGATIVE_HEAD, item.stored_at, item.rcode, item.type or 0,
+                    item.klass or 0)
+        _write_text(stream, item.name.text)
+        _write_rrset(stream, item.soa)
+        return KIND_NEGATIVE
+    if isinstance(item, CachedResponse):
+        stream.pack(ENTRY_HEAD, item.stored_at, item.type, item.klass)
+        _write_text(stream, item.name.text)
+        _write_blob(stream, item.wire)
+        return KIND_RESPONSE
+    if isinstance(item, Delegation):
+        _write_text(stream, item.zone)
+        stream.pack("!B", len(item.nameservers))
+        for address in item.nameservers:
+            packed = address.packed
+            stream.pack("!B", len(packed))
+            stream.write(packed)
+        return KIND_DELEGATION
+    raise TypeError(f"Can't write {type(item).__name__} to snapshot")
+
+
+def _read_payload(stream: ByteStream, kind: int, expires_at: float) -> Item:
+    """Reads item payload of record kind."""
+
+    if kind == KIND_RRSET:
+        return _read_rrset(stream, expires_at)
+    if kind == KIND_NEGATIVE:
+        stored_at, rcode, rrtype, klass = stream.unpack_from(NEGATIVE_HEAD)
+        name = DnsName(_read_text(stream))
+        soa = _read_rrset(stream, expires_at)
+        if rcode == RCODE_NXDOMAIN:
+            rrtype = klass = None
+        return CachedNegative(name, rrtype, klass, rcode, stored_at, expires_at, soa,
+                              ENTRY_OVERHEAD + soa.size)
+    if kind == KIND_RESPONSE:
+        stored_at, rrtype, klass = stream.unpack_from(ENTRY_HEAD)
+        name = DnsName(_read_text(stream))
+        return CachedResponse.from_wire(name, rrtype, klass, _read_blob(stream), stored_at)
+    if kind == KIND_DELEGATION:
+        zone = _read_text(stream)
+        count, = stream.unpack_from("!B")
+        nameservers = []
+        for _ in range(count):
+            length, = stream.unpack_from("!B")
+            nameservers.append(ipaddress.ip_address(bytes(stream.read(length))))
+        return Delegation(zone, tuple(nameservers), expires_at)
+    raise SnapshotError(f"Unknown record kind {kind}")
+
+
+def encode(item: Item) -> typing.Tuple[int, bytes]:
+    """Returns record kind and payload of single item."""
+
+    stream = ByteStream()
+    kind = _write_payload(stream, item)
+    return kind, stream.data
+
+
+def decode(kind: int, payload: typing.Union[bytes, memoryview], expires_at: float) -> Item:
+    """Returns item from record kind, payload and expiry."""
+
+    try:
+        return _read_payload(ByteStream(payload), kind, expires_at)
+    except MemoryError:
+        raise SnapshotError("Snapshot record is truncated")
+    except SnapshotError:
+        raise
+    except (MalformedPacket, ValueError) as error:
+        raise SnapshotError(f"Snapshot record is damaged: {error}")
+
+
+def dumps(items: typing.Iterable[Item], now: float = None) -> bytes:
+    """Returns snapshot of cache entries and delegations."""
+
+    stream = ByteStream()
+    stream.pack(FILE_HEADER, MAGIC, VERSION, time.time() if now is None else now)
+    for item in items:
+        start = stream.pos
+        stream.pack(RECORD_HEADER, 0, item.expires_at, 0)
+        kind = _write_payload(stream, item)
+        stream.pack_into(RECORD_HEADER, start, kind, item.expires_at,
+                         stream.pos - start - RECORD_HEADER.size)
+    return stream.data
+
+
+def write(path: typing.Union[str, os.PathLike], data: bytes) -> None:
+    """Writes snapshot made by `dumps` to file atomically: readers see either previous or
+    new snapshot."""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def loads(data: typing.Union[bytes, bytearray, memoryview, mmap.mmap],
+          after: float = None) -> typing.Iterator[Item]:
+    """Yields items of snapshot one by one.
+
+    :param after: skip items which expire by this time, without decoding them
+    """
+
+    # Only this view of data is made and it is released however reading ends, so mapped
+    # file can be closed even while traceback of error keeps frames alive. Payloads
+    # are copied out of it before decoding
+    with memoryview(data) as view:
+        if len(view) < FILE_HEADER.size:
+            raise SnapshotError("Snapshot is truncated")
+        magic, version, _ = FILE_HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError("Not a cache snapshot or unsupported version")
+        pos = FILE_HEADER.size
+        while pos < len(view):
+            if pos + RECORD_HEADER.size > len(view):
+                raise SnapshotError("Snapshot is truncated")
+            kind, expires_at, length = RECORD_HEADER.unpack_from(view, pos)
+            pos += RECORD_HEADER.size + length
+            if pos > len(view):
+                raise SnapshotError("Snapshot is truncated")
+            if after is None or expires_at > after:
+                yield decode(kind, bytes(view[pos - length:pos]), expires_at)
+
+
+def read(path: typing.Union[str, os.PathLike], after: float = None) -> typing.Iterator[Item]:
+    """Yields items of snapshot file, which is memory-mapped and decoded lazily.
+
+    :param after: skip items which expire by this time, without decoding them
+    """
+
+    with open(path, "rb") as file:
+        if not os.fstat(file.fileno()).st_size:
+            raise SnapshotError("Snapshot is empty")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from loads(mapped, after)
@@ -0,0 +1,125 @@
+import bisect
+import typing
+from collections import Counter
+
+Snapshot = typing.Dict[str, typing.Any]
+
+
+class LatencyHistogram:
+    """Histogram of durations in fixed buckets.
+
+    Bucket counts are not cumulative: bucket i counts durations in (bounds[i-1], bounds[i]],
+    the last one counts durations above the largest bound.
+
+    :param bounds: ascending upper bounds of buckets in seconds
+    """
+
+    # 10 microseconds to 5 seconds, roughly 1-2.5-5 steps
+    BOUNDS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+              0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, bounds: typing.Sequence[float] = BOUNDS):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> typing.Union[float, None]:
+        """Returns upper bound of bucket holding q-quantile. None if histogram is empty,
+        infinity if it falls above the largest bound."""
+
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Snapshot:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": list(zip(self.bounds + (float("inf"),), self.buckets)),
+        }
+
+    def reset(self) -> None:
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+class CacheStats:
+    """Counters and latency histograms of cache.
+
+    Counters: hits, negative_hits, misses, insertions, replacements, expirations,
+    evictions, evicted_bytes, prefetches, prefetch_errors, stale_answers.
+    Histograms: lookup latency of hits and misses, and upstream query latency on misses.
+
+    Callbacks added with `add_callback` receive snapshot on every `report`, which is the
+    hook for pushing numbers into metrics systems.
+    """
+
+    COUNTERS = ("hits", "negative_hits", "misses", "insertions", "replacements",
+                "expirations", "evictions", "evicted_bytes", "prefetches",
+                "prefetch_errors", "stale_answers")
+    HISTOGRAMS = ("hit", "miss", "upstream")
+
+    def __init__(self, bounds: typing.Sequence[float] = LatencyHistogram.BOUNDS):
+        self.counters = Counter()
+        self.latency = {name: LatencyHistogram(bounds) for name in self.HISTOGRAMS}
+        self.callbacks: typing.List[typing.Callable[[Snapshot], None]] = []
+
+    def __getitem__(self, counter: str) -> int:
+        return self.counters[counter]
+
+    def add(self, counter: str, value: int = 1) -> None:
+        self.counters[counter] += value
+
+    def observe(self, histogram: str, seconds: float) -> None:
+        self.latency[histogram].observe(seconds)
+
+    def add_callback(self, callback: typing.Callable[[Snapshot], None]) -> None:
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback: typing.Callable[[Snapshot], None]) -> None:
+        self.callbacks.remove(callback)
+
+    def snapshot(self, reset=False, **gauges) -> Snapshot:
+        """Returns counters, hit ratio, latency histograms and given gauges.
+
+        :param reset: zero counters and histograms after taking snapshot
+        :param gauges: current values to include, like entry count
+        """
+
+        snapshot = {counter: self.counters[counter] for counter in self.COUNTERS}
+        lookups = snapshot["hits"] + snapshot["negative_hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = (lookups - snapshot["misses"]) / lookups if lookups else 0.0
+        snapshot.update(gauges)
+        snapshot["latency"] = {name: histogram.snapshot()
+                               for name, histogram in self.latency.items()}
+        if reset:
+            self.reset()
+        return snapshot
+
+    def report(self, reset=False, **gauges) -> Snapshot:
+        """Takes snapshot and passes it to callbacks."""
+
+        snapshot = self.snapshot(reset, **gauges)
+        for callback in self.callbacks:
+            callback(snapshot)
+        return snapshot
+
+    def reset(self) -> None:
+        """Zeroes counters and histograms. Callbacks are kept."""
+
+        self.counters.clear()
+        for histogram in self.latency.values():
+            histogram.reset()
@@ -0,0 +1,121 @@
+import typing
+from abc import ABCMeta, abstractmethod
+
+from pathfinder.common.middleware.cache.entry import CachedNegative, CachedResponse, \
+    CachedRRset
+
+Entry = typing.Union[CachedRRset, CachedResponse, CachedNegative]
+Key = tuple
+
+
+class PutResult(typing.NamedTuple):
+    """Outcome of `StorageBackend.put`."""
+
+    # Entry was stored. Backend may refuse entry, e.g. one larger than its slot
+    stored: bool
+    # Key was stored before, previous entry is gone either way
+    replaced: bool
+    # (key, size) of other entries removed to make room
+    evicted: typing.Tuple[typing.Tuple[Key, int], ...] = ()
+
+
+class StorageBackend(metaclass=ABCMeta):
+    """Key -> cache entry storage of `CacheMiddleware`.
+
+    Entries are immutable, backend only keeps them and accounts their size. Expiry and
+    eviction are driven by the middleware, unless backend is `bounded` and makes room
+    for new entries by itself.
+    """
+
+    name: str
+    # Backend keeps its own size limit, middleware doesn't evict from it
+    bounded = False
+
+    @abstractmethod
+    def __len__(self):
+        """Number of stored entries."""
+
+    @abstractmethod
+    def __contains__(self, key: Key):
+        """Checks that key is stored."""
+
+    @property
+    @abstractmethod
+    def bytes(self) -> int:
+        """Estimated size of stored entries."""
+
+    @abstractmethod
+    def get(self, key: Key) -> typing.Union[Entry, None]:
+        """Returns entry stored for key or None."""
+
+    @abstractmethod
+    def put(self, key: Key, entry: Entry) -> PutResult:
+        """Stores entry, replacing previous one."""
+
+    @abstractmethod
+    def discard(self, key: Key, entry: Entry = None) -> typing.Union[int, None]:
+        """Removes entry of key. Returns size of removed entry or None if nothing was removed.
+
+        :param entry: remove only if this entry is still stored for key
+        """
+
+    @abstractmethod
+    def is_current(self, key: Key, entry: Entry) -> bool:
+        """Checks that entry is still stored for key, not replaced or removed."""
+
+    @abstractmethod
+    def values(self) -> typing.Iterator[Entry]:
+        """Yields stored entries."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Removes all entries."""
+
+
+class DictBackend(StorageBackend):
+    """Entries in process memory dict."""
+
+    name = "dict"
+
+    def __init__(self):
+        self.entries: typing.Dict[Key, Entry] = {}
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: Key):
+        return key in self.entries
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Key) -> typing.Union[Entry, None]:
+        return self.entries.get(key)
+
+    def put(self, key: Key, entry: Entry) -> PutResult:
+        previous = self.entries.get(key)
+        if previous is not None:
+            self._bytes -= previous.size
+        self.entries[key] = entry
+        self._bytes += entry.size
+        return PutResult(True, previous is not None)
+
+    def discard(self, key: Key, entry: Entry = None) -> typing.Union[int, None]:
+        current = self.entries.get(key)
+        if current is None or (entry is not None and current is not entry):
+            return None
+        del self.entries[key]
+        self._bytes -= current.size
+        return current.size
+
+    def is_current(self, key: Key, entry: Entry) -> bool:
+        return self.entries.get(key) is entry
+
+    def values(self) -> typing.Iterator[Entry]:
+        return iter(list(self.entries.values()))
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self._bytes = 0
@@ -10,6 +10,8 @@ from pathfinder.common.middleware.edns.opt import Opt
 class EdnsAnswer(DnsMessageAnswer):
     """Custom Answer type for ENDS."""
 
+    __slots__ = ("udp_payload_size", "extended_rcode", "version", "do", "z")
+
     name: DnsDomain
     type: int
     klass: int
@@ -19,7 +21,6 @@ class EdnsAnswer(DnsMessageAnswer):
 
     def __init__(self, message, udp_payload_size=None, extended_rcode=None,
                  version=None, do=None, z=None, rdata=None):
-        self._message = message
         self.name = DnsDomain(message, label="", can_be_shortened=False)
         self.type = 41
         self.udp_payload_size = udp_payload_size
@@ -39,25 +40,23 @@ class EdnsAnswer(DnsMessageAnswer):
 
     @property
     def rdlength(self):
-        return len(self.rdata.pack())
+        return len(self.rdata.to_wire())
 
     @classmethod
     def unpack(cls, message, data):
         answer = cls(message)
         answer.name = DnsDomain.unpack(message, data)
         answer.type, answer.udp_payload_size, answer.extended_rcode, answer.version, ttl_octet2, \
-        answer._rdlength = struct.unpack(
-            "!2H2B2H", data.read(10)
-        )
+        answer._rdlength = data.unpack_from("!2H2B2H")
         answer.do = True if ttl_octet2 >= 32768 else False
         answer.z = ttl_octet2 - 32768 if answer.do else ttl_octet2
-        answer.rdata = rdata.Rdata.by_type(answer.type).unpack(answer, data)
+        answer.rdata = cls.unpack_rdata(answer, data)
         return answer
 
-    def pack(self):
-        name = self.name.pack()
-        fields = struct.pack("!HHLH", self.type, self.udp_payload_size, self.ttl, self.rdlength)
-        rdata_ = self.rdata.pack()
-        self._message.bytestream.write(fields + rdata_)
-
-        return name + fields + rdata_
+    def pack(self, message):
+        stream = message.bytestream
+        self.name.pack(message)
+        stream.pack(self.structure, self.type, self.udp_payload_size, self.ttl, 0)
+        rdata_start = stream.pos
+        self.rdata.pack(message)
+        stream.pack_into("!H", rdata_start - 2, stream.pos - rdata_start)
@@ -58,6 +58,15 @@ class Middleware(metaclass=ABCMeta):
                 manager, host, resource_name, resource_type, resource_class, *args, **kwargs)
         return wrap
 
+    @classmethod
+    def on_resolve(cls, func):
+        """Wraps whole resolution of resource, unlike on_query which wraps single query."""
+
+        @functools.wraps(func)
+        def wrap(manager, resource_name, resource_type, resource_class, *args, **kwargs):
+            return func(manager, resource_name, resource_type, resource_class, *args, **kwargs)
+        return wrap
+
 
 class MiddlewareList:
     def __init__(self, *middlewares: Middleware):
@@ -109,3 +118,14 @@ class MiddlewareList:
                 return stop.result
 
         return wrap
+
+    def on_resolve(self, func):
+        nested = func
+        for middleware in self.middlewares:
+            nested = middleware.on_resolve(nested)
+
+        @functools.wraps(func)
+        def wrap(manager, resource_name, resource_type, resource_class=1, **kwargs):
+            return nested(manager, resource_name, resource_type, resource_class, **kwargs)
+
+        return wrap
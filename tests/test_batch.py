@@ -0,0 +1,62 @@
+import struct
+
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.batch import BatchDecoder
+from pathfinder.common.dns.exceptions import MalformedPacket
+
+CORPUS = load_corpus()
+HEADER = struct.Struct("!HHHHHH")
+
+
+def query(*labels: bytes) -> bytes:
+    name = b"".join(bytes([len(label)]) + label for label in labels) + b"\x00"
+    return HEADER.pack(1, 0x0100, 1, 0, 0, 0) + name + struct.pack("!HH", 1, 1)
+
+
+def txt_response(text: bytes) -> bytes:
+    question = b"\x07example\x03com\x00" + struct.pack("!HH", 16, 1)
+    rdata = bytes([len(text)]) + text
+    record = b"\xc0\x0c" + struct.pack("!HHLH", 16, 1, 300, len(rdata)) + rdata
+    return HEADER.pack(1, 0x8180, 1, 1, 0, 0) + question + record
+
+
+def test_decode_many_skips_non_ascii_label():
+    decoder = BatchDecoder()
+    packets = [query(b"www", b"example", b"com"), query(b"\xc3\xa9a", b"com"),
+               query(b"example", b"org")]
+
+    summaries = list(decoder.decode_many(packets))
+
+    assert [summary.qname for summary in summaries] == ["www.example.com", "example.org"]
+    assert decoder.malformed == 1
+
+
+def test_decode_many_raises_malformed_packet():
+    decoder = BatchDecoder(skip_malformed=False)
+
+    with pytest.raises(MalformedPacket):
+        list(decoder.decode_many([query(b"\xc3\xa9a", b"com")]))
+
+
+def test_messages_skip_non_ascii_txt():
+    decoder = BatchDecoder()
+    packets = [txt_response(b"\xc3\xa9"), CORPUS["txt"], txt_response(b"plain")]
+
+    messages = list(decoder.messages(packets, lazy=False))
+
+    assert len(messages) == 2
+    assert messages[-1].answer[0].rdata.txt_data == "plain"
+    assert decoder.malformed == 1
+
+
+def test_messages_skip_non_ascii_caa():
+    decoder = BatchDecoder()
+    question = b"\x07example\x03com\x00" + struct.pack("!HH", 257, 1)
+    rdata = b"\x00\x05issue" + b"\xff"
+    record = b"\xc0\x0c" + struct.pack("!HHLH", 257, 1, 300, len(rdata)) + rdata
+    packet = HEADER.pack(1, 0x8180, 1, 1, 0, 0) + question + record
+
+    assert list(decoder.messages([packet], lazy=False)) == []
+    assert decoder.malformed == 1
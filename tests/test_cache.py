@@ -0,0 +1,75 @@
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+
+NOW = 1700000000.0
+CORPUS = load_corpus()
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    CacheMiddleware.configure()
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+def save(name, now=NOW):
+    message = DnsMessage.unpack(CORPUS[name])
+    CacheMiddleware._parse_and_save_message(message, now)
+    CacheMiddleware._save_response(message, now)
+    return message
+
+
+def repack(message):
+    return DnsMessage.unpack(message.pack())
+
+
+def test_saved_message_is_unchanged():
+    expected = DnsMessage.unpack(CORPUS["mx_set"]).to_dict()
+
+    message = save("mx_set")
+
+    assert message.to_dict() == expected
+    assert repack(message).to_dict() == expected
+
+
+@pytest.mark.parametrize("name, question", [
+    ("mx_set", ("gmail.com", 15, 1)),
+    ("cname_chain", ("www.microsoft.com", 1, 1)),
+    ("aaaa", ("www.cloudflare.com", 28, 1)),
+])
+def test_response_hit_round_trip(name, question):
+    save(name)
+
+    hit = CacheMiddleware._find_resources(*question, now=NOW + 1)
+
+    assert hit is not None
+    assert repack(hit).to_dict() == hit.to_dict()
+
+
+@pytest.mark.parametrize("name, question", [
+    ("mx_set", ("google.com", 2, 1)),
+    ("root_referral", ("com", 2, 1)),
+    ("tld_referral", ("example.com", 2, 1)),
+])
+def test_rrset_hit_round_trip(name, question):
+    save(name)
+
+    hit = CacheMiddleware._find_resources(*question, now=NOW + 1)
+    repacked = repack(hit)
+
+    assert repacked.to_dict() == hit.to_dict()
+    assert len(repacked.authority) == len(hit.authority) > 0
+
+
+def test_negative_hit_round_trip():
+    message = save("nxdomain")
+    question = message.question[0]
+
+    hit = CacheMiddleware._find_resources(question.qname.label, 1, 1, now=NOW + 1)
+    repacked = repack(hit)
+
+    assert repacked.header.rcode == 3
+    assert repacked.to_dict() == hit.to_dict()
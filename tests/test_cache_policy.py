@@ -0,0 +1,127 @@
+import ipaddress
+
+import pytest
+
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.dns.parts.rdata import A, Rdata
+from pathfinder.common.middleware.cache.entry import CachedRRset
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+from pathfinder.common.middleware.cache.policy import ArcPolicy, LruPolicy
+
+NOW = 1700000000.0
+CAPACITY = 10
+HOT = [f"hot{n}.example.com" for n in range(5)]
+SCAN = [f"scan{n:03}.example.com" for n in range(100)]
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+def rrset(name: str, n: int = 1) -> CachedRRset:
+    rdata = A()
+    rdata.address = ipaddress.IPv4Address(0x0a000000 + n)
+    record = DnsMessageAnswer(None, name, Rdata.TYPE_A, 1, 300, rdata)
+    return CachedRRset.from_resources([record], NOW)
+
+
+def store(name: str) -> None:
+    entry = rrset(name)
+    CacheMiddleware._put(entry.key, entry)
+    CacheMiddleware._evict()
+
+
+def hit(name: str) -> bool:
+    return CacheMiddleware._find_resources(name, Rdata.TYPE_A, 1, now=NOW) is not None
+
+
+def run_scan(policy) -> set:
+    """Inserts hot keys, hits them, then inserts one-off keys. Returns cached keys."""
+
+    cached = set()
+
+    def insert(key):
+        policy.insert(key)
+        cached.add(key)
+        while len(policy) > CAPACITY:
+            cached.discard(policy.evict())
+
+    for key in HOT:
+        insert(key)
+    for key in HOT:
+        policy.access(key)
+    for key in SCAN:
+        insert(key)
+    return cached
+
+
+def test_arc_keeps_hot_keys_through_scan():
+    cached = run_scan(ArcPolicy(CAPACITY))
+
+    assert set(HOT) <= cached
+    assert len(cached) == CAPACITY
+
+
+def test_lru_loses_hot_keys_to_scan():
+    cached = run_scan(LruPolicy(CAPACITY))
+
+    assert not set(HOT) & cached
+    assert cached == set(SCAN[-CAPACITY:])
+
+
+def test_arc_ghost_hit_goes_to_frequent():
+    policy = ArcPolicy(2)
+    policy.insert("a")
+    policy.access("a")
+    policy.insert("b")
+    policy.insert("c")
+
+    assert policy.evict() == "b"
+    assert "b" in policy.recent_ghost
+    policy.insert("b")
+    assert "b" in policy.frequent
+    assert policy.target > 0
+
+
+@pytest.mark.parametrize("policy, survives", [("arc", True), ("lru", False)])
+def test_cache_policy_decides_hot_set(policy, survives):
+    CacheMiddleware.configure(max_entries=CAPACITY, policy=policy)
+    for name in HOT:
+        store(name)
+    for name in HOT:
+        assert hit(name)
+    for name in SCAN:
+        store(name)
+
+    assert len(CacheMiddleware.STORAGE) == CAPACITY
+    assert all(hit(name) for name in HOT) is survives
+    assert CacheMiddleware.STATS["evictions"] == len(HOT) + len(SCAN) - CAPACITY
+
+
+def test_byte_limit():
+    size = rrset(SCAN[0]).size
+    CacheMiddleware.configure(max_entries=None, max_bytes=size * 5 + size // 2)
+
+    for name in SCAN[:20]:
+        store(name)
+
+    assert len(CacheMiddleware.STORAGE) == 5
+    assert CacheMiddleware.STORAGE.bytes == size * 5
+    assert CacheMiddleware.STATS["evictions"] == 15
+    assert CacheMiddleware.STATS["evicted_bytes"] == size * 15
+    assert [name for name in SCAN[:20] if hit(name)] == SCAN[15:20]
+
+
+def test_byte_limit_counts_replaced_entry_once():
+    entry = rrset(SCAN[0])
+    CacheMiddleware.configure(max_entries=None, max_bytes=entry.size)
+
+    store(SCAN[0])
+    store(SCAN[0])
+
+    assert len(CacheMiddleware.STORAGE) == 1
+    assert CacheMiddleware.STORAGE.bytes == entry.size
+    assert CacheMiddleware.STATS["evictions"] == 0
+    assert CacheMiddleware.STATS["replacements"] == 1
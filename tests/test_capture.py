@@ -0,0 +1,195 @@
+import ipaddress
+import struct
+
+import pytest
+
+from pathfinder.common.capture import PROTOCOL_TCP, PROTOCOL_UDP, TCP_FIN, TCP_SYN, \
+    CaptureReader, TcpFlow
+
+HEADER = struct.Struct("!HHHHHH")
+CLIENT = ipaddress.IPv6Address("2001:db8::1")
+SERVER = ipaddress.IPv6Address("2001:db8::53")
+PSH_ACK = 0x18
+
+
+def query(*labels: bytes, id: int = 1) -> bytes:
+    name = b"".join(bytes([len(label)]) + label for label in labels) + b"\x00"
+    return HEADER.pack(id, 0x0100, 1, 0, 0, 0) + name + struct.pack("!HH", 1, 1)
+
+
+def framed(*messages: bytes) -> bytes:
+    """Returns TCP stream of length-prefixed messages."""
+
+    return b"".join(struct.pack("!H", len(message)) + message for message in messages)
+
+
+def frame(payload: bytes) -> bytes:
+    udp = struct.pack("!HHHH", 5353, 53, 8 + len(payload), 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 1, 0, 64, 17, 0,
+                     ipaddress.IPv4Address("10.0.0.1").packed,
+                     ipaddress.IPv4Address("10.0.0.2").packed) + udp
+    return b"\x00" * 12 + struct.pack("!H", 0x800) + ip
+
+
+def tcp_frame(seq: int, flags: int = PSH_ACK, data: bytes = b"") -> bytes:
+    """Returns Ethernet frame of IPv6 TCP segment from client to server."""
+
+    tcp = struct.pack("!HHLLBBHHH", 40000, 53, seq, 0, 5 << 4, flags, 65535, 0, 0) + data
+    ip = struct.pack("!LHBB", 0x60000000, len(tcp), PROTOCOL_TCP, 64) + CLIENT.packed + \
+        SERVER.packed + tcp
+    return b"\x00" * 12 + struct.pack("!H", 0x86DD) + ip
+
+
+def write_pcap(path, payloads):
+    with open(path, "wb") as file:
+        file.write(struct.pack("<LHHlLLL", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for i, payload in enumerate(payloads):
+            data = frame(payload)
+            file.write(struct.pack("<LLLL", 100 + i, 0, len(data), len(data)) + data)
+
+
+def write_pcapng(path, frames):
+    """Writes big endian pcapng with nanosecond timestamps, frame i is at 100 + i s."""
+
+    def block(block_type: int, body: bytes) -> bytes:
+        body += b"\x00" * (-len(body) % 4)
+        return struct.pack(">LL", block_type, 12 + len(body)) + body + \
+            struct.pack(">L", 12 + len(body))
+
+    with open(path, "wb") as file:
+        file.write(block(0x0A0D0D0A, struct.pack(">LHHq", 0x1A2B3C4D, 1, 0, -1)))
+        # Ethernet interface with if_tsresol option of 10^-9
+        file.write(block(1, struct.pack(">HHL", 1, 0, 65535) +
+                         struct.pack(">HHB3x", 9, 1, 9) + struct.pack(">HH", 0, 0)))
+        for i, data in enumerate(frames):
+            timestamp = (100 + i) * 10 ** 9 + 5
+            file.write(block(6, struct.pack(">LLLLL", 0, timestamp >> 32,
+                                            timestamp & 0xFFFFFFFF, len(data), len(data)) +
+                             data))
+
+
+@pytest.fixture
+def stream():
+    return framed(query(b"www", b"example", b"com"), query(b"example", b"org", id=2))
+
+
+def test_messages_skip_non_ascii_label(tmp_path):
+    path = tmp_path / "capture.pcap"
+    write_pcap(path, [query(b"www", b"example", b"com"), query(b"\xc3\xa9a", b"com"),
+                      query(b"example", b"org")])
+
+    with CaptureReader(path) as reader:
+        messages = list(reader.messages())
+
+    assert [message.question[0].qname.label for message in messages] == \
+        ["www.example.com", "example.org"]
+    assert reader.malformed == 1
+
+
+def test_flow_joins_message_split_across_segments(stream):
+    flow = TcpFlow(1000)
+
+    assert flow.feed(1000, memoryview(stream[:1])) == []
+    assert flow.feed(1001, memoryview(stream[1:10])) == []
+    messages = flow.feed(1010, memoryview(stream[10:]))
+
+    assert messages == [query(b"www", b"example", b"com"), query(b"example", b"org", id=2)]
+    assert flow.buffer == bytearray()
+    assert flow.next_seq == 1000 + len(stream)
+
+
+def test_flow_reorders_segments(stream):
+    flow = TcpFlow(1000)
+    cuts = [0, 10, 30, len(stream)]
+    segments = [(1000 + start, stream[start:end]) for start, end in zip(cuts, cuts[1:])]
+
+    assert flow.feed(*segments[2]) == []
+    assert flow.feed(*segments[1]) == []
+    assert len(flow.pending) == 2
+    messages = flow.feed(*segments[0])
+
+    assert len(messages) == 2
+    assert not flow.pending
+
+
+def test_flow_skips_retransmitted_data(stream):
+    flow = TcpFlow(1000)
+    flow.feed(1000, memoryview(stream[:20]))
+
+    # Whole segment again, then one overlapping received data and bringing new data
+    assert flow.feed(1000, memoryview(stream[:20])) == []
+    assert flow.feed(1010, memoryview(stream[10:20])) == []
+    messages = flow.feed(1010, memoryview(stream[10:]))
+
+    assert messages == [query(b"www", b"example", b"com"), query(b"example", b"org", id=2)]
+
+
+def test_flow_resynchronizes_after_too_many_holes(stream):
+    flow = TcpFlow(1000)
+    for n in range(TcpFlow.MAX_PENDING):
+        flow.feed(5000 + 100 * n, memoryview(b"lost"))
+    assert len(flow.pending) == TcpFlow.MAX_PENDING
+
+    messages = flow.feed(9000, memoryview(stream))
+
+    assert len(messages) == 2
+    assert not flow.pending
+    assert flow.next_seq == 9000 + len(stream)
+
+
+def test_flow_sequence_wraps_around(stream):
+    start = 0xFFFFFFFF - 5
+    flow = TcpFlow(start)
+
+    assert flow.feed((start + 10) & 0xFFFFFFFF, memoryview(stream[10:])) == []
+    messages = flow.feed(start, memoryview(stream[:10]))
+
+    assert len(messages) == 2
+    assert flow.next_seq == (start + len(stream)) & 0xFFFFFFFF
+
+
+def test_flow_starts_at_first_segment_without_syn(stream):
+    flow = TcpFlow()
+
+    assert len(flow.feed(123456, memoryview(stream))) == 2
+
+
+def test_pcapng_tcp_stream(tmp_path, stream):
+    path = tmp_path / "capture.pcapng"
+    cuts = [0, 10, 30, len(stream)]
+    segments = [tcp_frame(1001 + start, data=stream[start:end])
+                for start, end in zip(cuts, cuts[1:])]
+    write_pcapng(path, [
+        # Data of connection whose start was not captured, dropped on SYN below
+        tcp_frame(500, data=stream[:10]),
+        tcp_frame(1000, TCP_SYN),
+        segments[0], segments[2], segments[1], segments[1],
+        tcp_frame(1001 + len(stream), TCP_FIN),
+    ])
+
+    with CaptureReader(path) as reader:
+        payloads = list(reader.payloads())
+        flows = dict(reader.flows)
+
+    assert [payload.data for payload in payloads] == \
+        [query(b"www", b"example", b"com"), query(b"example", b"org", id=2)]
+    assert all(payload.protocol == PROTOCOL_TCP for payload in payloads)
+    assert (payloads[0].src, payloads[0].sport, payloads[0].dst, payloads[0].dport) == \
+        (CLIENT, 40000, SERVER, 53)
+    # Both messages are completed by the fourth frame, at 104 s and 5 ns
+    assert payloads[0].timestamp == pytest.approx(104.000000005)
+    assert flows == {}
+
+
+def test_pcapng_mixed_protocols(tmp_path):
+    path = tmp_path / "capture.pcapng"
+    message = query(b"www", b"example", b"com")
+    write_pcapng(path, [frame(message), tcp_frame(1, TCP_SYN),
+                        tcp_frame(2, PSH_ACK | TCP_FIN, framed(message))])
+
+    with CaptureReader(path) as reader:
+        payloads = list(reader.payloads())
+
+    assert [(payload.protocol, payload.data) for payload in payloads] == \
+        [(PROTOCOL_UDP, message), (PROTOCOL_TCP, message)]
+    assert payloads[0].timestamp == pytest.approx(100.000000005)
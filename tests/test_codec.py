@@ -0,0 +1,130 @@
+import struct
+import time
+
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.bytestream import ByteStream
+from pathfinder.common.dns.exceptions import MalformedPacket
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.middleware.edns.custom_answer import EdnsAnswer
+
+CORPUS = load_corpus()
+
+
+def record(rrtype: int, rdata: bytes, rdlength: int = None) -> ByteStream:
+    """Returns stream with one record followed by spare octets, so reads past rdlength
+    stay inside data."""
+
+    rdlength = len(rdata) if rdlength is None else rdlength
+    return ByteStream(b"\x00" + struct.pack("!HHLH", rrtype, 1, 300, rdlength) + rdata +
+                      b"\x00" * 16)
+
+
+@pytest.fixture(params=sorted(CORPUS))
+def wire(request):
+    return CORPUS[request.param]
+
+
+def test_corpus_is_not_empty():
+    assert CORPUS
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_encode_reproduces_corpus(wire, lazy):
+    assert DnsMessage.unpack(wire, lazy=lazy).pack() == wire
+
+
+def test_encode_patches_rdlength():
+    message = DnsMessage.unpack(CORPUS["mx_set"])
+    record = message.answer[0]
+    record.rdata.exchange.label = "a-much-longer-exchange-name.example.net"
+
+    repacked = DnsMessage.unpack(message.pack())
+
+    assert repacked.answer[0].rdata.exchange.label == record.rdata.exchange.label
+    assert repacked.to_dict()["additional"] == message.to_dict()["additional"]
+
+
+def test_eager_round_trip(wire):
+    message = DnsMessage.unpack(wire)
+    repacked = DnsMessage.unpack(message.pack())
+
+    assert repacked.to_dict() == message.to_dict()
+
+
+def test_lazy_round_trip(wire):
+    expected = DnsMessage.unpack(wire).to_dict()
+
+    message = DnsMessage.unpack(wire, lazy=True)
+    assert not message.answer.decoded
+    repacked = DnsMessage.unpack(message.pack())
+
+    assert repacked.to_dict() == expected
+    assert message.to_dict() == expected
+
+
+def test_lazy_round_trip_after_partial_decode(wire):
+    expected = DnsMessage.unpack(wire).to_dict()
+
+    message = DnsMessage.unpack(wire, lazy=True)
+    len(message.additional.data)
+    first = DnsMessage.unpack(message.pack())
+    second = DnsMessage.unpack(message.pack())
+
+    assert first.to_dict() == expected
+    assert second.to_dict() == expected
+
+
+def test_lazy_sections_have_length_before_decoding(wire):
+    eager = DnsMessage.unpack(wire)
+    lazy = DnsMessage.unpack(wire, lazy=True)
+
+    for section in ("answer", "authority", "additional"):
+        assert len(getattr(lazy, section)) == len(getattr(eager, section))
+    assert not lazy.answer.decoded
+
+
+def test_records_keep_no_message_or_timestamp(wire, monkeypatch):
+    def clock():
+        raise AssertionError("Decoding must not read clock")
+
+    monkeypatch.setattr(time, "time", clock)
+    message = DnsMessage.unpack(wire)
+
+    for record in [*message.answer, *message.authority, *message.additional]:
+        assert not hasattr(record, "_message")
+        assert not hasattr(record, "__dict__")
+
+
+def test_read_rejects_negative_length():
+    stream = ByteStream(b"abcdef")
+    stream.pos = 4
+
+    with pytest.raises(MalformedPacket):
+        stream.read(-2)
+    with pytest.raises(MalformedPacket):
+        stream.peek(-2)
+    assert stream.pos == 4
+
+
+@pytest.mark.parametrize("rrtype, rdata, rdlength", [
+    # TXT with rdlength 0 used to read -1 octets
+    (16, b"", 0),
+    # CAA tag longer than rdata
+    (257, b"\x00\x09issue", None),
+    # A record longer than its rdlength
+    (1, b"\x7f\x00\x00\x01", 2),
+    # MX shorter than its rdlength
+    (15, b"\x00\x0a\x00", 5),
+])
+def test_rdata_must_take_rdlength(rrtype, rdata, rdlength):
+    with pytest.raises(MalformedPacket):
+        DnsMessageAnswer.unpack(DnsMessage(), record(rrtype, rdata, rdlength))
+
+
+def test_edns_rdata_must_take_rdlength():
+    # Option length runs past rdlength
+    with pytest.raises(MalformedPacket):
+        EdnsAnswer.unpack(DnsMessage(), record(41, b"\x00\x0a\x00\x04\xaa\xbb", 6))
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from ipaddress import IPv4Address
+
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.client.manager import ClientManager
+from pathfinder.common.dns.delegation import DelegationCache
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.root_servers import ROOT_SERVERS
+
+CORPUS = load_corpus()
+ROOTS = {str(address) for addresses in ROOT_SERVERS.values() for address in addresses}
+FAKE_SERVER = IPv4Address("192.0.2.1")
+
+
+class Stop(Exception):
+    pass
+
+
+class Manager(ClientManager):
+    """Manager answering every query with root referral to com."""
+
+    def __init__(self, delegations: DelegationCache):
+        self.delegations = delegations
+        self.queried = []
+
+    async def query(self, host, resource_name, resource_type, resource_class, timeout=1):
+        self.queried.append(host)
+        if host in ROOTS or host == str(FAKE_SERVER):
+            return DnsMessage.unpack(CORPUS["root_referral"])
+        raise Stop(host)
+
+
+def find_nameservers(manager, name):
+    return asyncio.run(manager.find_nameservers(
+        name, 1, ip_filter=lambda address: isinstance(address, IPv4Address)))
+
+
+def test_referral_from_root_is_saved_with_capped_ttl():
+    manager = Manager(DelegationCache(max_ttl=3600))
+
+    with pytest.raises(Stop):
+        find_nameservers(manager, "www.example.com")
+
+    delegation = manager.delegations.get("com")
+    assert delegation is not None
+    assert delegation.expires_at <= time.time() + 3600
+
+
+@pytest.mark.parametrize("server_zone", ["com", "example.com"])
+def test_referral_not_below_server_zone_is_ignored(server_zone):
+    delegations = DelegationCache()
+    delegations.put(server_zone, [FAKE_SERVER], 300)
+    manager = Manager(delegations)
+
+    assert find_nameservers(manager, "www.example.com") == []
+    assert manager.queried == [str(FAKE_SERVER)]
+    assert list(delegations.delegations) == [server_zone]
+    assert delegations.get(server_zone).nameservers == (FAKE_SERVER,)
+
+
+def test_put_caps_ttl():
+    delegations = DelegationCache(max_ttl=60)
+
+    delegations.put("example.com", [FAKE_SERVER], 86400 * 7, now=1000.0)
+
+    assert delegations.get("example.com", now=1059.0) is not None
+    assert delegations.get("example.com", now=1060.0) is None
+
+
+def test_in_bailiwick():
+    assert ClientManager._in_bailiwick("com", "", "www.example.com")
+    assert ClientManager._in_bailiwick("example.com", "com", "www.example.com")
+    assert not ClientManager._in_bailiwick("com", "com", "www.example.com")
+    assert not ClientManager._in_bailiwick("com", "example.com", "www.example.com")
+    assert not ClientManager._in_bailiwick("example.org", "", "www.example.com")
+    assert not ClientManager._in_bailiwick("example.org", "org", "www.example.com")
@@ -0,0 +1,38 @@
+from pathfinder.common.dns.domains import DnsName
+
+
+def test_names_compare_by_key():
+    name = DnsName("WWW.Example.com.")
+
+    assert name == DnsName("www.example.com")
+    assert hash(name) == hash(DnsName("www.example.com"))
+    assert name.key == "www.example.com"
+    assert name.text == "WWW.Example.com."
+
+
+def test_name_compares_with_text():
+    name = DnsName("WWW.Example.com")
+
+    assert name == "WWW.Example.com"
+    assert name == "www.example.com."
+    assert name != "example.com"
+    assert name != 1
+
+
+def test_canonical_name():
+    lower = DnsName("example.com")
+    mixed = DnsName("Example.COM")
+
+    assert lower.canonical is lower
+    assert lower.key is lower.text
+    assert mixed.canonical.text == "example.com"
+
+
+def test_wire_and_suffixes():
+    name = DnsName("Mail.Example.com")
+
+    assert name.labels == ("Mail", "Example", "com")
+    assert name.wire == b"\x04Mail\x07Example\x03com\x00"
+    assert [key for _, key, _ in name.suffixes] == ["mail.example.com", "example.com", "com"]
+    assert DnsName("").wire == b"\x00"
+    assert DnsName(".").labels == ()
@@ -0,0 +1,149 @@
+import ipaddress
+
+import pytest
+
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.dns.parts.rdata import A, Rdata
+from pathfinder.common.middleware.cache.entry import CachedRRset
+from pathfinder.common.middleware.cache.expiry import ExpiryQueue
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+
+NOW = 1700000000.0
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    CacheMiddleware.configure()
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+def rrset(name: str, ttl: int, address: str = "192.0.2.1") -> CachedRRset:
+    rdata = A()
+    rdata.address = ipaddress.IPv4Address(address)
+    record = DnsMessageAnswer(None, name, Rdata.TYPE_A, 1, ttl, rdata)
+    return CachedRRset.from_resources([record], NOW, ttl)
+
+
+def store(count: int) -> list:
+    """Stores entries with TTL 1..count seconds, in reverse expiry order."""
+
+    entries = [rrset(f"host{ttl:03}.example.com", ttl) for ttl in range(count, 0, -1)]
+    for entry in entries:
+        CacheMiddleware._put(entry.key, entry)
+    return entries
+
+
+def cached_ttls() -> list:
+    return sorted(entry.expires_at - NOW for entry in CacheMiddleware.STORAGE.values())
+
+
+def test_queue_pops_in_expiry_order():
+    queue = ExpiryQueue(batch=2)
+    for expires_at, item in [(NOW + 3, "c"), (NOW + 1, "a"), (NOW + 2, "b"), (NOW + 1, "a2")]:
+        queue.push(expires_at, item)
+
+    assert queue.next_expiry() == NOW + 1
+    assert queue.pop_expired(NOW) == []
+    assert queue.pop_expired(NOW + 5) == ["a", "a2"]
+    assert queue.pop_expired(NOW + 5, limit=0) == ["b", "c"]
+    assert queue.next_expiry() is None
+
+
+def test_queue_pops_only_expired():
+    queue = ExpiryQueue()
+    queue.push(NOW + 1, "a")
+    queue.push(NOW + 10, "b")
+
+    assert queue.pop_expired(NOW + 1, limit=0) == ["a"]
+    assert len(queue) == 1
+
+
+def test_queue_compact():
+    queue = ExpiryQueue()
+    for n in range(10):
+        queue.push(NOW + n, n)
+
+    queue.compact(lambda item: item % 3 == 0)
+
+    assert len(queue) == 4
+    assert queue.pop_expired(NOW + 10, limit=0) == [0, 3, 6, 9]
+
+
+def test_reap_removes_bounded_batch_in_expiry_order():
+    store(200)
+    batch = CacheMiddleware.EXPIRY.batch
+
+    CacheMiddleware.reap_expired(now=NOW + 150)
+
+    assert cached_ttls() == list(range(batch + 1, 201))
+    assert CacheMiddleware.STATS["expirations"] == batch
+    assert len(CacheMiddleware.POLICY) == 200 - batch
+
+    CacheMiddleware.reap_expired(limit=10, now=NOW + 150)
+    assert cached_ttls() == list(range(batch + 11, 201))
+
+
+def test_reap_without_limit_removes_all_expired():
+    store(200)
+
+    CacheMiddleware.reap_expired(limit=0, now=NOW + 150)
+
+    assert cached_ttls() == list(range(151, 201))
+    assert CacheMiddleware.STATS["expirations"] == 150
+    assert len(CacheMiddleware.EXPIRY) == 50
+
+
+def test_purge_expired():
+    store(10)
+
+    CacheMiddleware.purge_expired(now=NOW + 10)
+
+    assert len(CacheMiddleware.STORAGE) == 0
+    assert len(CacheMiddleware.POLICY) == 0
+
+
+def test_lookup_reaps_one_batch():
+    store(200)
+
+    CacheMiddleware._find_resources("host200.example.com", Rdata.TYPE_A, 1, now=NOW + 150)
+
+    assert len(CacheMiddleware.STORAGE) == 200 - CacheMiddleware.EXPIRY.batch
+
+
+def test_replaced_entry_is_not_reaped_by_its_old_expiry():
+    old = rrset("www.example.com", 10)
+    new = rrset("www.example.com", 300, "192.0.2.2")
+    CacheMiddleware._put(old.key, old)
+    CacheMiddleware._put(new.key, new)
+
+    CacheMiddleware.reap_expired(limit=0, now=NOW + 100)
+
+    assert CacheMiddleware.STORAGE.get(new.key) == new
+    assert CacheMiddleware.STATS["expirations"] == 0
+    assert len(CacheMiddleware.EXPIRY) == 1
+
+
+def test_evicted_entry_is_skipped():
+    entries = store(5)
+    evicted = entries[-1]
+    CacheMiddleware._drop(evicted.key)
+    CacheMiddleware.POLICY.remove(evicted.key)
+
+    CacheMiddleware.reap_expired(limit=0, now=NOW + 5)
+
+    assert len(CacheMiddleware.STORAGE) == 0
+    assert CacheMiddleware.STATS["expirations"] == 4
+
+
+def test_eviction_compacts_queue_of_replaced_entries():
+    CacheMiddleware.configure(max_entries=10)
+    batch = CacheMiddleware.EXPIRY.batch
+    for ttl in range(1, 3 * batch):
+        entry = rrset("www.example.com", 1000 + ttl)
+        CacheMiddleware._put(entry.key, entry)
+        CacheMiddleware._evict()
+
+    # Only the last replacement is live, queue is compacted once it grows past batch
+    assert len(CacheMiddleware.STORAGE) == 1
+    assert len(CacheMiddleware.EXPIRY) <= batch + 2
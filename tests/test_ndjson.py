@@ -0,0 +1,54 @@
+import io
+import json
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns import ndjson
+from pathfinder.common.dns.message import DnsMessage
+
+CORPUS = load_corpus()
+
+
+class Counting(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+def test_compact_json_is_single_line():
+    message = DnsMessage.unpack(CORPUS["mx_set"])
+
+    compact = message.to_json(compact=True)
+
+    assert "\n" not in compact
+    assert ", " not in compact and ": " not in compact
+    assert json.loads(compact) == json.loads(message.to_json())
+
+
+def test_dump_writes_one_line_per_message():
+    names = sorted(CORPUS)
+    file = io.StringIO()
+
+    # Messages and wire data are both accepted
+    written = ndjson.dump([DnsMessage.unpack(CORPUS[name]) if n % 2 else CORPUS[name]
+                           for n, name in enumerate(names)], file)
+
+    lines = file.getvalue().split("\n")
+    assert written == len(names)
+    assert lines[-1] == ""
+    assert [json.loads(line) for line in lines[:-1]] == \
+        [json.loads(DnsMessage.unpack(CORPUS[name]).to_json()) for name in names]
+
+
+def test_writer_counts_and_flushes():
+    file = Counting()
+    writer = ndjson.NdjsonWriter(file, flush=True)
+
+    writer.write(CORPUS["mx_set"])
+    assert writer.write_many(memoryview(CORPUS[name]) for name in ("aaaa", "txt")) == 2
+
+    assert writer.written == 3
+    assert file.flushes == 3
+    assert len(file.getvalue().splitlines()) == 3
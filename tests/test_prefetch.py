@@ -0,0 +1,145 @@
+import asyncio
+import ipaddress
+import time
+
+import pytest
+
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.dns.parts.rdata import A, Rdata
+from pathfinder.common.middleware.cache.entry import CachedRRset
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware, REFRESHING
+
+NOW = 1700000000.0
+TTL = 100
+NAME = "www.example.com"
+
+
+class StubManager:
+    """Records resolve calls with question being refreshed at the time."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+        self.upstream = []
+
+    @CacheMiddleware.on_query
+    async def query(self, host, resource_name, resource_type, resource_class):
+        self.upstream.append(resource_name)
+
+    async def resolve(self, resource_name, resource_type, resource_class):
+        self.calls.append(((resource_name, resource_type, resource_class), REFRESHING.get()))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        await self.query("192.0.2.53", resource_name, resource_type, resource_class)
+        await self.query("192.0.2.53", "other.example.com", resource_type, resource_class)
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    CacheMiddleware.configure(prefetch=True, prefetch_window=0.1, prefetch_hits=3)
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+def store(name: str = NAME, now: float = NOW) -> CachedRRset:
+    rdata = A()
+    rdata.address = ipaddress.IPv4Address("192.0.2.1")
+    record = DnsMessageAnswer(None, name, Rdata.TYPE_A, 1, TTL, rdata)
+    entry = CachedRRset.from_resources([record], now, TTL)
+    CacheMiddleware._put(entry.key, entry)
+    return entry
+
+
+def lookups(manager, times) -> None:
+    """Looks name up at each time, then lets refresh tasks finish."""
+
+    async def run():
+        for now in times:
+            assert CacheMiddleware._find_resources(NAME, Rdata.TYPE_A, 1, now=now,
+                                                   manager=manager) is not None
+        while CacheMiddleware.REFRESHES:
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+
+def test_hot_entry_is_refreshed_near_expiry():
+    store()
+    manager = StubManager()
+
+    lookups(manager, [NOW + 95] * 3)
+
+    assert manager.calls == [((NAME, Rdata.TYPE_A, 1), (NAME, Rdata.TYPE_A, 1))]
+    assert CacheMiddleware.STATS["prefetches"] == 1
+    assert not CacheMiddleware.REFRESHES
+
+
+def test_entry_with_few_hits_is_not_refreshed():
+    store()
+    manager = StubManager()
+
+    lookups(manager, [NOW + 95] * 2)
+
+    assert manager.calls == []
+
+
+def test_entry_outside_window_is_not_refreshed():
+    store()
+    manager = StubManager()
+
+    # 10% of lifetime is 10 seconds before expiry
+    lookups(manager, [NOW + 89] * 5)
+
+    assert manager.calls == []
+
+
+def test_concurrent_hits_start_one_refresh():
+    store()
+    manager = StubManager()
+
+    lookups(manager, [NOW + 95] * 6)
+
+    assert len(manager.calls) == 1
+    assert CacheMiddleware.STATS["prefetches"] == 1
+
+
+def test_refresh_error_is_counted():
+    store()
+    manager = StubManager(error=ConnectionError("unreachable"))
+
+    lookups(manager, [NOW + 95] * 3)
+
+    assert len(manager.calls) == 1
+    assert CacheMiddleware.STATS["prefetches"] == 0
+    assert CacheMiddleware.STATS["prefetch_errors"] == 1
+    assert not CacheMiddleware.REFRESHES
+
+
+def test_prefetch_is_off_by_default():
+    CacheMiddleware.configure()
+    store()
+    manager = StubManager()
+
+    lookups(manager, [NOW + 95] * 5)
+
+    assert manager.calls == []
+
+
+def test_only_refresh_task_skips_cache():
+    entry = store(now=time.time())
+    store("other.example.com", now=time.time())
+    manager = StubManager()
+    question = (NAME, Rdata.TYPE_A, 1)
+
+    async def run():
+        CacheMiddleware.HITS[entry.key] = CacheMiddleware.PREFETCH_HITS
+        CacheMiddleware._prefetch(manager, entry.key, entry, question, entry.expires_at)
+        await CacheMiddleware.REFRESHES[question]
+        assert REFRESHING.get() is None
+        await manager.query("192.0.2.53", *question)
+
+    asyncio.run(run())
+
+    # Refreshed question went upstream, other question and later query were cache hits
+    assert manager.upstream == [NAME]
@@ -0,0 +1,92 @@
+import ipaddress
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.domains import DnsDomain
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.parts.rdata import A, Cname, Mx, Ns, Soa, Txt, Unknown
+
+CORPUS = load_corpus()
+
+
+def mx(preference: int, exchange: str) -> Mx:
+    rdata = Mx()
+    rdata.preference = preference
+    rdata.exchange = DnsDomain(None, exchange)
+    return rdata
+
+
+def soa(mname: str, rname: str, serial: int = 1) -> Soa:
+    rdata = Soa()
+    rdata.mname = DnsDomain(None, mname)
+    rdata.rname = DnsDomain(None, rname)
+    rdata.serial, rdata.refresh, rdata.retry, rdata.expire, rdata.minimum = \
+        serial, 7200, 3600, 1209600, 300
+    return rdata
+
+
+def test_to_wire():
+    rdata = mx(10, "Mail.Example.com")
+
+    assert rdata.to_wire() == b"\x00\x0a\x04Mail\x07Example\x03com\x00"
+    assert rdata.to_wire(canonical=True) == b"\x00\x0a\x04mail\x07example\x03com\x00"
+
+
+def test_to_wire_does_not_compress():
+    rdata = soa("ns1.example.com", "hostmaster.example.com")
+
+    wire = rdata.to_wire()
+
+    assert wire.count(b"\x07example\x03com\x00") == 2
+    assert rdata.to_wire(canonical=True) == wire
+
+
+def test_names_differing_in_case_are_equal():
+    assert mx(10, "Mail.EXAMPLE.com") == mx(10, "mail.example.com")
+    assert hash(mx(10, "Mail.EXAMPLE.com")) == hash(mx(10, "mail.example.com"))
+    assert soa("NS1.example.com", "Hostmaster.example.com") == \
+        soa("ns1.example.com", "hostmaster.example.com")
+
+
+def test_different_rdata_is_not_equal():
+    assert mx(10, "mail.example.com") != mx(20, "mail.example.com")
+    assert mx(10, "mail.example.com") != mx(10, "mail.example.net")
+    assert soa("ns1.example.com", "hostmaster.example.com", 1) != \
+        soa("ns1.example.com", "hostmaster.example.com", 2)
+    assert mx(10, "mail.example.com") != "mail.example.com"
+
+
+def test_text_is_case_sensitive():
+    upper, lower = Txt(), Txt()
+    upper.txt_data, lower.txt_data = "Hello", "hello"
+
+    assert upper != lower
+
+
+def test_same_wire_of_other_type_is_not_equal():
+    cname, ns = Cname(), Ns()
+    cname.cname = DnsDomain(None, "example.com")
+    ns.nsdname = DnsDomain(None, "example.com")
+
+    assert cname.to_wire() == ns.to_wire()
+    assert cname != ns
+
+
+def test_unknown_rdata_equals_known_of_same_type_and_wire():
+    address = A()
+    address.address = ipaddress.IPv4Address("192.0.2.1")
+    unknown = Unknown()
+    unknown.type, unknown.data = 1, b"\xc0\x00\x02\x01"
+
+    assert address == unknown
+    assert hash(address) == hash(unknown)
+
+
+def test_decoded_rdata_hash_matches_equality():
+    first = DnsMessage.unpack(CORPUS["mx_set"])
+    second = DnsMessage.unpack(CORPUS["mx_set"])
+
+    for one, other in zip(first.answer, second.answer):
+        assert one.rdata == other.rdata
+        assert hash(one.rdata) == hash(other.rdata)
+    rdata = [record.rdata for record in first.answer]
+    assert len(set(rdata) | {record.rdata for record in second.answer}) == len(rdata)
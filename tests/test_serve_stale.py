@@ -0,0 +1,163 @@
+import asyncio
+import gc
+import ipaddress
+import time
+
+import pytest
+
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.dns.parts.rdata import A, Rdata
+from pathfinder.common.middleware.cache.entry import CachedRRset
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+
+NAME = "www.example.com"
+ANSWER = object()
+STALE_TTL = 30
+DEADLINE = 0.01
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    CacheMiddleware.configure(stale_window=3600, stale_ttl=STALE_TTL,
+                              stale_deadline=DEADLINE)
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+def store_expired(name: str = NAME) -> CachedRRset:
+    """Stores RRset which expired a minute ago, so it is in stale window."""
+
+    rdata = A()
+    rdata.address = ipaddress.IPv4Address("192.0.2.1")
+    record = DnsMessageAnswer(None, name, Rdata.TYPE_A, 1, 60, rdata)
+    entry = CachedRRset.from_resources([record], time.time() - 120, 60)
+    CacheMiddleware._put(entry.key, entry)
+    return entry
+
+
+def resolver(result=ANSWER, delay=0.0, error=None):
+    """Returns resolve function and list of its finished calls."""
+
+    finished = []
+
+    async def resolve(manager, resource_name, resource_type, resource_class):
+        await asyncio.sleep(delay)
+        finished.append(resource_name)
+        if error is not None:
+            raise error
+        return result
+
+    return CacheMiddleware.on_resolve(resolve), finished
+
+
+def resolve(wrapped, name: str = NAME):
+    return asyncio.run(wrapped(None, name, Rdata.TYPE_A, 1))
+
+
+def assert_stale(message):
+    assert [answer.ttl for answer in message.answer] == [STALE_TTL]
+    assert str(message.answer[0].rdata.address) == "192.0.2.1"
+    assert CacheMiddleware.STATS["stale_answers"] == 1
+
+
+def test_fresh_result_is_returned():
+    store_expired()
+    wrapped, _ = resolver()
+
+    assert resolve(wrapped) is ANSWER
+    assert CacheMiddleware.STATS["stale_answers"] == 0
+
+
+def test_deadline_serves_stale_and_resolution_goes_on():
+    store_expired()
+    wrapped, finished = resolver(delay=DEADLINE * 5)
+
+    async def run():
+        message = await wrapped(None, NAME, Rdata.TYPE_A, 1)
+        assert not finished
+        await asyncio.sleep(DEADLINE * 10)
+        return message
+
+    assert_stale(asyncio.run(run()))
+    assert finished == [NAME]
+
+
+def test_deadline_without_stale_waits_for_result():
+    wrapped, finished = resolver(delay=DEADLINE * 5)
+
+    assert resolve(wrapped) is ANSWER
+    assert finished == [NAME]
+    assert CacheMiddleware.STATS["stale_answers"] == 0
+
+
+def test_error_serves_stale():
+    store_expired()
+    wrapped, _ = resolver(error=ConnectionError("unreachable"))
+
+    assert_stale(resolve(wrapped))
+
+
+def test_error_without_stale_is_raised():
+    store_expired("other.example.com")
+    wrapped, _ = resolver(error=ConnectionError("unreachable"))
+
+    with pytest.raises(ConnectionError):
+        resolve(wrapped)
+
+
+def test_no_result_serves_stale():
+    store_expired()
+    wrapped, _ = resolver(result=None)
+
+    assert_stale(resolve(wrapped))
+
+
+def test_no_result_without_stale():
+    wrapped, _ = resolver(result=None)
+
+    assert resolve(wrapped) is None
+    assert CacheMiddleware.STATS["stale_answers"] == 0
+
+
+def test_entry_past_stale_window_is_not_served():
+    CacheMiddleware.configure(stale_window=30, stale_ttl=STALE_TTL, stale_deadline=DEADLINE)
+    store_expired()
+    wrapped, _ = resolver(result=None)
+
+    assert resolve(wrapped) is None
+
+
+def test_disabled_serve_stale_calls_resolve_directly():
+    CacheMiddleware.configure(stale_window=0)
+    store_expired()
+    wrapped, _ = resolver(result=None)
+
+    assert resolve(wrapped) is None
+    assert CacheMiddleware.STATS["stale_answers"] == 0
+
+
+def test_stale_ttl_is_used_for_expired_records_only():
+    entry = store_expired()
+
+    assert CacheMiddleware._stale_ttl(entry, time.time()) == STALE_TTL
+    assert CacheMiddleware._stale_ttl(entry, entry.stored_at) is None
+
+
+def test_background_error_is_retrieved():
+    errors = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        failed = loop.create_future()
+        failed.set_exception(ConnectionError("unreachable"))
+        cancelled = loop.create_future()
+        cancelled.cancel()
+        CacheMiddleware._background_done(failed)
+        CacheMiddleware._background_done(cancelled)
+        del failed, cancelled
+        gc.collect()
+
+    asyncio.run(run())
+
+    assert errors == []
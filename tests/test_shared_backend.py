@@ -0,0 +1,247 @@
+import ipaddress
+import multiprocessing
+
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.parts import DnsMessageAnswer
+from pathfinder.common.dns.parts.rdata import A, Rdata
+from pathfinder.common.middleware.cache.entry import CachedRRset
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+from pathfinder.common.middleware.cache.shared import SharedMemoryBackend
+
+NOW = 1700000000.0
+CORPUS = load_corpus()
+GEOMETRY = dict(stripes=4, slots=16, slot_size=1024)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "cache.shm"
+
+
+@pytest.fixture
+def backend(path):
+    backend = SharedMemoryBackend(path, **GEOMETRY)
+    yield backend
+    CacheMiddleware.configure()
+    backend.close()
+
+
+def rrset(name: str, ttl: int = 300) -> CachedRRset:
+    rdata = A()
+    rdata.address = ipaddress.IPv4Address("192.0.2.1")
+    record = DnsMessageAnswer(None, name, Rdata.TYPE_A, 1, ttl, rdata)
+    return CachedRRset.from_resources([record], NOW, ttl)
+
+
+def addresses(count: int) -> list:
+    result = []
+    for n in range(count):
+        rdata = A()
+        rdata.address = ipaddress.IPv4Address(0x0a000000 + n)
+        result.append(rdata)
+    return result
+
+
+def test_entries_are_shared_between_instances(backend, path):
+    entry = rrset("www.example.com")
+    other = SharedMemoryBackend(path, **GEOMETRY)
+    try:
+        assert backend.put(entry.key, entry) == (True, False, ())
+        assert other.get(entry.key) == entry
+        assert other.is_current(entry.key, entry)
+        assert len(other) == 1
+        assert other.bytes == entry.size
+    finally:
+        other.close()
+
+
+def test_put_replaces_and_discard_checks_entry(backend):
+    first = rrset("www.example.com", 300)
+    second = rrset("www.example.com", 600)
+
+    backend.put(first.key, first)
+    assert backend.put(second.key, second) == (True, True, ())
+    assert len(backend) == 1
+    assert backend.bytes == second.size
+
+    assert backend.discard(first.key, first) is None
+    assert not backend.is_current(first.key, first)
+    assert backend.discard(second.key, second) == second.size
+    assert second.key not in backend
+    assert len(backend) == 0
+    assert backend.bytes == 0
+
+
+def test_full_stripe_replaces_entry_which_expires_first(path):
+    backend = SharedMemoryBackend(path, stripes=1, slots=4, slot_size=1024)
+    try:
+        entries = [rrset(f"host{n}.example.com", 300 + n) for n in range(4)]
+        for entry in entries:
+            backend.put(entry.key, entry)
+        newcomer = rrset("new.example.com", 100)
+
+        result = backend.put(newcomer.key, newcomer)
+
+        assert result == (True, False, ((entries[0].key, entries[0].size),))
+        assert len(backend) == 4
+        assert entries[0].key not in backend
+        assert all(entry.key in backend for entry in entries[1:])
+        assert backend.get(newcomer.key) == newcomer
+    finally:
+        backend.close()
+
+
+def test_oversized_entry_is_not_stored(path):
+    backend = SharedMemoryBackend(path, stripes=1, slots=4, slot_size=64)
+    try:
+        entry = rrset("www.example.com")
+        assert backend.put(entry.key, entry) == (False, False, ())
+        assert entry.key not in backend
+        assert backend.bytes == 0
+    finally:
+        backend.close()
+
+
+def test_miss_in_full_stripe_probes_window_only(path, monkeypatch):
+    backend = SharedMemoryBackend(path, stripes=1, slots=64, slot_size=1024)
+    try:
+        entries = [rrset(f"host{n:03}.example.com") for n in range(200)]
+        for entry in entries:
+            assert backend.put(entry.key, entry).stored
+        assert len(backend) == 64
+        reads = []
+        read_slot = backend._read_slot
+        monkeypatch.setattr(backend, "_read_slot",
+                            lambda *args: reads.append(args) or read_slot(*args))
+
+        assert rrset("missing.example.com").key not in backend
+        assert len(reads) == SharedMemoryBackend.PROBE_WINDOW
+        # Entry evicted by later puts is gone, the rest is found inside the window
+        found = [entry for entry in entries if entry.key in backend]
+        assert len(found) == 64
+        assert all(backend.get(entry.key) == entry for entry in found)
+    finally:
+        backend.close()
+
+
+def test_tombstones_are_reused_and_cleared(path):
+    backend = SharedMemoryBackend(path, stripes=1, slots=8, slot_size=1024)
+    try:
+        entries = [rrset(f"host{n}.example.com") for n in range(8)]
+        for entry in entries:
+            backend.put(entry.key, entry)
+        # Table is full, so removed slot becomes tombstone
+        backend.discard(entries[0].key)
+        states = [backend.map[backend._slot_offset(0, slot) + 4] for slot in range(8)]
+        assert states.count(2) == 1
+
+        newcomer = rrset("new.example.com")
+        assert backend.put(newcomer.key, newcomer) == (True, False, ())
+        assert len(backend) == 8
+        assert all(entry.key in backend for entry in [*entries[1:], newcomer])
+
+        backend.clear()
+        for entry in entries[:2]:
+            backend.put(entry.key, entry)
+        for entry in entries[:2]:
+            backend.discard(entry.key)
+        states = [backend.map[backend._slot_offset(0, slot) + 4] for slot in range(8)]
+        assert states == [0] * 8
+    finally:
+        backend.close()
+
+
+def test_middleware_counts_stored_entries_only(path):
+    backend = SharedMemoryBackend(path, stripes=1, slots=4, slot_size=1024)
+    CacheMiddleware.configure(storage=backend)
+    try:
+        entries = [rrset(f"host{n}.example.com", 300 + n) for n in range(5)]
+        for entry in entries:
+            CacheMiddleware._put(entry.key, entry)
+        assert CacheMiddleware.STATS["insertions"] == 5
+        assert CacheMiddleware.STATS["evictions"] == 1
+        assert CacheMiddleware.STATS["evicted_bytes"] == entries[0].size
+
+        oversized = CachedRRset.from_resources(
+            [DnsMessageAnswer(None, "big.example.com", Rdata.TYPE_A, 1, 300, rdata)
+             for rdata in addresses(100)], NOW, 300)
+        CacheMiddleware._put(oversized.key, oversized)
+        assert CacheMiddleware.STATS["insertions"] == 5
+        assert len(CacheMiddleware.POLICY) == 4
+        assert all(item[1] != oversized for _, _, item in CacheMiddleware.EXPIRY.heap)
+
+        # Oversized replacement removes previous entry and counts nothing
+        grown = CachedRRset.from_resources(
+            [DnsMessageAnswer(None, "host4.example.com", Rdata.TYPE_A, 1, 300, rdata)
+             for rdata in addresses(100)], NOW, 300)
+        CacheMiddleware._put(grown.key, grown)
+        assert grown.key not in backend
+        assert len(CacheMiddleware.POLICY) == 3
+        assert CacheMiddleware.STATS["replacements"] == 0
+    finally:
+        CacheMiddleware.configure()
+        backend.close()
+
+
+def test_other_geometry_is_rejected(backend, path):
+    with pytest.raises(ValueError):
+        SharedMemoryBackend(path, stripes=8, slots=16, slot_size=1024)
+
+
+def test_clear(backend):
+    for n in range(10):
+        entry = rrset(f"host{n}.example.com")
+        backend.put(entry.key, entry)
+
+    backend.clear()
+
+    assert len(backend) == 0
+    assert backend.bytes == 0
+    assert list(backend.values()) == []
+
+
+def test_middleware_serves_hits_from_shared_table(backend, path):
+    CacheMiddleware.configure(storage=backend)
+    message = DnsMessage.unpack(CORPUS["mx_set"])
+    CacheMiddleware._parse_and_save_message(message, NOW)
+    CacheMiddleware._save_response(message, NOW)
+    stored = {entry.key: entry for entry in backend.values()}
+
+    # Another worker with its own process local state
+    worker = SharedMemoryBackend(path, **GEOMETRY)
+    CacheMiddleware.configure(storage=worker)
+    try:
+        hit = CacheMiddleware._find_resources("gmail.com", 15, 1, now=NOW + 10)
+        assert len(hit.answer) == len(message.answer)
+        assert {answer.ttl for answer in hit.answer} == \
+            {answer.ttl - 10 for answer in message.answer}
+        assert {entry.key: entry for entry in worker.values()} == stored
+        assert CacheMiddleware._find_resources("gmail.com", 15, 1,
+                                               now=NOW + 86400 * 7) is None
+    finally:
+        worker.close()
+
+
+def _write(path, name):
+    backend = SharedMemoryBackend(path, **GEOMETRY)
+    entry = rrset(name)
+    backend.put(entry.key, entry)
+    backend.close()
+
+
+def test_entries_written_by_other_process(backend, path):
+    context = multiprocessing.get_context("fork")
+    names = [f"worker{n}.example.com" for n in range(4)]
+    processes = [context.Process(target=_write, args=(path, name)) for name in names]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0] * len(names)
+    for name in names:
+        assert backend.get(rrset(name).key) == rrset(name)
+    assert len(backend) == len(names)
@@ -0,0 +1,126 @@
+from ipaddress import IPv4Address, IPv6Address
+
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.delegation import Delegation, DelegationCache
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.middleware.cache import snapshot
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+
+NOW = 1700000000.0
+CORPUS = load_corpus()
+NAMESERVERS = (IPv4Address("192.0.2.1"), IPv6Address("2001:db8::1"))
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    CacheMiddleware.configure()
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+def fill(names=("mx_set", "cname_chain", "nxdomain", "root_referral")):
+    for name in names:
+        message = DnsMessage.unpack(CORPUS[name])
+        CacheMiddleware._parse_and_save_message(message, NOW)
+        CacheMiddleware._save_response(message, NOW)
+    return {entry.key: entry for entry in CacheMiddleware.STORAGE.values()}
+
+
+def test_entries_survive_dumps_and_loads():
+    entries = fill()
+    delegation = Delegation("example.com", NAMESERVERS, NOW + 300)
+
+    items = list(snapshot.loads(snapshot.dumps([*entries.values(), delegation], NOW)))
+
+    assert items[-1] == delegation
+    assert {entry.key: entry for entry in items[:-1]} == entries
+
+
+def test_loads_skips_expired_records():
+    entries = fill()
+    short = min(entry.expires_at for entry in entries.values())
+
+    items = list(snapshot.loads(snapshot.dumps(entries.values(), NOW), after=short))
+
+    assert items
+    assert all(item.expires_at > short for item in items)
+    assert len(items) < len(entries)
+
+
+@pytest.mark.parametrize("data", [b"", b"not a snapshot at all", b"PFCACHE\x00\x00"])
+def test_loads_rejects_other_data(data):
+    with pytest.raises(snapshot.SnapshotError):
+        list(snapshot.loads(data))
+
+
+def test_loads_rejects_truncated_snapshot():
+    data = snapshot.dumps(fill().values(), NOW)
+
+    with pytest.raises(snapshot.SnapshotError):
+        list(snapshot.loads(data[:-5]))
+
+
+def damaged(data: bytes, kind: int) -> bytes:
+    """Returns snapshot with record kind of its second record replaced."""
+
+    pos = snapshot.FILE_HEADER.size
+    pos += snapshot.RECORD_HEADER.size + snapshot.RECORD_HEADER.unpack_from(data, pos)[2]
+    return data[:pos] + bytes([kind]) + data[pos + 1:]
+
+
+@pytest.mark.parametrize("damage", [lambda data: data[:-3], lambda data: damaged(data, 0xee)])
+def test_read_rejects_damaged_file(tmp_path, damage):
+    path = tmp_path / "cache.snapshot"
+    entries = fill()
+    snapshot.write(path, damage(snapshot.dumps(entries.values(), NOW)))
+
+    items = []
+    with pytest.raises(snapshot.SnapshotError):
+        for item in snapshot.read(path):
+            items.append(item)
+
+    assert items
+    assert all(entries[item.key] == item for item in items)
+
+
+def test_load_damaged_file_keeps_items_before_damage(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    entries = fill()
+    first = next(iter(entries.values()))
+    snapshot.write(path, damaged(snapshot.dumps(entries.values(), NOW), 0xee))
+    CacheMiddleware.configure()
+
+    assert CacheMiddleware.load_snapshot(path, now=NOW) == 1
+    assert list(CacheMiddleware.STORAGE.values()) == [first]
+
+
+def test_save_and_load(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    entries = fill()
+    delegations = DelegationCache()
+    delegations.put("example.com", NAMESERVERS, 300, now=NOW)
+    delegations.put("example.org", NAMESERVERS, 5, now=NOW)
+
+    saved = CacheMiddleware.save_snapshot(path, delegations, now=NOW)
+    CacheMiddleware.configure()
+    restored_delegations = DelegationCache()
+    restored = CacheMiddleware.load_snapshot(path, restored_delegations, now=NOW + 10)
+
+    expected = {key: entry for key, entry in entries.items()
+                if not entry.expired(NOW + 10)}
+    assert saved == len(entries) + 2
+    assert restored == len(expected) + 1
+    assert {entry.key: entry for entry in CacheMiddleware.STORAGE.values()} == expected
+    assert restored_delegations.get("example.org", now=NOW + 10) is None
+    delegation = restored_delegations.get("example.com", now=NOW + 10)
+    assert delegation.nameservers == NAMESERVERS
+    assert delegation.expires_at == NOW + 300
+
+    hit = CacheMiddleware._find_resources("gmail.com", 15, 1, now=NOW + 10)
+    assert len(hit.answer) == len(DnsMessage.unpack(CORPUS["mx_set"]).answer)
+
+
+def test_load_missing_snapshot(tmp_path):
+    assert CacheMiddleware.load_snapshot(tmp_path / "missing", now=NOW) == 0
@@ -0,0 +1,149 @@
+import math
+
+import pytest
+
+from benchmarks.codec import load_corpus
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+from pathfinder.common.middleware.cache.stats import CacheStats, LatencyHistogram
+
+NOW = 1700000000.0
+CORPUS = load_corpus()
+BOUNDS = (0.001, 0.01, 0.1)
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    CacheMiddleware.configure()
+    yield CacheMiddleware
+    CacheMiddleware.configure()
+
+
+@pytest.mark.parametrize("seconds, bucket", [
+    (0.0, 0), (0.001, 0), (0.0011, 1), (0.01, 1), (0.1, 2), (0.2, 3), (100.0, 3),
+])
+def test_bucket_bounds_are_inclusive(seconds, bucket):
+    histogram = LatencyHistogram(BOUNDS)
+
+    histogram.observe(seconds)
+
+    assert histogram.buckets == [int(n == bucket) for n in range(len(BOUNDS) + 1)]
+    assert histogram.count == 1
+    assert histogram.sum == seconds
+
+
+def test_quantile():
+    histogram = LatencyHistogram(BOUNDS)
+    assert histogram.quantile(0.5) is None
+
+    for seconds in [0.0005] * 50 + [0.005] * 40 + [0.05] * 9 + [1.0]:
+        histogram.observe(seconds)
+
+    assert histogram.quantile(0.0) == 0.001
+    assert histogram.quantile(0.5) == 0.001
+    assert histogram.quantile(0.51) == 0.01
+    assert histogram.quantile(0.9) == 0.01
+    assert histogram.quantile(0.99) == 0.1
+    assert histogram.quantile(1.0) == math.inf
+
+
+def test_histogram_snapshot_and_reset():
+    histogram = LatencyHistogram(BOUNDS)
+    histogram.observe(0.005)
+    histogram.observe(1.0)
+
+    assert histogram.snapshot() == {
+        "count": 2,
+        "sum": 1.005,
+        "buckets": [(0.001, 0), (0.01, 1), (0.1, 0), (math.inf, 1)],
+    }
+    histogram.reset()
+    assert histogram.count == 0
+    assert histogram.quantile(0.5) is None
+
+
+def test_counters_and_hit_ratio():
+    stats = CacheStats(BOUNDS)
+    stats.add("hits", 6)
+    stats.add("negative_hits", 2)
+    stats.add("misses", 2)
+    stats.add("evicted_bytes", 300)
+    stats.observe("hit", 0.0005)
+
+    snapshot = stats.snapshot(entries=10)
+
+    assert stats["hits"] == 6
+    assert stats["expirations"] == 0
+    assert snapshot["hit_ratio"] == 0.8
+    assert snapshot["evicted_bytes"] == 300
+    assert snapshot["entries"] == 10
+    assert set(CacheStats.COUNTERS) <= set(snapshot)
+    assert snapshot["latency"]["hit"]["count"] == 1
+    assert snapshot["latency"]["miss"]["count"] == 0
+    assert CacheStats().snapshot()["hit_ratio"] == 0.0
+
+
+def test_snapshot_with_reset():
+    stats = CacheStats(BOUNDS)
+    stats.add("misses")
+    stats.observe("upstream", 0.05)
+
+    snapshot = stats.snapshot(reset=True)
+
+    assert snapshot["misses"] == 1
+    assert snapshot["latency"]["upstream"]["count"] == 1
+    assert stats["misses"] == 0
+    assert stats.snapshot()["latency"]["upstream"]["count"] == 0
+
+
+def test_report_passes_snapshot_to_callbacks():
+    stats = CacheStats(BOUNDS)
+    reports = []
+    stats.add_callback(reports.append)
+    stats.add("hits")
+
+    snapshot = stats.report(reset=True, entries=1)
+    stats.report()
+    stats.remove_callback(reports.append)
+    stats.report()
+
+    assert reports[0] is snapshot
+    assert reports[0]["hits"] == 1
+    assert reports[0]["entries"] == 1
+    assert reports[1]["hits"] == 0
+    assert len(reports) == 2
+
+
+def test_middleware_stats():
+    message = DnsMessage.unpack(CORPUS["mx_set"])
+    CacheMiddleware._parse_and_save_message(message, NOW)
+    CacheMiddleware._save_response(message, NOW)
+    inserted = CacheMiddleware.STATS["insertions"]
+
+    assert CacheMiddleware._find_resources("gmail.com", 15, 1, now=NOW) is not None
+    assert CacheMiddleware._find_resources("missing.example.com", 15, 1, now=NOW) is None
+    stats = CacheMiddleware.stats(reset=True)
+
+    assert inserted == len(CacheMiddleware.STORAGE)
+    assert stats["insertions"] == inserted
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["entries"] == len(CacheMiddleware.STORAGE)
+    assert stats["bytes"] == CacheMiddleware.STORAGE.bytes
+    assert stats["latency"]["hit"]["count"] == 1
+    assert stats["latency"]["miss"]["count"] == 1
+    assert CacheMiddleware.stats()["hits"] == 0
+
+
+def test_middleware_report_stats():
+    reports = []
+    CacheMiddleware.STATS.add_callback(reports.append)
+    try:
+        CacheMiddleware._find_resources("missing.example.com", 1, 1, now=NOW)
+        CacheMiddleware.report_stats()
+    finally:
+        CacheMiddleware.STATS.remove_callback(reports.append)
+
+    assert [report["misses"] for report in reports] == [1]
+    assert reports[0]["entries"] == 0
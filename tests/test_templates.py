@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from pathfinder.client.manager import ClientManager
+from pathfinder.common.dns.message import DnsMessage
+from pathfinder.common.dns.template import QueryTemplates
+from pathfinder.common.middleware.cache.middleware import CacheMiddleware
+from pathfinder.common.middleware.edns.custom_answer import EdnsAnswer
+
+
+class EchoProtocol:
+    """Records sent messages and answers with the question itself."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_new_message(self, loop, host, message, timeout=1):
+        self.sent.append(message)
+        return message
+
+
+@pytest.fixture(autouse=True)
+def templates():
+    CacheMiddleware.configure()
+    ClientManager.query_templates.clear()
+    yield ClientManager.query_templates
+    ClientManager.query_templates.clear()
+    CacheMiddleware.configure()
+
+
+def test_pack_patches_id_into_template():
+    templates = QueryTemplates()
+    first = DnsMessage.new_question("example.com", 1, 1)
+    second = DnsMessage.new_question("example.com", 1, 1)
+    second.header.id = first.header.id % 65534 + 1
+
+    assert templates.pack(first) == first.pack()
+    packed = templates.pack(second)
+
+    assert packed == second.pack()
+    assert DnsMessage.unpack(packed).header.id == second.header.id
+    assert len(templates.templates) == 1
+
+
+def test_with_id():
+    data = DnsMessage.new_question("example.com", 1, 1).pack()
+
+    assert QueryTemplates.with_id(data, 0x1234)[:2] == b"\x12\x34"
+    assert QueryTemplates.with_id(data, 0x1234)[2:] == data[2:]
+    assert 1 <= DnsMessage.unpack(QueryTemplates.with_id(data)).header.id < 65535
+
+
+def test_key_depends_on_question_and_flags():
+    message = DnsMessage.new_question("example.com", 1, 1)
+    key = QueryTemplates.key(message)
+
+    assert QueryTemplates.key(DnsMessage.new_question("example.com", 28, 1)) != key
+    message.header.rd = 0
+    assert QueryTemplates.key(message) != key
+
+
+def test_message_with_records_is_not_templated():
+    templates = QueryTemplates()
+    message = DnsMessage.new_question("example.com", 1, 1)
+    message.additional.append(EdnsAnswer(message, 1232, 0, 0, False, 0))
+
+    assert QueryTemplates.key(message) is None
+    assert templates.pack(message) == message.pack()
+    assert not templates.templates
+
+
+def test_templates_are_bounded():
+    templates = QueryTemplates(maxsize=2)
+    for name in ("a.example.com", "b.example.com"):
+        templates.pack(DnsMessage.new_question(name, 1, 1))
+    # Hit moves template to the end, so the other one is dropped
+    templates.pack(DnsMessage.new_question("a.example.com", 1, 1))
+    templates.pack(DnsMessage.new_question("c.example.com", 1, 1))
+
+    assert [key[0] for key in templates.templates] == ["a.example.com", "c.example.com"]
+
+
+def test_query_reuses_template(monkeypatch):
+    protocol = EchoProtocol()
+    manager = ClientManager(None, protocol)
+    packed = []
+    pack = DnsMessage.pack
+    monkeypatch.setattr(DnsMessage, "pack", lambda message: packed.append(message) or
+                        pack(message))
+
+    async def query():
+        message = await manager.query("192.0.2.1", "example.com", 1, 1)
+        # Echoed question must not be answered from cache on the next query
+        CacheMiddleware.configure()
+        return message
+
+    asyncio.run(query())
+    asyncio.run(query())
+
+    first, second = protocol.sent
+    assert len(packed) == 1
+    assert first[2:] == second[2:]
+    assert DnsMessage.unpack(second).question[0].qname.label == "example.com"
+    assert len(ClientManager.query_templates.templates) == 1